@@ -1,27 +1,44 @@
 from dotenv import load_dotenv
 from livekit import agents
-from livekit.agents import AgentServer, AgentSession, Agent, room_io, RoomInputOptions, BackgroundAudioPlayer, AudioConfig, BuiltinAudioClip
+from livekit.agents import AgentServer, AgentSession, Agent, JobProcess, room_io, RoomInputOptions, BackgroundAudioPlayer, AudioConfig, BuiltinAudioClip
 from livekit.plugins import (
     noise_cancellation,
     openai,
     deepgram,
     bey,
+    silero,
 )
 import os
-import requests
-import re
+import time
 import logging
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Optional
 import json
 import asyncio
 
-from tools import send_email  # LiveKit @function_tool — given to the LLM
+# LiveKit @function_tools given to the LLM
+from tools import send_email, confirm_order, transfer_call, hold_call
+from prices import parse_price
+from markers import Marker, strip_markers
+from call_control import BRIDGED, REFERRED, CallControl, LiveKitCallBackend
+from backend_client import BackendClient
+from outbox import Outbox, OutboxFlusher
+from mailer import get_mailer
+from faq import FAQMatcher, load_knowledge
+from menu import Menu, MenuCache
+from dispatch import AGENT_NAME, LOAD_THRESHOLD
+from admission import VOICE_ONLY, AdmissionController, call_mode
+from analytics import CallAnalytics  # incremental per-call intent / sentiment / lead scoring
+from warm_pool import SessionComponents, WarmPool
+from startup import StartupOrchestrator
+from metrics import MetricsExporter, default_metrics_dir, registry
+from loop_monitor import LoopMonitor
 from prompt import (
-    AGENT_INSTRUCTIONS,
+    build_agent_instructions,
     GREETING_INSTRUCTIONS,
     HOT_TRANSFER_INSTRUCTIONS,
     COLD_TRANSFER_INSTRUCTIONS,
+    TRANSFER_FAILED_INSTRUCTIONS,
     HOLD_START_INSTRUCTIONS,
     HOLD_END_INSTRUCTIONS,
 )
@@ -38,350 +55,441 @@ logger = logging.getLogger("CrincleCupkakes")
 load_dotenv(".env.local")
 
 BACKEND_URL = os.getenv("BACKEND_URL")
-TRANSFER_PHONE = os.getenv("TRANSFER_PHONE", "+1234567890")
+
+# Transcript memory: keep the last N turns in RAM; optionally stream every turn to JSONL
+TRANSCRIPT_MAX_TURNS = int(os.getenv("TRANSCRIPT_MAX_TURNS", "500"))
+TRANSCRIPT_SPILL_DIR = os.getenv("TRANSCRIPT_SPILL_DIR")  # unset = no spill
+
+# Stream turns and call events to the backend while the call is live
+STREAM_CALL_EVENTS = os.getenv("STREAM_CALL_EVENTS", "true").lower() == "true"
+
+# One pooled, keep-alive HTTP client per worker process
+backend = BackendClient(
+    BACKEND_URL,
+    timeout=float(os.getenv("BACKEND_TIMEOUT", "10")),
+    max_connections=int(os.getenv("BACKEND_MAX_CONNECTIONS", "20")),
+)
+
+# Loop-lag sampler + slow-callback profiler (LOOP_MONITOR=true), one per job process
+loop_monitor = LoopMonitor()
+
+# Durable outbox — records survive backend outages and worker crashes
+outbox = Outbox(os.getenv("OUTBOX_PATH", "outbox.db"))
+flusher = OutboxFlusher(
+    outbox,
+    backend,
+    batch_size=int(os.getenv("OUTBOX_BATCH_SIZE", "50")),
+    interval=float(os.getenv("OUTBOX_FLUSH_INTERVAL", "0.5")),
+    max_attempts=int(os.getenv("OUTBOX_MAX_ATTEMPTS", "100")),  # ~75 min of retries at the 60s backoff cap
+)
 
 # =========================
 # FAQ Knowledge Base
+# (loaded from JSON so it can grow without code changes)
 # =========================
-FAQ_KNOWLEDGE = {
-    "hours": {
-        "keywords": ["hours", "open", "close", "timing", "time", "when open"],
-        "answer": "We're open Monday to Saturday, 8 AM to 8 PM, and Sunday 10 AM to 6 PM."
-    },
-    "location": {
-        "keywords": ["location", "address", "where", "directions", "find you"],
-        "answer": "We're located at 123 Main Street, Karachi. We're right next to the National Bank on Shahrah-e-Faisal."
-    },
-    "delivery": {
-        "keywords": ["delivery", "deliver", "shipping", "courier"],
-        "answer": "Yes! We deliver within Karachi. Delivery is Rs. 200 for orders under Rs. 2000, and free for orders above that. It takes 45-60 minutes."
-    },
-    "payment": {
-        "keywords": ["payment", "pay", "cash", "card", "online"],
-        "answer": "We accept cash, all major cards, and online payment through JazzCash, Easypaisa, and bank transfer."
-    },
-    "custom_orders": {
-        "keywords": ["custom", "personalized", "special", "design", "theme"],
-        "answer": "Absolutely! We do custom cakes and cupcakes. Just give us 24 hours notice for custom designs. Prices start from Rs. 1500."
-    },
-    "ingredients": {
-        "keywords": ["ingredients", "allergen", "gluten", "dairy", "vegan", "halal"],
-        "answer": "All our products are 100% halal. We can do gluten-free and dairy-free options with 24 hours notice. Please let us know about any allergies!"
-    },
-    "prices": {
-        "keywords": ["price", "cost", "how much", "expensive"],
-        "answer": "Our regular cupcakes are Rs. 150 each, premium ones Rs. 250. Cakes start from Rs. 1200 for 1 pound. Want me to check something specific?"
-    },
-    "cancellation": {
-        "keywords": ["cancel", "refund", "change order"],
-        "answer": "You can cancel or modify orders up to 6 hours before delivery. Full refund for cancellations before that. After that, we can try our best but charges may apply."
-    },
-    "bulk_orders": {
-        "keywords": ["bulk", "party", "event", "wedding", "corporate", "large order"],
-        "answer": "We love bulk orders! For events, we offer 10% off on orders above 50 cupcakes. Please give us 48 hours notice for large quantities."
-    },
-    "flavors": {
-        "keywords": ["flavor", "flavours", "variety", "what kind", "types"],
-        "answer": "We have chocolate, vanilla, red velvet, lemon, strawberry, cookies & cream, and our special Pakistani chai cupcakes! We also have seasonal flavors."
-    }
-}
+FAQ_KNOWLEDGE = load_knowledge(os.getenv("FAQ_KNOWLEDGE_PATH"))  # faq_knowledge.json by default
+faq_matcher = FAQMatcher(FAQ_KNOWLEDGE)  # compiled once per process
+
+# Live menu from the backend's /catalog, revalidated in the background.
+# Prices and flavors in the prompt and FAQ answers come from it.
+menu_cache = MenuCache(
+    backend,
+    ttl=float(os.getenv("MENU_CACHE_TTL", "300")),
+    snapshot_path=os.getenv("MENU_CACHE_PATH", "menu_cache.json"),
+)
 
-# =========================
-# Call Analytics Tracker
-# =========================
-class CallAnalytics:
-    def __init__(self):
-        self.start_time = datetime.now()
-        self.end_time = None
-        self.transcript: List[Dict] = []
-        self.customer_data: Dict = {}
-        self.intent = "unknown"
-        self.sentiment = "neutral"
-        self.questions_asked: List[str] = []
-        self.faq_triggered: List[str] = []
-        self.hold_count = 0
-        self.interruption_count = 0
-        self.transfer_requested = False
-        self.order_placed = False
-
-    def add_transcript(self, speaker: str, text: str):
-        self.transcript.append({
-            "timestamp": datetime.now().isoformat(),
-            "speaker": speaker,
-            "text": text
-        })
 
-    def detect_intent(self):
-        transcript_text = " ".join([t["text"].lower() for t in self.transcript if t["speaker"] == "customer"])
-        if any(word in transcript_text for word in ["order", "buy", "purchase", "want"]):
-            self.intent = "purchase"
-        elif any(word in transcript_text for word in ["complain", "issue", "problem", "wrong"]):
-            self.intent = "complaint"
-        elif any(word in transcript_text for word in ["question", "ask", "wondering", "how", "what", "when"]):
-            self.intent = "inquiry"
-        elif any(word in transcript_text for word in ["cancel", "refund", "change"]):
-            self.intent = "modification"
-        else:
-            self.intent = "general"
-
-    def generate_summary(self) -> Dict:
-        self.end_time = datetime.now()
-        duration = (self.end_time - self.start_time).total_seconds()
-        self.detect_intent()
-        return {
-            "call_metadata": {
-                "start_time": self.start_time.isoformat(),
-                "end_time": self.end_time.isoformat(),
-                "duration_seconds": duration,
-                "duration_formatted": f"{int(duration // 60)}m {int(duration % 60)}s"
-            },
-            "customer_data": self.customer_data,
-            "call_analysis": {
-                "primary_intent": self.intent,
-                "sentiment": self.sentiment,
-                "order_placed": self.order_placed,
-                "transfer_requested": self.transfer_requested,
-                "hold_count": self.hold_count,
-                "interruption_count": self.interruption_count,
-                "faqs_addressed": self.faq_triggered,
-                "questions_count": len(self.questions_asked)
-            },
-            "transcript": self.transcript,
-            "lead_quality": self._assess_lead_quality()
-        }
+def apply_menu(menu: Menu):
+    FAQ_KNOWLEDGE["prices"]["answer"] = menu.prices_answer()
+    FAQ_KNOWLEDGE["flavors"]["answer"] = menu.flavors_answer()
 
-    def _assess_lead_quality(self) -> str:
-        score = 0
-        if self.order_placed:
-            return "converted"
-        if self.customer_data.get("email"):
-            score += 30
-        if self.customer_data.get("customer_name"):
-            score += 20
-        if self.intent == "purchase":
-            score += 30
-        if len(self.questions_asked) > 2:
-            score += 10
-        if "custom" in self.faq_triggered:
-            score += 10
-        if score >= 70:
-            return "hot"
-        elif score >= 40:
-            return "warm"
-        else:
-            return "cold"
 
+menu_cache.on_change(apply_menu)
 
 # =========================
 # Backend HTTP Helpers
 # (Server-side calls — NOT LLM tools)
 # =========================
-def _post_to_backend(endpoint: str, data: dict, label: str) -> bool:
-    """Generic helper to POST data to backend endpoints."""
-    try:
-        response = requests.post(
-            f"{BACKEND_URL}/{endpoint}",
-            json=data,
-            timeout=10
-        )
-        if response.status_code == 200:
-            logger.info(f"✅ {label} stored successfully")
-            return True
-        else:
-            logger.error(f"❌ {label} failed: {response.text}")
-            return False
-    except Exception as e:
-        logger.error(f"❌ {label} connection failed: {e}")
-        return False
+def _post_to_backend(endpoint: str, data: dict, label: str) -> str:
+    """
+    Durably queue a record for a backend endpoint and return its idempotency key.
+    The outbox flusher delivers it in a batch, retrying until the backend accepts it.
+    """
+    key = outbox.append(endpoint, data)
+    flusher.start()
+    logger.info(f"📥 {label} queued for backend ({key})")
+    return key
 
 
-def backend_place_order(order_data: dict) -> bool:
-    return _post_to_backend("place-order", order_data, "Order")
+def backend_place_order(order_data: dict) -> str:
+    key = _post_to_backend("place-order", order_data, "Order")
+    flusher.notify()  # orders go out on the next tick, not the next interval
+    return key
 
 
-def backend_call_analytics(analytics_data: dict) -> bool:
+def backend_call_analytics(analytics_data: dict) -> str:
     return _post_to_backend("call-analytics", analytics_data, "Analytics")
 
 
-def backend_store_lead(lead_data: dict) -> bool:
+def backend_store_lead(lead_data: dict) -> str:
     return _post_to_backend("leads", lead_data, "Lead")
 
 
-def backend_send_email(email_data: dict) -> bool:
+def backend_send_email(email_data: dict) -> str:
     """
-    Sends email notifications via the backend HTTP service.
-    Used for internal/system emails (order confirmations, call summaries).
+    Sends email notifications via the backend HTTP service, which delivers
+    each one once (see bakery-backend/notifications.py). Used for internal
+    emails such as call summaries; order confirmations are sent by the
+    backend when the order is saved.
     This is NOT the same as the send_email LLM tool in tools.py.
     """
     return _post_to_backend("send-email", email_data, "Email")
 
 
+def backend_stream_event(event: dict) -> str:
+    """
+    Live call event (turn, FAQ hit, hold, transfer...). Batched by the outbox
+    flusher like everything else; keyed by call + sequence so retries dedupe.
+    Not logged per event — a busy call produces many.
+    """
+    key = outbox.append("call-events", event, idempotency_key=f"{event['call_id']}:{event['seq']}")
+    flusher.start()
+    return key
+
+
 # =========================
 # Enhanced Bakery Agent
 # =========================
 class EnhancedBakeryAssistant(Agent):
-    def __init__(self, analytics: CallAnalytics) -> None:
+    def __init__(self, analytics: CallAnalytics, menu: Optional[Menu] = None) -> None:
         self.analytics = analytics
-        self.on_hold = False
-        self.hold_duration = 0
         super().__init__(
-            instructions=AGENT_INSTRUCTIONS,  # ← from prompt.py
-            tools=[send_email],               # ← from tools.py (LLM can call this)
+            instructions=build_agent_instructions(menu.prompt_section() if menu else ""),  # ← from prompt.py + menu
+            tools=[send_email, confirm_order, transfer_call, hold_call],  # ← from tools.py (LLM can call these)
         )
 
-    async def handle_hold(self, duration: int):
-        self.on_hold = True
-        self.hold_duration = duration
+    # Spoken control markers never reach the caller: they are stripped from the
+    # streamed text, and their actions run as soon as each marker completes
+    async def transcription_node(self, text, model_settings):
+        async for chunk in strip_markers(text, self.session.userdata.on_marker):
+            yield chunk
+
+    async def tts_node(self, text, model_settings):
+        # Transcription dispatches the actions (it also runs with the realtime model); TTS only strips
+        return Agent.default.tts_node(self, strip_markers(text), model_settings)
+
+
+# =========================
+# Call Actions
+# What the agent can do to the call. The function tools in tools.py reach
+# these through session.userdata; spoken markers that slip through land here too.
+# Holds and transfers are carried out on the room by CallControl (call_control.py).
+# =========================
+class CallActions:
+    def __init__(self, session: AgentSession, analytics: CallAnalytics, control: CallControl):
+        self.session = session
+        self.analytics = analytics
+        self.control = control
+        self._tasks: set = set()
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def confirm_order(self, customer_name: str, email: str, items: str, total_price: float) -> str:
+        analytics = self.analytics
+        if analytics.order_placed and analytics.customer_data.get("order_items") == items:
+            return "This order is already placed. Don't place it again."
+        order_data = {
+            "customer_name": customer_name,
+            "email": email,
+            "items": items,
+            "total_price": float(total_price),
+            "timestamp": datetime.now().isoformat(),
+            "order_source": "voice_call"
+        }
+        logger.info(f"📦 Order Placed: {order_data}")
+        analytics.customer_data.update({
+            "customer_name": customer_name,
+            "email": email,
+            "order_items": items,
+            "order_value": order_data["total_price"]
+        })
+        analytics.order_placed = True
+        analytics.record_event("order", **order_data)
+        # The backend emails the confirmation once the order is saved
+        backend_place_order(order_data)
+        return "Order placed. Tell the customer: 'Perfect! You'll get a confirmation email shortly.'"
+
+    def transfer(self, kind: str, reason: str) -> str:
+        if kind == "hot":
+            logger.warning(f"📞 HOT TRANSFER requested: {reason}")
+        else:
+            logger.info(f"📞 COLD TRANSFER requested: {reason}")
+        self.analytics.transfer_requested = True
+        self.analytics.record_event("transfer", kind=kind, reason=reason)
+        if kind != "hot":
+            return COLD_TRANSFER_INSTRUCTIONS
+        self._spawn(self._transfer(reason))
+        return HOT_TRANSFER_INSTRUCTIONS
+
+    async def _transfer(self, reason: str):
+        outcome = await self.control.transfer(reason)
+        self.analytics.record_event("transfer_result", outcome=outcome)
+        if outcome not in (BRIDGED, REFERRED):
+            await self.session.generate_reply(instructions=TRANSFER_FAILED_INSTRUCTIONS)
+
+    def hold(self, seconds: int) -> str:
+        logger.info(f"⏸ Hold requested for {seconds} seconds")
+        self.analytics.record_event("hold", duration=seconds)
+        self._spawn(self._hold(seconds))
+        return HOLD_START_INSTRUCTIONS
+
+    async def _hold(self, seconds: int):
         self.analytics.hold_count += 1
-        logger.info(f"⏸ Holding for {duration} seconds")
-        await asyncio.sleep(duration)
-        self.on_hold = False
-        logger.info("▶️ Resuming from hold")
+        await self.control.hold(seconds)
+        await self.session.generate_reply(instructions=HOLD_END_INSTRUCTIONS)
+
+    def on_marker(self, marker: Marker):
+        """A spoken ORDER_CONFIRMED / TRANSFER_* / HOLD_REQUEST marker (see markers.py)."""
+        registry.counter("control_markers_total", marker=marker.name).inc()
+        try:
+            if marker.name == "ORDER_CONFIRMED":
+                parts = [p.strip() for p in marker.payload.split("|")]
+                if len(parts) != 4:
+                    raise ValueError(f"expected 4 fields in '{marker.payload}'")
+                total_price = parse_price(parts[3])
+                if total_price is None:
+                    raise ValueError(f"no amount in total '{parts[3]}'")
+                self.confirm_order(parts[0], parts[1], parts[2], total_price)
+                return  # the agent goes on to thank the customer by itself
+            if marker.name in ("TRANSFER_HOT", "TRANSFER_COLD"):
+                say = self.transfer("hot" if marker.name == "TRANSFER_HOT" else "cold", marker.payload)
+            else:
+                say = self.hold(int(marker.payload))
+        except ValueError as e:
+            logger.error(f"❌ {marker.name} marker ignored: {e}")
+            return
+        self._spawn(self.session.generate_reply(instructions=say))
 
 
 # =========================
 # FAQ Detector
 # =========================
 def detect_faq(text: str) -> Optional[str]:
-    text_lower = text.lower()
-    for category, faq in FAQ_KNOWLEDGE.items():
-        if any(keyword in text_lower for keyword in faq["keywords"]):
-            return faq["answer"]
-    return None
+    """Answer for the best-matching FAQ category, if any."""
+    return faq_matcher.answer(text)
+
+
+# =========================
+# Prewarm (once per job process, before a call is assigned)
+# =========================
+WARM_POOL_SIZE = int(os.getenv("WARM_POOL_SIZE", "1"))
+
+# Startup timeouts (seconds). The greeting waits at most AVATAR_GREETING_WAIT
+# for the avatar, then starts audio-only; the avatar may still join later.
+AVATAR_GREETING_WAIT = float(os.getenv("AVATAR_GREETING_WAIT", "3"))
+AVATAR_START_TIMEOUT = float(os.getenv("AVATAR_START_TIMEOUT", "20"))
+SESSION_START_TIMEOUT = float(os.getenv("SESSION_START_TIMEOUT", "15"))
+
+
+def build_session_components() -> SessionComponents:
+    return SessionComponents(
+        llm=openai.realtime.RealtimeModel(voice="coral"),
+        stt=deepgram.STT(),
+        tts=deepgram.TTS(model="aura-luna-en"),
+        noise_cancellation=noise_cancellation.BVC(),
+    )
+
+
+def prewarm(proc: JobProcess):
+    start = time.perf_counter()
+    proc.userdata["vad"] = silero.VAD.load()
+    proc.userdata["warm_pool"] = WarmPool(build_session_components, size=WARM_POOL_SIZE).fill()
+    get_mailer()  # open the mail spool now rather than on the first send_email
+    menu_cache.refresh_blocking()  # falls back to the disk snapshot if the backend is down
+    logger.info(f"🔥 Process prewarmed in {time.perf_counter() - start:.2f}s")
 
 
 # =========================
 # LiveKit Server
 # =========================
-server = AgentServer()
+# Calls are dispatched explicitly to AGENT_NAME (a room per call, see dispatch.py);
+# LiveKit places each one on the least-loaded worker below LOAD_THRESHOLD, and
+# the admission controller accepts, degrades or rejects it (see admission.py)
+admission = AdmissionController()
+server = AgentServer(setup_fnc=prewarm, load_fnc=admission, load_threshold=LOAD_THRESHOLD)
 
 
-@server.rtc_session()
+@server.rtc_session(agent_name=AGENT_NAME, on_request=admission.on_request)
 async def entrypoint(ctx: agents.JobContext):
 
-    logger.info(f"🚀 Session started in room: {ctx.room.name}")
+    call_started = time.perf_counter()
+    mode = call_mode(ctx)
+    logger.info(f"🚀 Session started in room: {ctx.room.name} ({mode})")
+
+    # Warm components from prewarm; built cold only if the pool is empty
+    pool = ctx.proc.userdata.get("warm_pool") or WarmPool(build_session_components)
+    components = pool.acquire()
+    components.warm_connections()  # STT/TTS connect while the rest of startup runs
+
+    analytics = CallAnalytics(
+        call_id=f"{ctx.room.name}-{ctx.job.id}",
+        max_turns=TRANSCRIPT_MAX_TURNS,
+        spill_dir=TRANSCRIPT_SPILL_DIR,
+        on_event=backend_stream_event if STREAM_CALL_EVENTS else None,
+    )
+    analytics.record_event("call_started", room=ctx.room.name, mode=mode)
+    if mode == VOICE_ONLY:
+        analytics.record_event("degraded", mode="voice_only", reason="admission")
+
+    # Also picks up records left behind by a previous worker
+    flusher.start()
+
+    async def flush_backend():
+        # Deliver the end-of-call records before the job process exits
+        await flusher.drain()
+        logger.info(f"📊 Backend latency: {backend.latency_report()}")
+
+    ctx.add_shutdown_callback(flush_backend)
+
+    # Per-process metrics snapshot, merged and served by server.py on /metrics
+    metrics_exporter = MetricsExporter(default_metrics_dir())
+    metrics_exporter.start()
+    ctx.add_shutdown_callback(metrics_exporter.aclose)
+
+    loop_monitor.start()
+    ctx.add_shutdown_callback(loop_monitor.aclose)
+
+    def watched(handler):
+        # Time the handler; slow runs are logged and recorded on this call
+        return loop_monitor.watch(
+            handler,
+            call_id=analytics.call_id,
+            on_slow=lambda name, seconds: analytics.record_event(
+                "slow_callback", handler=name, ms=round(seconds * 1000, 1)
+            ),
+        )
 
-    analytics = CallAnalytics()
+    # send_email tool deliveries (and any mail spooled by earlier sessions)
+    mailer = get_mailer()
+    mailer.start()
+    ctx.add_shutdown_callback(mailer.drain)
 
     session = AgentSession(
-        llm=openai.realtime.RealtimeModel(voice="coral"),
-        stt=deepgram.STT(),
-        tts=deepgram.TTS(model="aura-luna-en"),
+        llm=components.llm,
+        stt=components.stt,
+        tts=components.tts,
+        vad=ctx.proc.userdata.get("vad") or silero.VAD.load(),
     )
+    if components.attach_io:
+        components.attach_io(session)  # offline replay: fake audio in/out instead of the room's
 
-    agent = EnhancedBakeryAssistant(analytics)
+    menu_cache.start()
+    agent = EnhancedBakeryAssistant(analytics, menu_cache.menu)
 
-    # =========================
-    # Avatar Setup (Beyond Presence)
-    # =========================
-    avatar = bey.AvatarSession(
-        avatar_id=os.getenv("BEY_AVATAR_ID"),
+    # Background Audio (typing sounds while agent thinks, hold music on hold)
+    background_audio = BackgroundAudioPlayer(
+        thinking_sound=[
+            AudioConfig(BuiltinAudioClip.KEYBOARD_TYPING, volume=0.7),
+            AudioConfig(BuiltinAudioClip.KEYBOARD_TYPING2, volume=0.7),
+        ],
     )
 
-    # Start the avatar and wait for it to join the room
-    await avatar.start(session, room=ctx.room)
-    logger.info("🎭 Avatar joined the room")
+    # Used by the call-control tools: orders, real holds and transfers
+    control = CallControl(LiveKitCallBackend(ctx, session, background_audio))
+    session.userdata = CallActions(session, analytics, control)
 
     # =========================
     # Handle Customer Speech
     # =========================
-    @session.on("user_speech")
-    def handle_user_speech(text: str):
+    @session.on("user_input_transcribed")
+    @watched
+    def handle_user_speech(ev):
+        if not ev.is_final or not ev.transcript.strip():
+            return  # interim transcripts are revised until the final one arrives
+        text = ev.transcript
         logger.info(f"👤 Customer: {text}")
+        previous_intent = analytics.intent
         analytics.add_transcript("customer", text)
-        faq_answer = detect_faq(text)
-        if faq_answer:
-            logger.info(f"📚 FAQ triggered: {faq_answer}")
-            analytics.faq_triggered.append(text[:50])
+        if analytics.intent != previous_intent:
+            logger.info(f"🎯 Intent: {analytics.intent} (lead: {analytics.lead_quality})")
+        faq_matches = faq_matcher.match(text)
+        if faq_matches:
+            best = faq_matches[0][0]
+            logger.info(f"📚 FAQ triggered ({', '.join(c for c, _ in faq_matches)}): {FAQ_KNOWLEDGE[best]['answer']}")
+            analytics.faq_triggered.extend(c for c, _ in faq_matches if c not in analytics.faq_triggered)
+            analytics.record_event("faq", categories=[c for c, _ in faq_matches])
 
     # =========================
     # Handle Agent Speech
     # =========================
-    @session.on("agent_speech")
-    def handle_agent_speech(text: str):
+    @session.on("conversation_item_added")
+    @watched
+    def handle_agent_speech(ev):
+        # Customer turns are already recorded from their final transcripts above
+        if getattr(ev.item, "role", None) != "assistant":
+            return
+        text = ev.item.text_content
+        if not text:
+            return
         logger.info(f"🗣 Agent: {text}")
         analytics.add_transcript("agent", text)
+        # Orders, transfers and holds arrive as tool calls (or stripped markers) — see CallActions
 
-        # === ORDER CONFIRMATION ===
-        if "ORDER_CONFIRMED:" in text:
-            try:
-                data = text.split("ORDER_CONFIRMED:")[1].strip()
-                parts = [p.strip() for p in data.split("|")]
-                if len(parts) == 4:
-                    order_data = {
-                        "customer_name": parts[0],
-                        "email": parts[1],
-                        "items": parts[2],
-                        "total_price": int(re.sub(r"[^\d]", "", parts[3])),
-                        "timestamp": datetime.now().isoformat(),
-                        "order_source": "voice_call"
-                    }
-                    logger.info(f"📦 Order Placed: {order_data}")
-                    analytics.customer_data.update({
-                        "customer_name": parts[0],
-                        "email": parts[1],
-                        "order_items": parts[2],
-                        "order_value": order_data["total_price"]
-                    })
-                    analytics.order_placed = True
-                    backend_place_order(order_data)
-                    backend_send_email({
-                        "to": parts[1],
-                        "subject": "Order Confirmation - Crincle Cupkakes",
-                        "type": "order_confirmation",
-                        "data": order_data
-                    })
-            except Exception as e:
-                logger.error(f"❌ Order parsing failed: {e}")
-
-        # === HOT TRANSFER ===
-        if "TRANSFER_HOT:" in text:
-            reason = text.split("TRANSFER_HOT:")[1].strip()
-            logger.warning(f"📞 HOT TRANSFER requested: {reason}")
-            analytics.transfer_requested = True
-            asyncio.create_task(session.generate_reply(
-                instructions=HOT_TRANSFER_INSTRUCTIONS
-            ))
-
-        # === COLD TRANSFER ===
-        if "TRANSFER_COLD:" in text:
-            reason = text.split("TRANSFER_COLD:")[1].strip()
-            logger.info(f"📞 COLD TRANSFER requested: {reason}")
-            analytics.transfer_requested = True
-            asyncio.create_task(session.generate_reply(
-                instructions=COLD_TRANSFER_INSTRUCTIONS
-            ))
-
-        # === HOLD REQUEST ===
-        if "HOLD_REQUEST:" in text:
-            try:
-                duration = int(re.search(r'\d+', text.split("HOLD_REQUEST:")[1]).group())
-                logger.info(f"⏸ Hold requested for {duration} seconds")
-
-                async def handle_hold_sequence():
-                    await session.generate_reply(instructions=HOLD_START_INSTRUCTIONS)
-                    await agent.handle_hold(duration)
-                    await session.generate_reply(instructions=HOLD_END_INSTRUCTIONS)
-
-                asyncio.create_task(handle_hold_sequence())
-            except Exception as e:
-                logger.error(f"❌ Hold parsing failed: {e}")
+    # =========================
+    # Agent Speaking: time to first greeting + per-turn playout latency
+    # =========================
+    greeted = False
+
+    @session.on("agent_state_changed")
+    @watched
+    def on_agent_state_changed(ev):
+        nonlocal greeted
+        if ev.new_state != "speaking":
+            return
+        analytics.latency.agent_started_speaking()
+        if not greeted:
+            greeted = True
+            elapsed = time.perf_counter() - call_started
+            registry.histogram("time_to_first_greeting_seconds").observe(elapsed)
+            analytics.record_event("first_greeting", seconds=round(elapsed, 3))
+            logger.info(f"⏱ Time to first greeting: {elapsed:.2f}s")
+
+    # =========================
+    # Turn Latency (end of user speech → LLM → TTS → avatar)
+    # =========================
+    @session.on("user_state_changed")
+    def on_user_state_changed(ev):
+        if ev.old_state == "speaking" and ev.new_state != "speaking":
+            analytics.latency.user_stopped_speaking()
+        elif ev.new_state == "speaking" and session.agent_state == "speaking":
+            on_interruption()
+
+    @session.on("metrics_collected")
+    @watched
+    def on_metrics_collected(ev):
+        analytics.latency.on_metrics(ev.metrics)
 
     # =========================
     # Interruption Detection
     # =========================
-    @session.on("user_started_speaking")
     def on_interruption():
         logger.info("⚡ Customer interrupted")
         analytics.interruption_count += 1
+        analytics.record_event("interruption")
 
     # =========================
     # Call End Handler
     # =========================
-    @session.on("session_ended")
-    def on_call_end():
+    @session.on("close")
+    @watched
+    def on_call_end(ev):
         logger.info("📞 Call ended - Generating analytics...")
-        call_summary = analytics.generate_summary()
+        # Streamed turns are already stored — the summary just references them by call_id
+        call_summary = analytics.generate_summary(include_transcript=not STREAM_CALL_EVENTS)
+        analytics.record_event("call_ended", duration_seconds=call_summary["call_metadata"]["duration_seconds"])
         backend_call_analytics(call_summary)
 
         if analytics.customer_data.get("email") or analytics.customer_data.get("customer_name"):
@@ -401,34 +509,59 @@ async def entrypoint(ctx: agents.JobContext):
             "type": "call_summary",
             "data": call_summary
         })
-        logger.info(f"✅ Call Summary: {json.dumps(call_summary, indent=2)}")
+        # Never pretty-print the transcript into the log — keep the line small
+        logged = {k: v for k, v in call_summary.items() if k != "transcript"}
+        logger.info(f"✅ Call Summary: {json.dumps(logged)}")
 
     # =========================
     # Start Session
+    # Avatar, background audio and session start run concurrently
     # =========================
-    await session.start(
+    startup = StartupOrchestrator()
+
+    if not await startup.phase("connect", ctx.connect(), SESSION_START_TIMEOUT):
+        ctx.shutdown(reason="room connect failed")
+        return
+
+    # The avatar takes over session audio output whenever it joins.
+    # Voice-only calls (admitted under load) skip it and BVC noise cancellation.
+    voice_only = mode == VOICE_ONLY
+    avatar_task = None
+    if not voice_only:
+        # Avatar Setup (Beyond Presence)
+        avatar = bey.AvatarSession(
+            avatar_id=os.getenv("BEY_AVATAR_ID"),
+        )
+        avatar_task = startup.background("avatar", avatar.start(session, room=ctx.room), AVATAR_START_TIMEOUT)
+    startup.background("background_audio", background_audio.start(room=ctx.room, agent_session=session), SESSION_START_TIMEOUT)
+
+    session_started = await startup.phase("session", session.start(
         room=ctx.room,
         agent=agent,
         room_input_options=RoomInputOptions(
-            noise_cancellation=noise_cancellation.BVC(),
-            video_enabled=True,   # Required for avatar video stream
+            noise_cancellation=None if voice_only else components.noise_cancellation,
+            video_enabled=not voice_only,   # Required for avatar video stream
         ),
-    )
-
-    # =========================
-    # Background Audio (typing sounds while agent thinks)
-    # =========================
-    background_audio = BackgroundAudioPlayer(
-        thinking_sound=[
-            AudioConfig(BuiltinAudioClip.KEYBOARD_TYPING, volume=0.7),
-            AudioConfig(BuiltinAudioClip.KEYBOARD_TYPING2, volume=0.7),
-        ],
-    )
-    await background_audio.start(room=ctx.room, agent_session=session)
-    logger.info("🔊 Background audio started")
+    ), SESSION_START_TIMEOUT)
+    if not session_started:
+        ctx.shutdown(reason="session start failed")
+        return
+
+    # Greet through the avatar if it's ready soon — otherwise don't keep the caller waiting
+    if voice_only:
+        registry.counter("startup_mode_total", mode="voice_only").inc()
+    elif await startup.ready_within(avatar_task, AVATAR_GREETING_WAIT):
+        logger.info("🎭 Avatar joined the room")
+        registry.counter("startup_mode_total", mode="avatar").inc()
+    else:
+        logger.warning("🎭 Avatar not ready — greeting in audio-only mode")
+        registry.counter("startup_mode_total", mode="audio_only").inc()
+        analytics.record_event("degraded", mode="audio_only", reason="avatar_slow")
 
     # Initial greeting
-    await session.generate_reply(instructions=GREETING_INSTRUCTIONS)
+    await startup.phase("greeting", session.generate_reply(instructions=GREETING_INSTRUCTIONS), SESSION_START_TIMEOUT)
+    logger.info(f"⏱ Startup: {json.dumps(startup.summary())}")
+    analytics.record_event("startup", **startup.summary())
 
 
 # =========================
@@ -0,0 +1,148 @@
+"""
+admission.py — Admission control for the agent worker.
+
+Every call runs the realtime LLM, STT, TTS, avatar and noise cancellation;
+past some number of concurrent calls on one machine, every call gets
+worse. `AdmissionController` runs in the main worker process and is both
+the AgentServer load_fnc and the rtc_session on_request handler:
+
+  load_fnc    samples CPU and active calls (dispatch.WorkerLoad) plus the
+              worker event loop's lag, and reports the combined load to
+              LiveKit, which stops dispatching at LOAD_THRESHOLD
+  on_request  decides each new job with the latest numbers:
+
+                full        below ADMISSION_DEGRADE_LOAD
+                voice_only  above it (ADMISSION_POLICY=voice_only): no
+                            avatar, no BVC noise cancellation
+                rejected    above it with ADMISSION_POLICY=reject, above
+                            ADMISSION_REJECT_LOAD, or at MAX_CALLS_PER_WORKER
+                            (LiveKit then offers the job to another worker)
+
+The decision reaches the job process as the agent participant's
+"call_mode" attribute (`call_mode(ctx)`), and each one is counted in
+admission_decisions_total{decision, reason}.
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from typing import Optional, Tuple
+
+from dispatch import LOAD_THRESHOLD, MAX_CALLS_PER_WORKER, WorkerLoad
+from metrics import MetricsExporter, default_metrics_dir, registry
+
+logger = logging.getLogger("CrincleCupkakes")
+
+ADMISSION_POLICY = os.getenv("ADMISSION_POLICY", "voice_only")  # "voice_only" | "reject"
+ADMISSION_DEGRADE_LOAD = float(os.getenv("ADMISSION_DEGRADE_LOAD", "0.6"))
+ADMISSION_REJECT_LOAD = float(os.getenv("ADMISSION_REJECT_LOAD", "0.9"))
+ADMISSION_MAX_LOOP_LAG = float(os.getenv("ADMISSION_MAX_LOOP_LAG", "0.25"))  # seconds
+
+FULL = "full"
+VOICE_ONLY = "voice_only"
+REJECTED = "rejected"
+
+
+def call_mode(ctx) -> str:
+    """The admission decision for this job ("full" when admitted without one, e.g. in console mode)."""
+    try:
+        return ctx.token_claims().attributes.get("call_mode") or FULL
+    except Exception:
+        return FULL
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        worker_load: Optional[WorkerLoad] = None,
+        policy: str = ADMISSION_POLICY,
+        degrade_load: float = ADMISSION_DEGRADE_LOAD,
+        reject_load: float = ADMISSION_REJECT_LOAD,
+        max_loop_lag: float = ADMISSION_MAX_LOOP_LAG,
+        max_calls: int = MAX_CALLS_PER_WORKER,
+        threshold: float = LOAD_THRESHOLD,
+    ):
+        self.worker_load = worker_load or WorkerLoad(max_calls=max_calls, threshold=threshold)
+        self.policy = policy
+        self.degrade_load = degrade_load
+        self.reject_load = reject_load
+        self.max_loop_lag = max_loop_lag
+        self.max_calls = max_calls
+        self.threshold = threshold
+
+        self.load = 0.0
+        self.sessions = 0
+        self.loop_lag = 0.0
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._exporter: Optional[MetricsExporter] = None
+
+    # ── load_fnc (executor thread) ───────────────────────────────
+    def __call__(self, server) -> float:
+        load = self.worker_load(server)
+        self._probe_loop_lag()
+        with self._lock:
+            lag_load = self.loop_lag / self.max_loop_lag * self.threshold if self.max_loop_lag else 0.0
+            load = min(1.0, max(load, lag_load))
+            if (load >= self.threshold) != (self.load >= self.threshold):
+                logger.info(
+                    f"{'🚫 Worker full' if load >= self.threshold else '✅ Worker accepting calls'}: "
+                    f"load {load:.2f} ({len(server.active_jobs)} calls, loop lag {self.loop_lag * 1000:.0f}ms)"
+                )
+            self.load = load
+            self.sessions = len(server.active_jobs)
+        return load
+
+    def _probe_loop_lag(self):
+        # How long a callback waits to run on the worker loop (known once a job request has arrived)
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        sent = time.perf_counter()
+
+        def arrived():
+            lag = time.perf_counter() - sent
+            registry.histogram("event_loop_lag_seconds", process="worker").observe(lag)
+            with self._lock:
+                self.loop_lag = lag
+
+        loop.call_soon_threadsafe(arrived)
+
+    # ── on_request (worker event loop) ───────────────────────────
+    def decide(self) -> Tuple[str, str]:
+        """(decision, reason) for a new job given the current load."""
+        with self._lock:
+            if self.max_calls and self.sessions >= self.max_calls:
+                return REJECTED, "max_calls"
+            if self.load >= self.reject_load:
+                return REJECTED, "load"
+            if self.max_loop_lag and self.loop_lag >= self.max_loop_lag:
+                reason = "loop_lag"
+            elif self.load >= self.degrade_load:
+                reason = "load"
+            else:
+                return FULL, "ok"
+        return (VOICE_ONLY if self.policy == VOICE_ONLY else REJECTED), reason
+
+    async def on_request(self, req):
+        if self._loop is None:
+            self._loop = asyncio.get_running_loop()
+            # The worker process exports its own snapshot (admission counters, loop lag)
+            self._exporter = MetricsExporter(default_metrics_dir())
+            self._exporter.start()
+
+        decision, reason = self.decide()
+        registry.counter("admission_decisions_total", decision=decision, reason=reason).inc()
+        if decision == REJECTED:
+            logger.warning(f"🚫 Rejected job {req.id} ({reason}: load {self.load:.2f}, {self.sessions} calls)")
+            await req.reject()
+            return
+
+        if decision == VOICE_ONLY:
+            logger.warning(f"🎙 Admitting job {req.id} voice-only ({reason}: load {self.load:.2f})")
+        with self._lock:
+            # Counted now; the next load sample replaces this with the real number
+            self.sessions += 1
+        await req.accept(attributes={"call_mode": decision})
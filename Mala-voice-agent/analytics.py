@@ -0,0 +1,279 @@
+"""
+analytics.py — Per-call analytics for the voice agent.
+
+Everything is updated incrementally in `add_transcript`: each customer
+utterance is tokenized once and folded into intent counters, a running
+sentiment score and the question count. `intent`, `sentiment` and
+`lead_quality` are therefore live during the call (usable for routing and
+transfer decisions) and `generate_summary` costs the same at minute 1 and
+minute 60.
+
+The transcript is kept as compact `Turn` records (slots, monotonic offsets,
+interned speakers) in a bounded buffer, and can optionally be streamed to
+a JSONL file as the call goes, so long calls don't pile up in memory.
+
+With an `on_event` callback, every turn and call event (FAQ hit,
+interruption, hold, transfer, order) is also handed out as it happens,
+numbered by a per-call sequence, so it can be streamed to the backend.
+"""
+
+import json
+import os
+import sys
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Callable, Deque, Dict, Iterator, List, Optional, TextIO
+
+from faq import tokenize
+from latency import TurnLatencyTracker
+
+# Checked in priority order — any purchase signal outranks a complaint, etc.
+INTENT_KEYWORDS = {
+    "purchase": ["order", "ordering", "ordered", "buy", "buying", "purchase", "want", "wanted"],
+    "complaint": ["complain", "complaint", "complaining", "issue", "problem", "wrong"],
+    "inquiry": ["question", "ask", "asking", "wondering", "how", "what", "when"],
+    "modification": ["cancel", "cancelled", "canceled", "refund", "change", "changed"],
+}
+
+POSITIVE_WORDS = {
+    "thanks", "thank", "great", "perfect", "awesome", "love", "lovely", "amazing",
+    "wonderful", "delicious", "good", "nice", "excellent", "happy", "yum",
+}
+NEGATIVE_WORDS = {
+    "bad", "terrible", "awful", "angry", "upset", "disappointed", "worst", "rude",
+    "late", "stale", "horrible", "unacceptable", "wrong",
+}
+
+QUESTION_STARTERS = {
+    "what", "when", "where", "how", "why", "which", "who", "do", "does",
+    "can", "could", "would", "is", "are", "will",
+}
+
+# Normalize the same way the FAQ matcher does, so plurals fold consistently
+_INTENT_LOOKUP = {tokenize(word)[0]: intent for intent, words in INTENT_KEYWORDS.items() for word in words}
+_POSITIVE = {tokenize(word)[0] for word in POSITIVE_WORDS}
+_NEGATIVE = {tokenize(word)[0] for word in NEGATIVE_WORDS}
+_QUESTION_STARTERS = {tokenize(word)[0] for word in QUESTION_STARTERS}  # "does" folds to "doe"
+
+
+class Turn:
+    """One transcript line: seconds since call start, interned speaker, text."""
+
+    __slots__ = ("offset", "speaker", "text")
+
+    def __init__(self, offset: float, speaker: str, text: str):
+        self.offset = offset
+        self.speaker = speaker
+        self.text = text
+
+    def to_dict(self, start_time: datetime) -> Dict:
+        return {
+            "timestamp": (start_time + timedelta(seconds=self.offset)).isoformat(),
+            "speaker": self.speaker,
+            "text": self.text,
+        }
+
+
+class Transcript:
+    """
+    Bounded in-memory transcript. With `max_turns`, only the most recent turns
+    stay in memory; with `spill_path`, every turn is also appended to a JSONL
+    file as it happens, so nothing is lost when the buffer wraps.
+    """
+
+    def __init__(self, start_time: datetime, max_turns: Optional[int] = None, spill_path: Optional[str] = None):
+        self.start_time = start_time
+        self.started_at = time.monotonic()
+        self._turns: Deque[Turn] = deque(maxlen=max_turns)
+        self.total_turns = 0
+        self.spill_path = spill_path
+        self._spill: Optional[TextIO] = None
+        if spill_path:
+            os.makedirs(os.path.dirname(spill_path) or ".", exist_ok=True)
+            # Line-buffered so each turn reaches the OS as soon as it's written
+            self._spill = open(spill_path, "a", encoding="utf-8", buffering=1)
+
+    def append(self, speaker: str, text: str) -> Turn:
+        turn = Turn(self.elapsed(), sys.intern(speaker), text)
+        self._turns.append(turn)
+        self.total_turns += 1
+        if self._spill:
+            self._spill.write(json.dumps(turn.to_dict(self.start_time), ensure_ascii=False) + "\n")
+        return turn
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started_at
+
+    @property
+    def dropped(self) -> int:
+        """Turns that fell out of the in-memory buffer."""
+        return self.total_turns - len(self._turns)
+
+    def __len__(self) -> int:
+        return len(self._turns)
+
+    def __iter__(self) -> Iterator[Turn]:
+        return iter(self._turns)
+
+    def to_list(self) -> List[Dict]:
+        return [turn.to_dict(self.start_time) for turn in self._turns]
+
+    def close(self):
+        if self._spill:
+            self._spill.close()
+            self._spill = None
+
+
+class CallAnalytics:
+    def __init__(
+        self,
+        call_id: Optional[str] = None,
+        max_turns: Optional[int] = None,
+        spill_dir: Optional[str] = None,
+        on_event: Optional[Callable[[Dict], None]] = None,
+    ):
+        self.call_id = call_id or uuid.uuid4().hex
+        self.on_event = on_event
+        self.event_seq = 0
+        self.start_time = datetime.now()
+        self.end_time = None
+        self.transcript = Transcript(
+            self.start_time,
+            max_turns=max_turns,
+            spill_path=os.path.join(spill_dir, f"{self.call_id}.jsonl") if spill_dir else None,
+        )
+        self.customer_data: Dict = {}
+        self.intent = "unknown"
+        self.sentiment = "neutral"
+        self.questions_asked: List[str] = []
+        self.faq_triggered: List[str] = []
+        self.hold_count = 0
+        self.interruption_count = 0
+        self.transfer_requested = False
+        self.order_placed = False
+        self.intent_signals: Dict[str, int] = {intent: 0 for intent in INTENT_KEYWORDS}
+        self.sentiment_score = 0
+        self.latency = TurnLatencyTracker()
+
+    def add_transcript(self, speaker: str, text: str):
+        turn = self.transcript.append(speaker, text)
+        if speaker == "customer":
+            self._update_from_customer(text)
+        if self.on_event:
+            self._emit("turn", turn.offset, {"speaker": speaker, "text": text})
+
+    def record_event(self, event_type: str, **data):
+        """Report a call event (faq, interruption, hold, transfer, order...) to `on_event`."""
+        if self.on_event:
+            self._emit(event_type, self.transcript.elapsed(), data)
+
+    def _emit(self, event_type: str, offset: float, data: Dict):
+        self.event_seq += 1
+        self.on_event({
+            "call_id": self.call_id,
+            "seq": self.event_seq,
+            "type": event_type,
+            "offset": round(offset, 3),
+            "data": data,
+        })
+
+    def _update_from_customer(self, text: str):
+        words = tokenize(text)
+        for word in words:
+            intent = _INTENT_LOOKUP.get(word)
+            if intent:
+                self.intent_signals[intent] += 1
+            if word in _POSITIVE:
+                self.sentiment_score += 1
+            elif word in _NEGATIVE:
+                self.sentiment_score -= 1
+
+        if text.rstrip().endswith("?") or (words and words[0] in _QUESTION_STARTERS):
+            self.questions_asked.append(text)
+
+        self.detect_intent()
+        if self.sentiment_score > 1:
+            self.sentiment = "positive"
+        elif self.sentiment_score < -1:
+            self.sentiment = "negative"
+        else:
+            self.sentiment = "neutral"
+
+    def detect_intent(self):
+        """Derive the intent from the running counters — O(1), safe to call anytime."""
+        for intent, count in self.intent_signals.items():
+            if count:
+                self.intent = intent
+                return
+        self.intent = "general"
+
+    @property
+    def lead_score(self) -> int:
+        score = 0
+        if self.customer_data.get("email"):
+            score += 30
+        if self.customer_data.get("customer_name"):
+            score += 20
+        if self.intent == "purchase":
+            score += 30
+        if len(self.questions_asked) > 2:
+            score += 10
+        if "custom_orders" in self.faq_triggered:
+            score += 10
+        return score
+
+    @property
+    def lead_quality(self) -> str:
+        if self.order_placed:
+            return "converted"
+        score = self.lead_score
+        if score >= 70:
+            return "hot"
+        elif score >= 40:
+            return "warm"
+        else:
+            return "cold"
+
+    def generate_summary(self, include_transcript: bool = True) -> Dict:
+        """
+        End-of-call summary. When the turns were already streamed to the backend,
+        pass include_transcript=False to send a reference instead of the text.
+        """
+        self.end_time = datetime.now()
+        duration = (self.end_time - self.start_time).total_seconds()
+        self.detect_intent()
+        self.transcript.close()
+        summary = {
+            "call_metadata": {
+                "call_id": self.call_id,
+                "start_time": self.start_time.isoformat(),
+                "end_time": self.end_time.isoformat(),
+                "duration_seconds": duration,
+                "duration_formatted": f"{int(duration // 60)}m {int(duration % 60)}s"
+            },
+            "customer_data": self.customer_data,
+            "call_analysis": {
+                "primary_intent": self.intent,
+                "intent_signals": self.intent_signals,
+                "sentiment": self.sentiment,
+                "order_placed": self.order_placed,
+                "transfer_requested": self.transfer_requested,
+                "hold_count": self.hold_count,
+                "interruption_count": self.interruption_count,
+                "faqs_addressed": self.faq_triggered,
+                "questions_count": len(self.questions_asked)
+            },
+            "transcript_info": {
+                "total_turns": self.transcript.total_turns,
+                "dropped_from_memory": self.transcript.dropped,
+                "spill_file": self.transcript.spill_path,
+                "streamed_events": self.event_seq,
+            },
+            "lead_quality": self.lead_quality,
+            "latency": self.latency.summary(),
+        }
+        if include_transcript:
+            summary["transcript"] = self.transcript.to_list()
+        return summary
@@ -0,0 +1,141 @@
+"""
+backend_client.py — Non-blocking HTTP client for the bakery backend.
+
+The agent's event handlers (`user_input_transcribed`, `conversation_item_added`,
+`close`)
+run on the asyncio loop, so a blocking `requests.post` there freezes audio
+for every session in the worker. Instead, posts are scheduled as tasks on
+one pooled, keep-alive aiohttp session shared by the whole worker process.
+
+Every request is timed per endpoint into `metrics.registry`.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Dict, Optional, Set, Tuple
+
+import aiohttp
+
+from metrics import registry
+
+logger = logging.getLogger("CrincleCupkakes")
+
+
+class BackendClient:
+    """Shared, pooled HTTP client for posting JSON to the bakery backend."""
+
+    def __init__(
+        self,
+        base_url: Optional[str],
+        timeout: float = 10,
+        max_connections: int = 20,
+        keepalive: float = 30,
+    ):
+        self.base_url = (base_url or "").rstrip("/")
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.max_connections = max_connections
+        self.keepalive = keepalive
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pending: Set[asyncio.Task] = set()
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # The session is bound to the loop it was created on
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._loop is not loop:
+            connector = aiohttp.TCPConnector(
+                limit=self.max_connections,
+                keepalive_timeout=self.keepalive,
+            )
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+            self._loop = loop
+        return self._session
+
+    async def post(self, endpoint: str, data: dict, label: str) -> bool:
+        """POST `data` to `{base_url}/{endpoint}`; never raises."""
+        return await self.post_status(endpoint, data, label) == 200
+
+    async def post_status(self, endpoint: str, data: dict, label: str) -> int:
+        """Like post, but returns the HTTP status (0 if the backend could not be reached)."""
+        if not self.base_url:
+            logger.error(f"❌ {label} skipped: BACKEND_URL not configured")
+            return 0
+
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            async with self._get_session().post(f"{self.base_url}/{endpoint}", json=data) as response:
+                if response.status == 200:
+                    outcome = "ok"
+                    logger.info(f"✅ {label} stored successfully")
+                    return 200
+                outcome = "failed"
+                logger.error(f"❌ {label} failed ({response.status}): {await response.text()}")
+                return response.status
+        except Exception as e:
+            logger.error(f"❌ {label} connection failed: {e!r}")
+            return 0
+        finally:
+            registry.histogram(
+                "backend_request_seconds", endpoint=endpoint, outcome=outcome
+            ).observe(time.perf_counter() - start)
+
+    async def get_json(self, endpoint: str, etag: Optional[str] = None) -> Tuple[int, Optional[str], Optional[dict]]:
+        """
+        GET `{base_url}/{endpoint}`, revalidating with If-None-Match when `etag`
+        is given. Returns (status, etag, body) — status 0 if the backend could
+        not be reached, body None unless 200. Never raises.
+        """
+        if not self.base_url:
+            return 0, None, None
+
+        start = time.perf_counter()
+        outcome = "error"
+        headers = {"If-None-Match": etag} if etag else {}
+        try:
+            async with self._get_session().get(f"{self.base_url}/{endpoint}", headers=headers) as response:
+                if response.status == 304:
+                    outcome = "not_modified"
+                    return 304, response.headers.get("ETag", etag), None
+                if response.status == 200:
+                    outcome = "ok"
+                    return 200, response.headers.get("ETag"), await response.json()
+                outcome = "failed"
+                logger.warning(f"⚠️ GET {endpoint} returned {response.status}")
+                return response.status, None, None
+        except Exception as e:
+            logger.warning(f"⚠️ GET {endpoint} failed: {e!r}")
+            return 0, None, None
+        finally:
+            registry.histogram(
+                "backend_request_seconds", endpoint=endpoint, outcome=outcome
+            ).observe(time.perf_counter() - start)
+
+    def schedule(self, endpoint: str, data: dict, label: str) -> asyncio.Task:
+        """Fire a POST in the background and return immediately."""
+        task = asyncio.get_running_loop().create_task(self.post(endpoint, data, label))
+        # Keep a strong reference until done so the task isn't garbage-collected
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+        return task
+
+    async def drain(self, timeout: Optional[float] = 10):
+        """Wait for in-flight posts (e.g. the end-of-call analytics) to finish."""
+        if self._pending:
+            logger.info(f"⏳ Waiting for {len(self._pending)} backend request(s)...")
+            await asyncio.wait(set(self._pending), timeout=timeout)
+
+    async def aclose(self):
+        await self.drain()
+        if self._session and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def latency_report(self) -> Dict[str, Dict]:
+        """Per-endpoint latency summary, e.g. {"leads": {"count": 3, "p95_ms": 250.0, ...}}."""
+        report: Dict[str, Dict] = {}
+        for labels, hist in registry.collect("backend_request_seconds"):
+            key = labels["endpoint"] if labels["outcome"] == "ok" else f"{labels['endpoint']} ({labels['outcome']})"
+            report[key] = hist.summary()
+        return report
@@ -0,0 +1,250 @@
+"""
+catalog.py — Product catalog, order-text parser and price engine.
+
+Orders arrive as the free text the agent confirmed on the call, e.g.
+"6 Red Velvet Cupcakes and a dozen chocolate" or "Chocolate Crinkle
+Cupcakes x6". `Catalog.parse` turns that into line items in one pass over
+the tokens: product names are matched longest-alias-first from a phrase
+table (plurals folded on both sides, so "red velvets" and "cakes" match),
+and each quantity ("6", "x6", "a dozen", "two dozen", "2 lb")
+attaches to the product next to it. A count before a weight ("two 2 lb
+cakes") multiplies it.
+
+`Catalog.check_total` prices the line items (bulk discount, delivery fee)
+and compares the result with the total the agent quoted, so a wrong
+total from the LLM is flagged instead of silently stored.
+"""
+
+import json
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+CATALOG_PATH = Path(__file__).resolve().parent / "catalog.json"
+
+_TOKEN = re.compile(r"\d+(?:\.\d+)?|[a-z]+")
+
+NUMBER_WORDS = {
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7, "eight": 8,
+    "nine": 9, "ten": 10, "eleven": 11, "twelve": 12, "thirteen": 13, "fourteen": 14,
+    "fifteen": 15, "sixteen": 16, "seventeen": 17, "eighteen": 18, "nineteen": 19,
+    "twenty": 20, "thirty": 30, "forty": 40, "fifty": 50, "sixty": 60, "seventy": 70,
+    "eighty": 80, "ninety": 90, "hundred": 100,
+}
+MULTIPLIERS = {"dozen": 12, "dozens": 12, "hundred": 100}
+WEIGHT_UNITS = {"lb", "lbs", "pound", "pounds"}
+POSTFIX_MARKERS = {"x"}  # "Red Velvet x6"
+
+
+def _normalize(word: str) -> str:
+    # Plural folding (as in the agent's faq.py) so "cakes" hits "cake" and "red velvets" hits "red velvet"
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased words and numbers, plurals folded — used for both the alias table and orders."""
+    return [_normalize(t) for t in _TOKEN.findall(text.lower().replace("&", " and "))]
+
+
+def _compounds(previous: Optional[float], number: float) -> bool:
+    """Whether number word `number` continues the one before it: "twenty four", "hundred fifty"."""
+    if previous is None:
+        return False
+    if previous >= 100:
+        return number < 100
+    return previous >= 20 and previous % 10 == 0 and number < 10
+
+
+@dataclass
+class Product:
+    sku: str
+    name: str
+    category: str
+    unit: str
+    unit_price: float
+    aliases: List[str] = field(default_factory=list)
+
+
+@dataclass
+class LineItem:
+    sku: str
+    description: str
+    quantity: float
+    unit_price: float
+
+    @property
+    def line_total(self) -> float:
+        return round(self.quantity * self.unit_price, 2)
+
+    def __str__(self) -> str:
+        quantity = int(self.quantity) if self.quantity == int(self.quantity) else self.quantity
+        return f"{self.description} x{quantity}"
+
+
+@dataclass
+class PriceCheck:
+    subtotal: float
+    discount: float
+    total: float
+    quoted: Optional[float]
+    status: str  # "ok" | "mismatch" | "unpriced"
+    accepted_totals: List[float] = field(default_factory=list)
+
+
+class Catalog:
+    def __init__(self, products: List[Product], pricing: Optional[Dict] = None):
+        self.products = {p.sku: p for p in products}
+        self.pricing = pricing or {}
+        # first token → [(alias tokens, product)], longest alias first
+        self._phrases: Dict[str, List[Tuple[Tuple[str, ...], Product]]] = {}
+        for product in products:
+            for alias in {product.name, *product.aliases}:
+                words = tuple(tokenize(alias))
+                if words:
+                    self._phrases.setdefault(words[0], []).append((words, product))
+        for candidates in self._phrases.values():
+            candidates.sort(key=lambda c: len(c[0]), reverse=True)
+
+    @classmethod
+    def from_file(cls, path: Path = CATALOG_PATH) -> "Catalog":
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls([Product(**p) for p in data["products"]], data.get("pricing"))
+
+    def _match_product(self, tokens: List[str], i: int) -> Tuple[Optional[Product], int, str]:
+        for words, product in self._phrases.get(tokens[i], ()):
+            if tuple(tokens[i:i + len(words)]) == words:
+                return product, i + len(words), " ".join(words)
+        return None, i, ""
+
+    @staticmethod
+    def _read_quantity(tokens: List[str], i: int) -> Tuple[Optional[float], int]:
+        """Quantity starting at tokens[i] ("6", "twenty four", "a dozen", "half a dozen")."""
+        value: Optional[float] = None
+        previous: Optional[float] = None  # the number word a following word may extend
+        j = i
+        while j < len(tokens):
+            token = tokens[j]
+            following = tokens[j + 1:j + 3]
+            if token in MULTIPLIERS and value is not None:
+                value *= MULTIPLIERS[token]
+                previous = value if token == "hundred" else None
+                j += 1
+                continue
+            if token in NUMBER_WORDS and token not in MULTIPLIERS:
+                number = NUMBER_WORDS[token]
+                if value is not None and not _compounds(previous, number):
+                    break  # "one two-pound cake" is two quantities, not three
+                value = number if value is None else value + number  # "twenty four"
+                previous = number
+                j += 1
+                continue
+            if value is not None:
+                break  # a digit never extends a number: "one 2 lb cake"
+            if token[0].isdigit():
+                value = float(token)
+            elif token in ("a", "an") and following[:1] == ["half"]:
+                j += 1  # "a half dozen"
+                continue
+            elif token in ("a", "an") and following[:1] and following[0] in MULTIPLIERS:
+                value = 1
+            elif token == "half" and following[:1] and following[0] in MULTIPLIERS:
+                value = 0.5
+            elif token == "half" and len(following) == 2 and following[0] in ("a", "an") and following[1] in MULTIPLIERS:
+                value = 0.5
+                j += 1  # "half a dozen"
+            elif token in MULTIPLIERS:
+                value = MULTIPLIERS[token]
+            else:
+                break
+            j += 1
+        return value, j
+
+    def parse(self, text: str) -> List[LineItem]:
+        """Line items for every product mentioned in `text` (quantity 1 when none is given)."""
+        tokens = tokenize(text)
+        events: List[Tuple[str, object]] = []  # ("product", (product, phrase)) | ("qty", value) | ("postfix", value)
+        i = 0
+        while i < len(tokens):
+            product, end, phrase = self._match_product(tokens, i)
+            if product:
+                events.append(("product", (product, phrase)))
+                i = end
+                continue
+            postfix = tokens[i] in POSTFIX_MARKERS
+            quantity, end = self._read_quantity(tokens, i + 1 if postfix else i)
+            if quantity is not None:
+                if end < len(tokens) and tokens[end] in WEIGHT_UNITS:
+                    end += 1
+                    if not postfix and events and events[-1][0] == "qty":
+                        # "two 2 lb cakes" is 4 lb of cake
+                        events[-1] = ("qty", events[-1][1] * quantity)
+                        i = end
+                        continue
+                events.append(("postfix" if postfix else "qty", quantity))
+                i = end
+                continue
+            i += 1
+
+        # Quantities come before their product ("6 red velvet") unless the text
+        # leads with a product ("red velvet 6, chocolate 12") or uses "x6"
+        postfix_style = bool(events) and events[0][0] == "product"
+        items: List[LineItem] = []
+        explicit: List[bool] = []  # whether items[i] already has its quantity
+        pending: Optional[float] = None
+        for kind, value in events:
+            if kind == "product":
+                product, phrase = value
+                items.append(LineItem(product.sku, self._describe(product, phrase), pending or 1, product.unit_price))
+                explicit.append(pending is not None)
+                pending = None
+            elif items and not explicit[-1] and (kind == "postfix" or postfix_style):
+                items[-1].quantity = value
+                explicit[-1] = True
+            else:
+                pending = value
+
+        # "6 red velvet ... and 6 more red velvet" is one line
+        merged: Dict[Tuple[str, str], LineItem] = {}
+        for item in items:
+            key = (item.sku, item.description)
+            if key in merged:
+                merged[key].quantity += item.quantity
+            else:
+                merged[key] = item
+        return list(merged.values())
+
+    @staticmethod
+    def _describe(product: Product, phrase: str) -> str:
+        # Generic products keep the flavor the customer asked for ("Chocolate Cake")
+        if product.category == "cake" and phrase != product.name.lower():
+            return phrase.title()
+        return product.name
+
+    def check_total(self, items: List[LineItem], quoted: Optional[float], tolerance: float = 1.0) -> PriceCheck:
+        """Price `items` from the catalog and compare with the quoted total."""
+        subtotal = round(sum(item.line_total for item in items), 2)
+        discount = 0.0
+        bulk = self.pricing.get("bulk_discount")
+        if bulk:
+            in_category = [i for i in items if self.products[i.sku].category == bulk["category"]]
+            if sum(i.quantity for i in in_category) >= bulk["min_quantity"]:
+                discount = round(sum(i.line_total for i in in_category) * bulk["percent"] / 100, 2)
+        total = round(subtotal - discount, 2)
+
+        # The order marker doesn't say pickup or delivery, so a total with the fee is fine too
+        accepted = [total]
+        fee = self.pricing.get("delivery_fee")
+        if fee and total < self.pricing.get("free_delivery_from", float("inf")):
+            accepted.append(total + fee)
+
+        if not items:
+            status = "unpriced"
+        elif quoted is not None and any(abs(quoted - a) <= tolerance for a in accepted):
+            status = "ok"
+        else:
+            status = "mismatch"
+        return PriceCheck(subtotal, discount, total, quoted, status, accepted)
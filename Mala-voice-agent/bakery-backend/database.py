@@ -1,13 +1,212 @@
-from sqlalchemy import create_engine
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+"""
+database.py — SQLite storage layer for the bakery backend.
 
-DATABASE_URL = "sqlite:///./orders.db"
+FastAPI runs the sync handlers (and our run_in_threadpool calls) on a pool
+of worker threads, so instead of one shared connection + cursor every
+thread gets its own connection, opened lazily and reused for the life of
+the thread. AnyIO retires idle worker threads, so a connection is closed
+when its thread goes away rather than piling up until shutdown. Each connection is set up for concurrent use:
 
-engine = create_engine(
-    DATABASE_URL, connect_args={"check_same_thread": False}
-)
+  journal_mode=WAL      readers never block the writer (or each other)
+  synchronous=NORMAL    WAL commits without an fsync per transaction
+  busy_timeout          a writer waits for the lock instead of failing
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+Statements are prepared once per connection: sqlite3 keeps a cache of
+compiled statements keyed by SQL text, so the module-level SQL constants
+in db.py are only parsed the first time each thread uses them.
 
-Base = declarative_base()
+Bursts of orders go through `GroupCommitWriter`, which gathers concurrent
+writes into one transaction (one commit, one WAL sync) every few
+milliseconds or every N writes, and hands each caller its own result.
+"""
+
+import asyncio
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, List, Optional, Set, Tuple
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DATABASE_PATH = os.getenv("ORDERS_DB_PATH", "orders.db")
+# NORMAL only syncs the WAL at checkpoints; FULL syncs on every commit
+DATABASE_SYNCHRONOUS = os.getenv("ORDERS_DB_SYNCHRONOUS", "NORMAL")
+
+
+class _ThreadConnection:
+    """Holds a thread's connection in the thread-local; closes it when the thread is gone."""
+
+    def __init__(self, conn: sqlite3.Connection, database: "Database"):
+        self.conn = conn
+        weakref.finalize(self, database._release, conn)
+
+
+class Database:
+    def __init__(
+        self,
+        path: str = DATABASE_PATH,
+        busy_timeout: float = 5.0,
+        cached_statements: int = 256,
+        begin_retries: int = 5,
+        synchronous: str = DATABASE_SYNCHRONOUS,
+    ):
+        self.path = path
+        self.synchronous = synchronous
+        self.busy_timeout = busy_timeout
+        self.cached_statements = cached_statements
+        self.begin_retries = begin_retries
+        self._local = threading.local()
+        self._connections: Set[sqlite3.Connection] = set()
+        self._lock = threading.Lock()
+
+    def connection(self) -> sqlite3.Connection:
+        """This thread's connection (opened on first use)."""
+        holder = getattr(self._local, "holder", None)
+        if holder is None:
+            conn = sqlite3.connect(
+                self.path,
+                timeout=self.busy_timeout,
+                isolation_level=None,  # transactions are explicit, see transaction()
+                check_same_thread=False,
+                cached_statements=self.cached_statements,
+            )
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(f"PRAGMA synchronous={self.synchronous}")
+            conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout * 1000)}")
+            self._local.holder = holder = _ThreadConnection(conn, self)
+            with self._lock:
+                self._connections.add(conn)
+        return holder.conn
+
+    def _release(self, conn: sqlite3.Connection):
+        with self._lock:
+            self._connections.discard(conn)
+        conn.close()
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """
+        A write transaction. BEGIN IMMEDIATE takes the write lock up front, so
+        two writers can't both start reading and then deadlock upgrading; if
+        the lock is still held after busy_timeout, BEGIN is retried with backoff.
+        """
+        conn = self.connection()
+        for attempt in range(1, self.begin_retries + 1):
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                break
+            except sqlite3.OperationalError as e:
+                if "locked" not in str(e) or attempt == self.begin_retries:
+                    raise
+                delay = 0.05 * 2 ** attempt * random.uniform(0.5, 1.0)
+                logger.warning(f"⚠️ Database busy, retrying BEGIN in {delay:.2f}s")
+                time.sleep(delay)
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        else:
+            conn.execute("COMMIT")
+
+    def query(self, sql: str, params=()) -> List[sqlite3.Row]:
+        return self.connection().execute(sql, params).fetchall()
+
+    def close_all(self):
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+
+WriteFn = Callable[..., Any]
+
+
+class GroupCommitWriter:
+    """
+    Batches concurrent writes into shared transactions.
+
+        order_id = await writer.submit(insert_order, name, email, items, total)
+
+    `fn(conn, *args)` runs inside the batch's transaction under its own
+    SAVEPOINT, so a write that raises only fails its own caller. A batch is
+    flushed when it reaches `max_batch` writes or `max_delay` seconds after
+    its first write arrived, whichever comes first.
+    """
+
+    def __init__(self, database: Database, max_batch: int = 200, max_delay: float = 0.002):
+        self.database = database
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.batches = 0
+        self.writes = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._queue = asyncio.Queue()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Flush what's queued, then stop."""
+        await self._queue.join()
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+
+    async def submit(self, fn: WriteFn, *args) -> Any:
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((fn, args, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                    continue
+                except asyncio.QueueEmpty:
+                    pass
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            try:
+                results = await asyncio.to_thread(self._commit, batch)
+            except Exception as e:
+                logger.error(f"❌ Group commit of {len(batch)} writes failed: {e!r}")
+                results = [(False, e)] * len(batch)
+
+            for (_, _, future), (ok, value) in zip(batch, results):
+                if not future.done():
+                    future.set_result(value) if ok else future.set_exception(value)
+                self._queue.task_done()
+            self.batches += 1
+            self.writes += len(batch)
+
+    def _commit(self, batch) -> List[Tuple[bool, Any]]:
+        results = []
+        with self.database.transaction() as conn:
+            for fn, args, _ in batch:
+                conn.execute("SAVEPOINT write")
+                try:
+                    results.append((True, fn(conn, *args)))
+                except Exception as e:
+                    conn.execute("ROLLBACK TO write")
+                    results.append((False, e))
+                conn.execute("RELEASE write")
+        return results
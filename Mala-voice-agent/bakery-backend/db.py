@@ -1,49 +1,488 @@
-import sqlite3
-import requests
+import hashlib
 import logging
-import re
+import json
+import os
+import time
+from datetime import datetime, timezone
+from typing import Iterator, List, Optional, Tuple
+
+from catalog import Catalog, Product, CATALOG_PATH
+from database import Database, GroupCommitWriter
+from models import Order, OrderItem, TABLES, MIGRATIONS, INDEXES
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # n8n Database webhook URL - PRODUCTION URL (not webhook-test)
-N8N_DATABASE_WEBHOOK = "https://mala-mala.app.n8n.cloud/webhook/DataBase"
+N8N_DATABASE_WEBHOOK = os.getenv("N8N_DATABASE_WEBHOOK", "https://mala-mala.app.n8n.cloud/webhook/DataBase")
+
+db = Database()
+# Order inserts from the API are group-committed (see database.py)
+writer = GroupCommitWriter(
+    db,
+    max_batch=int(os.getenv("GROUP_COMMIT_MAX_BATCH", "200")),
+    max_delay=float(os.getenv("GROUP_COMMIT_MAX_DELAY_MS", "2")) / 1000,
+)
+
+# SQL is kept in constants so each thread's connection prepares it once
+# created_at is set explicitly: columns added by migration have no default
+INSERT_ORDER = """
+INSERT INTO orders (customer_name, email, items, total_price, computed_total, price_check, created_at)
+VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+"""
+INSERT_ORDER_IDEMPOTENT = """
+INSERT OR IGNORE INTO orders
+    (customer_name, email, items, total_price, computed_total, price_check, idempotency_key, created_at)
+VALUES (?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+"""
+INSERT_ORDER_ITEM = """
+INSERT INTO order_items (order_id, sku, description, quantity, unit_price, line_total)
+VALUES (?, ?, ?, ?, ?, ?)
+"""
+SELECT_ORDER_ID_BY_KEY = "SELECT id FROM orders WHERE idempotency_key = ?"
+ORDER_COLUMNS = "id, customer_name, email, items, total_price, idempotency_key, created_at, computed_total, price_check"
+SELECT_ORDER = f"SELECT {ORDER_COLUMNS} FROM orders WHERE id = ?"
+SEED_PRODUCT = """
+INSERT OR IGNORE INTO products (sku, name, category, unit, unit_price, aliases, updated_at)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+UPSERT_PRODUCT = """
+INSERT INTO products (sku, name, category, unit, unit_price, aliases, active, updated_at)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (sku) DO UPDATE SET
+    name = excluded.name, category = excluded.category, unit = excluded.unit,
+    unit_price = excluded.unit_price, aliases = excluded.aliases, active = excluded.active,
+    updated_at = excluded.updated_at
+"""
+# Changes whenever any worker adds or edits a product
+CATALOG_VERSION = "SELECT COUNT(*), MAX(updated_at) FROM products"
+SELECT_PRODUCTS = "SELECT sku, name, category, unit, unit_price, aliases FROM products WHERE active = 1 ORDER BY sku"
+INSERT_CALL_ANALYTICS = "INSERT OR IGNORE INTO call_analytics (idempotency_key, payload) VALUES (?, ?)"
+INSERT_LEAD = """
+INSERT OR IGNORE INTO leads (idempotency_key, customer_name, email, lead_quality, intent, payload)
+VALUES (?, ?, ?, ?, ?, ?)
+"""
+INSERT_CALL_EVENT = """
+INSERT OR IGNORE INTO call_events (idempotency_key, call_id, seq, type, offset_seconds, payload)
+VALUES (?, ?, ?, ?, ?, ?)
+"""
+SELECT_CALL_EVENTS = """
+SELECT seq, type, offset_seconds, payload FROM call_events
+WHERE call_id = ? AND seq > ? ORDER BY seq LIMIT ?
+"""
+INSERT_EMAIL_LOG = (
+    "INSERT OR IGNORE INTO email_log (idempotency_key, to_email, type, fingerprint) VALUES (?, ?, ?, ?)"
+)
+DELETE_EMAIL_LOG = "DELETE FROM email_log WHERE idempotency_key = ?"
+# Same, unless a message with the same fingerprint was logged within the window
+INSERT_EMAIL_LOG_WINDOWED = """
+INSERT OR IGNORE INTO email_log (idempotency_key, to_email, type, fingerprint)
+SELECT ?, ?, ?, ?
+WHERE NOT EXISTS (SELECT 1 FROM email_log WHERE fingerprint = ? AND sent_at >= datetime('now', ?))
+"""
+INSERT_WEBHOOK_JOB = (
+    "INSERT INTO webhook_jobs (label, url, payload, queued_at, idempotency_key) VALUES (?, ?, ?, ?, ?)"
+)
+SELECT_DUE_WEBHOOK_JOBS = """
+SELECT id, label, url, payload, attempts, queued_at, idempotency_key FROM webhook_jobs
+WHERE status = 'pending' AND next_attempt_at <= ? ORDER BY next_attempt_at, id LIMIT ?
+"""
+LEASE_WEBHOOK_JOB = "UPDATE webhook_jobs SET next_attempt_at = ? WHERE id = ?"
+DELETE_WEBHOOK_JOB = "DELETE FROM webhook_jobs WHERE id = ?"
+RETRY_WEBHOOK_JOB = "UPDATE webhook_jobs SET attempts = ?, next_attempt_at = ?, last_error = ? WHERE id = ?"
+FAIL_WEBHOOK_JOB = "UPDATE webhook_jobs SET attempts = ?, status = 'failed', last_error = ? WHERE id = ?"
+COUNT_WEBHOOK_JOBS = """
+SELECT COALESCE(SUM(status = 'pending' AND attempts = 0), 0),
+       COALESCE(SUM(status = 'pending' AND attempts > 0), 0),
+       COALESCE(SUM(status = 'failed'), 0)
+FROM webhook_jobs
+"""
 
-conn = sqlite3.connect("orders.db", check_same_thread=False)
-cursor = conn.cursor()
 
-def parse_items(items_text):
+def init_db():
+    """Create tables and apply additive migrations (safe to run on every start)."""
+    with db.transaction() as conn:
+        for ddl in TABLES:
+            conn.execute(ddl)
+        for table, columns in MIGRATIONS.items():
+            existing = {row["name"] for row in conn.execute(f"PRAGMA table_info({table})")}
+            for column, column_type in columns:
+                if column not in existing:
+                    conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+        for ddl in INDEXES:
+            conn.execute(ddl)
+        seed_catalog(conn)
+
+
+def seed_catalog(conn, path=CATALOG_PATH):
     """
-    Example input: 'Chocolate Crinkle Cupcakes x6'
+    Add catalog.json products the database doesn't have yet. The products
+    table is the live menu — edits made through the API are kept across restarts.
     """
-    match = re.search(r"(.*)\s+x(\d+)", items_text)
-    if match:
-        product_name = match.group(1).strip()
-        amount = int(match.group(2))
-    else:
-        product_name = items_text
-        amount = 1
-    return product_name, amount
+    with open(path, encoding="utf-8") as f:
+        products = json.load(f)["products"]
+    now = time.time()
+    conn.executemany(SEED_PRODUCT, [
+        (p["sku"], p["name"], p["category"], p["unit"], p["unit_price"], json.dumps(p.get("aliases", [])), now)
+        for p in products
+    ])
+
+
+with open(CATALOG_PATH, encoding="utf-8") as _f:
+    PRICING = json.load(_f).get("pricing", {})
+
+init_db()
+
+# In-process copy of the menu used to price orders, and the ETag and version it was built from
+catalog: Optional[Catalog] = None
+catalog_etag: Optional[str] = None
+catalog_version: Optional[tuple] = None
+
+
+def catalog_payload() -> Tuple[dict, str]:
+    """
+    The live menu as served on /catalog, and its ETag (a hash of the content).
+    Rebuilds the in-process `catalog` when the content changed, so edits made
+    through another worker process are picked up here too.
+    """
+    global catalog, catalog_etag, catalog_version
+    # Read before the products: an edit landing in between just triggers another rebuild
+    catalog_version = tuple(db.query(CATALOG_VERSION)[0])
+    products = [
+        {
+            "sku": row["sku"], "name": row["name"], "category": row["category"], "unit": row["unit"],
+            "unit_price": row["unit_price"], "aliases": json.loads(row["aliases"]),
+        }
+        for row in db.query(SELECT_PRODUCTS)
+    ]
+    payload = {"products": products, "pricing": PRICING}
+    etag = '"' + hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()[:16] + '"'
+    if etag != catalog_etag:
+        catalog = Catalog([Product(**p) for p in products], PRICING)
+        catalog_etag = etag
+    return payload, etag
+
+
+def save_product(sku, name, category, unit, unit_price, aliases, active=True):
+    """Create or update a menu item (active=False takes it off the menu; order history keeps it)."""
+    with db.transaction() as conn:
+        conn.execute(UPSERT_PRODUCT, (sku, name, category, unit, unit_price, json.dumps(aliases), int(active), time.time()))
+    catalog_payload()
+    logger.info(f"🧁 Catalog updated: {sku} ({'active' if active else 'inactive'}) Rs {unit_price}/{unit}")
+
+
+catalog_payload()
+
+
+def current_catalog() -> Catalog:
+    """The in-process catalog, rebuilt first if a product changed (in any worker) since it was built."""
+    if tuple(db.query(CATALOG_VERSION)[0]) != catalog_version:
+        catalog_payload()
+    return catalog
+
+
+def _price_order(items, total_price):
+    """Line items for the order text, checked against the quoted total."""
+    prices = current_catalog()
+    line_items = prices.parse(items or "")
+    check = prices.check_total(line_items, total_price)
+    if check.status == "unpriced":
+        check.total = None  # stored as NULL rather than a misleading 0
+    return line_items, check
+
+
+def _insert_line_items(conn, order_id, items, line_items, check):
+    conn.executemany(INSERT_ORDER_ITEM, [
+        (order_id, item.sku, item.description, item.quantity, item.unit_price, item.line_total)
+        for item in line_items
+    ])
+    if check.status == "mismatch":
+        logger.warning(
+            f"⚠️ Order #{order_id}: quoted Rs {check.quoted} but catalog prices "
+            f"{', '.join(map(str, line_items))} at Rs {check.total}"
+        )
+    elif check.status == "unpriced":
+        logger.warning(f"⚠️ Order #{order_id}: no catalog products found in '{items}'")
+
+
+def insert_order(conn, customer_name, email, items, total_price):
+    """Insert one order and its line items inside the caller's transaction. Returns the order id."""
+    line_items, check = _price_order(items, total_price)
+    order_id = conn.execute(
+        INSERT_ORDER, (customer_name, email, items, total_price, check.total, check.status)
+    ).lastrowid
+    _insert_line_items(conn, order_id, items, line_items, check)
+    return order_id
+
+
+def insert_orders(conn, records):
+    """
+    Insert a batch of orders inside the caller's transaction.
+
+    records: [(idempotency_key, customer_name, email, items, total_price), ...]
+    Returns [(idempotency_key, order_id, created), ...] — `created` is False when
+    the key was already stored by an earlier (retried) batch.
+    """
+    results = []
+    for key, customer_name, email, items, total_price in records:
+        line_items, check = _price_order(items, total_price)
+        cur = conn.execute(
+            INSERT_ORDER_IDEMPOTENT, (customer_name, email, items, total_price, check.total, check.status, key)
+        )
+        if cur.rowcount:
+            _insert_line_items(conn, cur.lastrowid, items, line_items, check)
+            results.append((key, cur.lastrowid, True))
+        else:
+            existing = conn.execute(SELECT_ORDER_ID_BY_KEY, (key,)).fetchone()
+            results.append((key, existing["id"], False))
+    return results
 
 
 def save_order(customer_name, email, items, total_price):
-    """Save order to local SQLite database and send to Baserow via n8n"""
-    
-    # Save to local database
-    cursor.execute("""
-    INSERT INTO orders (customer_name, email, items, total_price)
-    VALUES (?, ?, ?, ?)
-    """, (customer_name, email, items, total_price))
-    conn.commit()
-
-    order_id = cursor.lastrowid
+    """Save one order in its own transaction (the API uses `writer` instead)"""
+    with db.transaction() as conn:
+        order_id = insert_order(conn, customer_name, email, items, total_price)
+
     logger.info(f"✅ Order #{order_id} saved to local SQLite database")
+    return order_id
+
+
+def save_orders(records):
+    """Save a batch of orders in one transaction — see insert_orders."""
+    with db.transaction() as conn:
+        results = insert_orders(conn, records)
+    logger.info(f"✅ Saved {sum(1 for r in results if r[2])}/{len(results)} orders to local SQLite database")
+    return results
+
+
+def _with_line_items(orders: List[Order]) -> List[Order]:
+    """Attach line items to a page of orders with one indexed query."""
+    if orders:
+        by_id = {order.id: order for order in orders}
+        rows = db.query(
+            f"SELECT order_id, sku, description, quantity, unit_price, line_total FROM order_items "
+            f"WHERE order_id IN ({', '.join('?' * len(by_id))}) ORDER BY id",
+            list(by_id),
+        )
+        for row in rows:
+            by_id[row["order_id"]].line_items.append(OrderItem.from_row(row))
+    return orders
+
+
+def get_order(order_id) -> Optional[Order]:
+    rows = db.query(SELECT_ORDER, (order_id,))
+    return _with_line_items([Order.from_row(rows[0])])[0] if rows else None
+
+
+def _timestamp(value: datetime) -> str:
+    """Match SQLite's CURRENT_TIMESTAMP format (UTC); naive datetimes are taken as UTC."""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc)
+    return value.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _order_filters(email=None, customer_name=None, since=None, until=None) -> Tuple[List[str], list]:
+    """WHERE clauses for order search."""
+    clauses, params = [], []
+    if email:
+        clauses.append("email = ? COLLATE NOCASE")
+        params.append(email)
+    if customer_name:
+        # Case-insensitive prefix match as an index range
+        clauses.append("customer_name >= ? COLLATE NOCASE AND customer_name < ? COLLATE NOCASE")
+        params += [customer_name, customer_name + "\U0010ffff"]
+    if since:
+        clauses.append("created_at >= ?")
+        params.append(_timestamp(since))
+    if until:
+        clauses.append("created_at < ?")
+        params.append(_timestamp(until))
+    return clauses, params
+
 
-    # Parse items
-    product_name, amount = parse_items(items)
+def _sort_column(email=None, customer_name=None, since=None, until=None) -> Optional[str]:
+    """
+    The column pages are ordered and keyed by (with id as tie-break), chosen
+    so the filter's index also yields the rows in order — no table scan and
+    no sort per page. Every SQLite index ends in the rowid (id), so
+    ix_orders_email serves `email = ? ORDER BY id` as is, while a range on
+    created_at or customer_name can only be walked in (column, id) order.
+    None means plain id order.
+    """
+    if email:
+        return None
+    if since or until:
+        return "created_at"
+    if customer_name:
+        return "customer_name COLLATE NOCASE"
+    return None
+
+
+def list_orders(email=None, customer_name=None, since=None, until=None, before=None, limit=50) -> List[Order]:
+    """
+    One page of orders, newest first — with a name prefix and no dates,
+    grouped by name. Keyset pagination: pass the last id of the previous
+    page as `before` — no OFFSET, so deep pages stay cheap.
+    """
+    clauses, params = _order_filters(email, customer_name, since, until)
+    column = _sort_column(email, customer_name, since, until)
+    if before and column:
+        clauses.append(f"({column}, id) < (SELECT {column}, id FROM orders WHERE id = ?)")
+        params.append(before)
+    elif before:
+        clauses.append("id < ?")
+        params.append(before)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    order = f"{column} DESC, id DESC" if column else "id DESC"
+    rows = db.query(f"SELECT {ORDER_COLUMNS} FROM orders {where} ORDER BY {order} LIMIT ?", (*params, limit))
+    return _with_line_items([Order.from_row(row) for row in rows])
+
+
+def iter_orders(email=None, customer_name=None, since=None, until=None, chunk_size=500) -> Iterator[Order]:
+    """
+    Every matching order, oldest first (grouped by name for a name-only
+    search), fetched `chunk_size` rows at a time by keyset — memory stays
+    flat and no read transaction is held open between chunks, so exports
+    don't block checkpoints.
+    """
+    clauses, params = _order_filters(email, customer_name, since, until)
+    column = _sort_column(email, customer_name, since, until)
+    if column:
+        select = f"SELECT {ORDER_COLUMNS}, {column} AS sort_key FROM orders"
+        keyset, order = f"({column}, id) > (?, ?)", f"{column}, id"
+    else:
+        select, keyset, order = f"SELECT {ORDER_COLUMNS} FROM orders", "id > ?", "id"
+    after: tuple = ()
+    while True:
+        where = clauses + [keyset] if after else clauses
+        sql = f"{select} {'WHERE ' + ' AND '.join(where) if where else ''} ORDER BY {order} LIMIT ?"
+        rows = db.query(sql, (*params, *after, chunk_size))
+        yield from _with_line_items([Order.from_row(row) for row in rows])
+        if len(rows) < chunk_size:
+            return
+        after = (rows[-1]["sort_key"], rows[-1]["id"]) if column else (rows[-1]["id"],)
+
+
+def save_call_analytics(records):
+    """records: [(idempotency_key, summary_dict), ...]. Returns number of new rows."""
+    with db.transaction() as conn:
+        before = conn.total_changes
+        conn.executemany(INSERT_CALL_ANALYTICS, [(key, json.dumps(summary)) for key, summary in records])
+        return conn.total_changes - before
+
+
+def save_leads(records):
+    """records: [(idempotency_key, lead_dict), ...]. Returns number of new rows."""
+    with db.transaction() as conn:
+        before = conn.total_changes
+        conn.executemany(INSERT_LEAD, [
+            (key, lead.get("customer_name"), lead.get("email"), lead.get("lead_quality"),
+             lead.get("intent"), json.dumps(lead))
+            for key, lead in records
+        ])
+        return conn.total_changes - before
+
+
+def save_call_events(records):
+    """records: [(idempotency_key, event_dict), ...]. Returns number of new rows."""
+    with db.transaction() as conn:
+        before = conn.total_changes
+        conn.executemany(INSERT_CALL_EVENT, [
+            (key, event["call_id"], event["seq"], event["type"], event.get("offset"), json.dumps(event.get("data", {})))
+            for key, event in records
+        ])
+        return conn.total_changes - before
+
+
+def get_call_events(call_id, after_seq=0, limit=500):
+    """Events of one call with seq > after_seq, in order — for live dashboards."""
+    rows = db.query(SELECT_CALL_EVENTS, (call_id, after_seq, limit))
+    return [
+        {"seq": seq, "type": event_type, "offset": offset, "data": json.loads(payload)}
+        for seq, event_type, offset, payload in rows
+    ]
+
+
+def claim_email(conn, idempotency_key, to_email, email_type, fingerprint=None, window=0):
+    """
+    Record an email as sent, inside the caller's transaction (the one that
+    queues its delivery). Returns False if this key was already sent, or if
+    an email with the same fingerprint was sent in the last `window` seconds.
+    """
+    if fingerprint and window > 0:
+        cur = conn.execute(INSERT_EMAIL_LOG_WINDOWED, (
+            idempotency_key, to_email, email_type, fingerprint, fingerprint, f"-{int(window)} seconds",
+        ))
+    else:
+        cur = conn.execute(INSERT_EMAIL_LOG, (idempotency_key, to_email, email_type, fingerprint))
+    return cur.rowcount == 1
 
-    # Prepare payload for Baserow
-    payload = {
+
+def release_email(idempotency_key):
+    """Forget a claimed email whose delivery failed for good, so the event can send it again."""
+    with db.transaction() as conn:
+        conn.execute(DELETE_EMAIL_LOG, (idempotency_key,))
+
+
+# =========================
+# Webhook jobs (fanout.py). The writes run inside GroupCommitWriter batches.
+# =========================
+def insert_webhook_job(conn, label, url, payload, idempotency_key=None):
+    return conn.execute(
+        INSERT_WEBHOOK_JOB, (label, url, json.dumps(payload), time.time(), idempotency_key)
+    ).lastrowid
+
+
+def claim_webhook_jobs(conn, limit, lease):
+    """
+    Lease up to `limit` due jobs: they stay invisible to other processes for
+    `lease` seconds, so a job held by a worker that died is picked up again.
+    Returns [(id, label, url, payload, attempts, queued_at, idempotency_key), ...].
+    """
+    now = time.time()
+    rows = conn.execute(SELECT_DUE_WEBHOOK_JOBS, (now, limit)).fetchall()
+    conn.executemany(LEASE_WEBHOOK_JOB, [(now + lease, row["id"]) for row in rows])
+    return [
+        (row["id"], row["label"], row["url"], json.loads(row["payload"]), row["attempts"], row["queued_at"],
+         row["idempotency_key"])
+        for row in rows
+    ]
+
+
+def finish_webhook_job(conn, job_id):
+    conn.execute(DELETE_WEBHOOK_JOB, (job_id,))
+
+
+def retry_webhook_job(conn, job_id, attempts, delay, error):
+    conn.execute(RETRY_WEBHOOK_JOB, (attempts, time.time() + delay, error, job_id))
+
+
+def fail_webhook_job(conn, job_id, attempts, error):
+    conn.execute(FAIL_WEBHOOK_JOB, (attempts, error, job_id))
+
+
+def release_webhook_jobs(conn, job_ids):
+    """Hand leased jobs back (e.g. at shutdown) so the next process sends them right away."""
+    conn.executemany(LEASE_WEBHOOK_JOB, [(0, job_id) for job_id in job_ids])
+
+
+def webhook_job_counts():
+    """(queued, retry_pending, failed) across all processes."""
+    return tuple(db.query(COUNT_WEBHOOK_JOBS)[0])
+
+
+def baserow_payload(order_id, customer_name, email, items, total_price):
+    """Row sent to Baserow via the n8n Database webhook for a saved order (runs a query: keep it off the loop)."""
+    line_items = current_catalog().parse(items)
+    if len(line_items) == 1:
+        product_name, amount = line_items[0].description, line_items[0].quantity
+    elif line_items:
+        product_name, amount = ", ".join(map(str, line_items)), sum(item.quantity for item in line_items)
+    else:
+        product_name, amount = items, 1
+    if amount == int(amount):
+        amount = int(amount)
+    return {
         "orderid": order_id,
         "name": customer_name,
         "email": email,
@@ -51,20 +490,3 @@ def save_order(customer_name, email, items, total_price):
         "amount": amount,
         "price": total_price
     }
-
-    # Send to Baserow via n8n webhook
-    try:
-        logger.info(f"📤 Sending order #{order_id} to Baserow webhook...")
-        response = requests.post(
-            N8N_DATABASE_WEBHOOK,
-            json=payload,
-            timeout=10
-        )
-        
-        if response.status_code == 200:
-            logger.info(f"✅ Order #{order_id} sent to Baserow via n8n")
-        else:
-            logger.warning(f"⚠️ Baserow webhook returned status: {response.status_code} - {response.text}")
-            
-    except Exception as e:
-        logger.error(f"❌ Failed to send order #{order_id} to Baserow: {e}")
\ No newline at end of file
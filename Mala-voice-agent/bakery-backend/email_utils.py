@@ -1,5 +1,5 @@
-import requests
 import logging
+import os
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -12,13 +12,13 @@ env_path = BASE_DIR / ".env.local"
 load_dotenv(dotenv_path=env_path)
 
 # n8n Email webhook URL - PRODUCTION URL (not webhook-test)
-N8N_EMAIL_WEBHOOK = "https://mala-mala.app.n8n.cloud/webhook/Email"
+N8N_EMAIL_WEBHOOK = os.getenv("N8N_EMAIL_WEBHOOK", "https://mala-mala.app.n8n.cloud/webhook/Email")
 
 
-def send_order_confirmation(to_email, customer_name, items, total_price):
-    """Send order confirmation email via n8n webhook"""
+def order_confirmation_payload(to_email, customer_name, items, total_price):
+    """Order confirmation email for the n8n Email webhook"""
 
-    payload = {
+    return {
         "to_email": to_email,
         "customer_name": customer_name,
         "items": items,
@@ -41,18 +41,12 @@ Crincle Cupkakes 🍰
 """
     }
 
-    try:
-        logger.info(f"📤 Sending confirmation email to {to_email}...")
-        response = requests.post(
-            N8N_EMAIL_WEBHOOK,
-            json=payload,
-            timeout=10
-        )
-        
-        if response.status_code == 200:
-            logger.info(f"✅ Confirmation email sent to {to_email}")
-        else:
-            logger.warning(f"⚠️ Email webhook returned status: {response.status_code} - {response.text}")
-            
-    except Exception as e:
-        logger.error(f"❌ Failed to send email to {to_email}: {e}")
\ No newline at end of file
+
+def email_payload(to_email, subject, body):
+    """Generic notification email (e.g. a call summary) for the n8n Email webhook"""
+
+    return {
+        "to_email": to_email,
+        "subject": subject,
+        "body": body,
+    }
@@ -0,0 +1,207 @@
+"""
+fanout.py — Background webhook fan-out for orders and emails.
+
+Handlers commit the order locally and hand the n8n calls (Baserow row,
+confirmation email) to this pipeline instead of making two blocking
+10s-timeout requests inline. Each call is a row in the webhook_jobs table,
+inserted with `db.insert_webhook_job` in the same transaction as the event
+it delivers — an order's jobs are written by the writer function that
+inserts the order — so a committed order always has its jobs. `wake()`
+after the commit starts delivery right away. The rows are delivered by a
+fixed number of async workers on one pooled aiohttp session:
+
+  - delivered        the row is deleted
+  - failed           it is rescheduled with exponential backoff; after
+                     max_attempts it stays in the table as 'failed'
+  - shutdown/crash   nothing is lost: undelivered rows are picked up by
+                     the next start (or by another worker process)
+
+Like the agent's outbox, jobs are claimed with a lease, so several
+uvicorn workers can share the table without sending a job twice. Only
+`queue_size` jobs are held in memory at a time; a slow n8n grows the
+table, not the process.
+"""
+
+import asyncio
+import logging
+import os
+import random
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+import aiohttp
+
+from db import (
+    claim_webhook_jobs, fail_webhook_job, finish_webhook_job, insert_webhook_job,
+    release_webhook_jobs, retry_webhook_job, webhook_job_counts, writer,
+)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class WebhookJob:
+    id: int
+    label: str
+    url: str
+    payload: dict
+    attempts: int
+    queued_at: float
+    key: Optional[str] = None  # idempotency key of the event this call delivers, if any
+
+
+class WebhookFanout:
+    def __init__(
+        self,
+        concurrency: int = 8,
+        max_attempts: int = 5,
+        queue_size: int = 64,
+        timeout: float = 10,
+        base_backoff: float = 1.0,
+        max_backoff: float = 30.0,
+        lease: float = 120.0,
+        poll_interval: float = 0.5,
+    ):
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self._queue: Optional[asyncio.Queue] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._claimer: Optional[asyncio.Task] = None
+        self._workers: Set[asyncio.Task] = set()
+        self._held: Set[int] = set()  # claimed by this process, not finished yet
+        self.counts: Dict[str, int] = {"delivered": 0, "retried": 0, "failed": 0}
+        # Called with each job that used up its attempts (see notifications.Notifier)
+        self.on_failed: List[Callable[[WebhookJob], Awaitable[None]]] = []
+        self.in_flight = 0
+
+    async def start(self):
+        """Start delivering, beginning with whatever an earlier run left in the table."""
+        self._queue = asyncio.Queue()
+        self._wake = asyncio.Event()
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.concurrency, keepalive_timeout=30),
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+        )
+        self._workers = {asyncio.create_task(self._worker()) for _ in range(self.concurrency)}
+        self._claimer = asyncio.create_task(self._claim_loop())
+        queued, retry_pending, _ = await asyncio.to_thread(webhook_job_counts)
+        logger.info(f"🚚 Webhook fan-out started ({self.concurrency} workers, {queued + retry_pending} pending)")
+
+    async def stop(self, drain_timeout: float = 10):
+        """Give claimed deliveries a chance to finish; the rest stay in the table for the next start."""
+        self._claimer.cancel()
+        await asyncio.gather(self._claimer, return_exceptions=True)
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=drain_timeout)
+        except asyncio.TimeoutError:
+            pass
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        if self._held:
+            await writer.submit(release_webhook_jobs, list(self._held))
+        queued, retry_pending, _ = await asyncio.to_thread(webhook_job_counts)
+        if queued or retry_pending:
+            logger.warning(f"⚠️ Shutting down with {queued + retry_pending} webhook(s) pending; they resume on the next start")
+        await self._session.close()
+
+    async def submit(self, label: str, url: str, payload: dict, key: Optional[str] = None):
+        """Durably queue one webhook call on its own (see the module docstring for queuing it with its event)."""
+        await writer.submit(insert_webhook_job, label, url, payload, key)
+        self.wake()
+
+    def wake(self):
+        """Claim newly committed jobs now rather than at the next poll."""
+        if self._wake:  # not started yet: the job waits in the table
+            self._wake.set()
+
+    async def _claim_loop(self):
+        while True:
+            space = self.queue_size - len(self._held)
+            jobs = []
+            if space > 0:
+                try:
+                    jobs = await writer.submit(claim_webhook_jobs, space, self.lease)
+                except Exception as e:
+                    logger.error(f"❌ Claiming webhook jobs failed: {e!r}")
+                for row in jobs:
+                    job = WebhookJob(*row)
+                    self._held.add(job.id)
+                    self._queue.put_nowait(job)
+            if not jobs or len(jobs) < space:
+                # Nothing more due — wait for a submit, a free slot or the next retry to come due
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wake.clear()
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            self.in_flight += 1
+            try:
+                await self._deliver(job)
+            except Exception as e:
+                # The lease runs out and the job is claimed again
+                logger.error(f"❌ {job.label}: could not record delivery result: {e!r}")
+            finally:
+                self._held.discard(job.id)
+                self.in_flight -= 1
+                self._queue.task_done()
+                if len(self._held) < self.queue_size // 2:
+                    self._wake.set()
+
+    async def _deliver(self, job: WebhookJob):
+        job.attempts += 1
+        try:
+            async with self._session.post(job.url, json=job.payload) as response:
+                if response.status == 200:
+                    await writer.submit(finish_webhook_job, job.id)
+                    self.counts["delivered"] += 1
+                    logger.info(f"✅ {job.label} delivered ({time.time() - job.queued_at:.2f}s after queueing)")
+                    return
+                error = f"status {response.status} - {await response.text()}"
+        except Exception as e:
+            error = repr(e)
+
+        if job.attempts >= self.max_attempts:
+            await writer.submit(fail_webhook_job, job.id, job.attempts, error)
+            self.counts["failed"] += 1
+            logger.error(f"❌ {job.label} failed after {job.attempts} attempts: {error}")
+            for callback in self.on_failed:
+                await callback(job)
+            return
+
+        delay = min(self.max_backoff, self.base_backoff * 2 ** (job.attempts - 1)) * random.uniform(0.5, 1.0)
+        await writer.submit(retry_webhook_job, job.id, job.attempts, delay, error)
+        self.counts["retried"] += 1
+        logger.warning(f"⚠️ {job.label} failed ({error}) — retrying in {delay:.1f}s")
+
+    def stats(self) -> Dict:
+        """Queue depth across all processes (from the table) and this process's delivery counts."""
+        queued, retry_pending, dead = webhook_job_counts()
+        return {
+            "queued": queued,
+            "in_flight": self.in_flight,
+            "retry_pending": retry_pending,
+            "dead_letter": dead,
+            **self.counts,
+        }
+
+
+fanout = WebhookFanout(
+    concurrency=int(os.getenv("FANOUT_CONCURRENCY", "8")),
+    max_attempts=int(os.getenv("FANOUT_MAX_ATTEMPTS", "5")),
+    queue_size=int(os.getenv("FANOUT_QUEUE_SIZE", "64")),
+    timeout=float(os.getenv("WEBHOOK_TIMEOUT", "10")),
+)
@@ -1,19 +1,73 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from dataclasses import asdict
+from datetime import datetime
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from db import save_order
-from email_utils import send_order_confirmation
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field
+from typing import List, Optional
+from db import (
+    insert_order, insert_orders, save_call_analytics, save_leads, save_call_events, insert_webhook_job,
+    get_call_events, get_order, list_orders, iter_orders, catalog_payload, save_product, baserow_payload, N8N_DATABASE_WEBHOOK, ORDER_COLUMNS, db, writer,
+)
+from email_utils import email_payload
+from fanout import fanout
+from notifications import notifier
+import csv
+import io
+import json
 import logging
+import os
+import secrets
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI()
+# Required in X-Admin-Token to edit the menu; unset = menu editing disabled
+CATALOG_ADMIN_TOKEN = os.getenv("CATALOG_ADMIN_TOKEN")
+# Required in X-Admin-Token (or the catalog admin token) to read orders and call
+# events — customer names, emails and transcripts; neither set = those reads disabled
+STAFF_API_TOKEN = os.getenv("STAFF_API_TOKEN")
+# Browser origins allowed to call the API (comma-separated)
+CORS_ALLOW_ORIGINS = [o.strip() for o in os.getenv("CORS_ALLOW_ORIGINS", "*").split(",") if o.strip()]
+
+
+def _check_token(given: Optional[str], accepted: List[Optional[str]], disabled: str):
+    accepted = [token for token in accepted if token]
+    if not accepted:
+        raise HTTPException(status_code=403, detail=disabled)
+    if not given or not any(secrets.compare_digest(given, token) for token in accepted):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    _check_token(x_admin_token, [CATALOG_ADMIN_TOKEN], "Menu editing is disabled (CATALOG_ADMIN_TOKEN not set)")
+
+
+def require_staff(x_admin_token: Optional[str] = Header(None)):
+    _check_token(
+        x_admin_token, [STAFF_API_TOKEN, CATALOG_ADMIN_TOKEN],
+        "Order and call data access is disabled (STAFF_API_TOKEN not set)",
+    )
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # The fan-out stores and claims its jobs through the writer: start it first, stop it last
+    writer.start()
+    await fanout.start()
+    yield
+    await fanout.stop()
+    await writer.stop()
+    db.close_all()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # ✅ ADD CORS HERE
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],
+    allow_origins=CORS_ALLOW_ORIGINS,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
@@ -24,28 +78,237 @@ class Order(BaseModel):
     customer_name: str
     email: str
     items: str
-    total_price: int
+    total_price: float
+
+
+def fan_out_order(conn, order_id: int, order: Order):
+    """
+    Queue the Baserow row and the (single) confirmation email for a newly
+    saved order, in the transaction that inserted it: both commit or neither.
+    """
+    insert_webhook_job(
+        conn,
+        f"order #{order_id} → Baserow",
+        N8N_DATABASE_WEBHOOK,
+        baserow_payload(order_id, order.customer_name, order.email, order.items, order.total_price),
+    )
+    notifier.queue_order_confirmation(conn, order_id, order.email, order.customer_name, order.items, order.total_price)
+
+
+def insert_order_with_fan_out(conn, order: Order):
+    order_id = insert_order(conn, order.customer_name, order.email, order.items, order.total_price)
+    fan_out_order(conn, order_id, order)
+    return order_id
+
+
+def insert_orders_with_fan_out(conn, records: List["OrderRecord"]):
+    """Bulk `insert_order_with_fan_out`: only orders that are new are fanned out — duplicates were the first time."""
+    results = insert_orders(conn, [
+        (r.idempotency_key, r.data.customer_name, r.data.email, r.data.items, r.data.total_price)
+        for r in records
+    ])
+    for record, (_, order_id, created) in zip(records, results):
+        if created:
+            fan_out_order(conn, order_id, record.data)
+    return results
 
 
 @app.post("/place-order")
-def place_order(order: Order):
+async def place_order(order: Order):
     logger.info(f"📥 Received order from: {order.customer_name}")
-    
-    # 1. Save to local SQLite database + send to Baserow via n8n
-    save_order(
-        order.customer_name,
-        order.email,
-        order.items,
-        order.total_price
-    )
-    
-    # 2. Send confirmation email via n8n
-    send_order_confirmation(
-        order.email,
-        order.customer_name,
-        order.items,
-        order.total_price
-    )
+
+    # 1. Save to local SQLite database (group-committed with concurrent orders),
+    #    along with its Baserow + confirmation email jobs for the background fan-out
+    order_id = await writer.submit(insert_order_with_fan_out, order)
+    logger.info(f"✅ Order #{order_id} saved to local SQLite database")
+
+    # 2. Deliver them now rather than at the fan-out's next poll
+    fanout.wake()
+
+    return {"status": "Order placed successfully", "order_id": order_id}
+
+
+# =========================
+# Order queries (staff dashboards, analytics exports) — staff token required
+# =========================
+@app.get("/orders", dependencies=[Depends(require_staff)])
+def search_orders(
+    email: Optional[str] = None,
+    customer_name: Optional[str] = Query(None, description="Case-insensitive prefix"),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    before: Optional[int] = Query(None, description="`next_before` from the previous page"),
+    limit: int = Query(50, ge=1, le=500),
+):
+    orders = list_orders(email, customer_name, since, until, before, limit)
+    return {
+        "orders": orders,
+        "next_before": orders[-1].id if len(orders) == limit else None,
+    }
+
+
+@app.get("/orders/export", dependencies=[Depends(require_staff)])
+def export_orders(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    email: Optional[str] = None,
+    customer_name: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+):
+    """Stream every matching order, oldest first, without loading the table into memory."""
+    orders = iter_orders(email, customer_name, since, until)
+
+    if format == "csv":
+        def rows():
+            buffer = io.StringIO()
+            csv_writer = csv.DictWriter(buffer, fieldnames=ORDER_COLUMNS.split(", ") + ["line_items"])
+            csv_writer.writeheader()
+            for order in orders:
+                csv_writer.writerow({**asdict(order), "line_items": "; ".join(map(str, order.line_items))})
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+            yield buffer.getvalue()
+        return StreamingResponse(rows(), media_type="text/csv",
+                                 headers={"Content-Disposition": "attachment; filename=orders.csv"})
+
+    return StreamingResponse((json.dumps(asdict(order)) + "\n" for order in orders),
+                             media_type="application/x-ndjson")
+
+
+@app.get("/orders/{order_id}", dependencies=[Depends(require_staff)])
+def read_order(order_id: int):
+    order = get_order(order_id)
+    if order is None:
+        raise HTTPException(status_code=404, detail="Order not found")
+    return order
+
+
+# =========================
+# Catalog (menu + pricing rules)
+# Agents cache it and revalidate with If-None-Match, so an unchanged menu is a 304
+# =========================
+@app.get("/catalog")
+def read_catalog(request: Request):
+    payload, etag = catalog_payload()
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=60"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(payload, headers=headers)
+
+
+class ProductUpdate(BaseModel):
+    name: str
+    category: str
+    unit: str = "each"
+    unit_price: float = Field(gt=0)
+    aliases: List[str] = []
+    active: bool = True
+
+
+@app.put("/catalog/products/{sku}", dependencies=[Depends(require_admin)])
+def update_product(sku: str, product: ProductUpdate):
+    save_product(sku, product.name, product.category, product.unit, product.unit_price, product.aliases, product.active)
+    _, etag = catalog_payload()
+    return {"status": "ok", "sku": sku, "etag": etag}
+
+
+# =========================
+# Bulk endpoints (agent outbox)
+# Each record carries an idempotency key, so a retried batch is a no-op
+# =========================
+class OrderRecord(BaseModel):
+    idempotency_key: str
+    data: Order
+
+
+class OrderBatch(BaseModel):
+    records: List[OrderRecord]
+
+
+class Record(BaseModel):
+    idempotency_key: str
+    data: dict
+
+
+class RecordBatch(BaseModel):
+    records: List[Record]
+
+
+@app.post("/place-orders")
+async def place_orders(batch: OrderBatch):
+    logger.info(f"📥 Received batch of {len(batch.records)} orders")
+
+    # The orders and their fan-out jobs commit together, in one writer round trip
+    results = await writer.submit(insert_orders_with_fan_out, batch.records)
+    logger.info(f"✅ Saved {sum(1 for r in results if r[2])}/{len(results)} orders to local SQLite database")
+    fanout.wake()
+
+    return {
+        "status": "ok",
+        "orders": [
+            {"idempotency_key": key, "order_id": order_id, "created": created}
+            for key, order_id, created in results
+        ],
+    }
+
+
+@app.post("/call-analytics/batch")
+def call_analytics_batch(batch: RecordBatch):
+    created = save_call_analytics([(r.idempotency_key, r.data) for r in batch.records])
+    logger.info(f"📊 Stored {created}/{len(batch.records)} call summaries")
+    return {"status": "ok", "created": created}
+
+
+@app.post("/leads/batch")
+def leads_batch(batch: RecordBatch):
+    created = save_leads([(r.idempotency_key, r.data) for r in batch.records])
+    logger.info(f"🧲 Stored {created}/{len(batch.records)} leads")
+    return {"status": "ok", "created": created}
+
+
+@app.post("/send-email/batch")
+async def send_email_batch(batch: RecordBatch):
+    sent = 0
+    for r in batch.records:
+        email = r.data
+        data = email.get("data") or {}
+        # Order confirmations are normally sent by /place-order; one arriving here
+        # (e.g. from an older agent) has the same fingerprint and is dropped in the window
+        if email.get("type") == "order_confirmation":
+            queued = await notifier.legacy_order_confirmation(
+                r.idempotency_key, email.get("to"), data.get("customer_name"), data.get("items"), data.get("total_price")
+            )
+        else:
+            payload = email_payload(email.get("to"), email.get("subject"), json.dumps(data, indent=2))
+            content = (email.get("subject"), json.dumps(data, sort_keys=True))
+            queued = await notifier.send(r.idempotency_key, email.get("to"), email.get("type"), payload, content)
+        if queued:
+            sent += 1
+    return {"status": "ok", "sent": sent}
+
+
+# =========================
+# Live call event ingest
+# =========================
+@app.post("/call-events/batch")
+def call_events_batch(batch: RecordBatch):
+    created = save_call_events([(r.idempotency_key, r.data) for r in batch.records])
+    return {"status": "ok", "created": created}
+
+
+@app.get("/calls/{call_id}/events", dependencies=[Depends(require_staff)])
+def call_events(call_id: str, after: int = 0, limit: int = 500):
+    """Poll with `after` = last seq seen to follow a call live."""
+    events = get_call_events(call_id, after, min(limit, 1000))
+    return {
+        "call_id": call_id,
+        "events": events,
+        "next_after": events[-1]["seq"] if events else after,
+    }
 
 
-    return {"status": "Order placed successfully"}
+@app.get("/fanout/stats")
+def fanout_stats():
+    """Webhook fan-out queue depth and delivery counts, and deduplicated emails."""
+    return {**fanout.stats(), "notifications": notifier.stats()}
@@ -1,11 +1,177 @@
-from sqlalchemy import Column, Integer, String, Float
-from database import Base
+"""
+models.py — Table definitions and row models for orders.db.
 
-class Order(Base):
-    __tablename__ = "orders"
+The schema lives here as plain DDL (applied by db.init_db); rows read back
+from the database are turned into these dataclasses.
+"""
 
-    id = Column(Integer, primary_key=True, index=True)
-    customer_name = Column(String)
-    email = Column(String)
-    items = Column(String)
-    total_price = Column(Float)
+import sqlite3
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+
+@dataclass
+class OrderItem:
+    sku: Optional[str]
+    description: str
+    quantity: float
+    unit_price: float
+    line_total: float
+
+    @classmethod
+    def from_row(cls, row: sqlite3.Row) -> "OrderItem":
+        return cls(**{name: row[name] for name in cls.__dataclass_fields__})
+
+    def __str__(self) -> str:
+        quantity = int(self.quantity) if self.quantity == int(self.quantity) else self.quantity
+        return f"{self.description} x{quantity}"
+
+
+@dataclass
+class Order:
+    id: int
+    customer_name: str
+    email: str
+    items: str          # the text the customer confirmed, as spoken
+    total_price: float  # the total quoted on the call
+    idempotency_key: Optional[str] = None
+    created_at: Optional[str] = None  # UTC "YYYY-MM-DD HH:MM:SS"; NULL for orders placed before it existed
+    computed_total: Optional[float] = None  # catalog price of line_items
+    price_check: Optional[str] = None       # "ok" | "mismatch" | "unpriced"
+    line_items: List[OrderItem] = field(default_factory=list)
+
+    @classmethod
+    def from_row(cls, row: sqlite3.Row) -> "Order":
+        columns = row.keys()
+        return cls(**{name: row[name] for name in cls.__dataclass_fields__ if name in columns})
+
+
+TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS orders (
+        id INTEGER NOT NULL PRIMARY KEY,
+        customer_name VARCHAR,
+        email VARCHAR,
+        items VARCHAR,
+        total_price FLOAT,
+        idempotency_key VARCHAR,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        computed_total FLOAT,
+        price_check VARCHAR
+    )
+    """,
+    # Menu; seeded and updated from catalog.json on start (db.seed_catalog)
+    """
+    CREATE TABLE IF NOT EXISTS products (
+        sku VARCHAR PRIMARY KEY,
+        name VARCHAR NOT NULL,
+        category VARCHAR NOT NULL,
+        unit VARCHAR NOT NULL,
+        unit_price FLOAT NOT NULL,
+        aliases TEXT NOT NULL DEFAULT '[]',
+        active INTEGER NOT NULL DEFAULT 1,
+        updated_at FLOAT NOT NULL DEFAULT 0
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS order_items (
+        id INTEGER PRIMARY KEY,
+        order_id INTEGER NOT NULL REFERENCES orders (id),
+        sku VARCHAR REFERENCES products (sku),
+        description VARCHAR NOT NULL,
+        quantity FLOAT NOT NULL,
+        unit_price FLOAT NOT NULL,
+        line_total FLOAT NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS call_analytics (
+        id INTEGER PRIMARY KEY,
+        idempotency_key VARCHAR NOT NULL UNIQUE,
+        payload TEXT NOT NULL,
+        received_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS leads (
+        id INTEGER PRIMARY KEY,
+        idempotency_key VARCHAR NOT NULL UNIQUE,
+        customer_name VARCHAR,
+        email VARCHAR,
+        lead_quality VARCHAR,
+        intent VARCHAR,
+        payload TEXT NOT NULL,
+        received_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    # Live call events streamed by the agent (turns, FAQ hits, holds, transfers...)
+    """
+    CREATE TABLE IF NOT EXISTS call_events (
+        id INTEGER PRIMARY KEY,
+        idempotency_key VARCHAR NOT NULL UNIQUE,
+        call_id VARCHAR NOT NULL,
+        seq INTEGER NOT NULL,
+        type VARCHAR NOT NULL,
+        offset_seconds FLOAT,
+        payload TEXT NOT NULL,
+        received_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    # Keys of emails already handed to n8n, so a retried batch doesn't resend
+    """
+    CREATE TABLE IF NOT EXISTS email_log (
+        idempotency_key VARCHAR PRIMARY KEY,
+        to_email VARCHAR,
+        type VARCHAR,
+        sent_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        fingerprint VARCHAR
+    )
+    """,
+    # Pending n8n webhook calls (fanout.py); a row is deleted once delivered,
+    # and kept as status 'failed' once it has used up its attempts
+    """
+    CREATE TABLE IF NOT EXISTS webhook_jobs (
+        id INTEGER PRIMARY KEY,
+        label VARCHAR NOT NULL,
+        url VARCHAR NOT NULL,
+        payload TEXT NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        next_attempt_at FLOAT NOT NULL DEFAULT 0,
+        status VARCHAR NOT NULL DEFAULT 'pending',
+        last_error VARCHAR,
+        queued_at FLOAT NOT NULL,
+        idempotency_key VARCHAR
+    )
+    """,
+]
+
+# Columns added after the first release; init_db adds them to older databases
+MIGRATIONS = {
+    "orders": [
+        ("idempotency_key", "VARCHAR"),
+        ("created_at", "TIMESTAMP"),
+        ("computed_total", "FLOAT"),
+        ("price_check", "VARCHAR"),
+    ],
+    "email_log": [
+        ("fingerprint", "VARCHAR"),
+    ],
+    "products": [
+        ("updated_at", "FLOAT NOT NULL DEFAULT 0"),
+    ],
+}
+
+INDEXES = [
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_orders_idempotency_key ON orders (idempotency_key)",
+    # Order search: every index also carries the rowid, so `email = ? AND id < ?` is one range scan.
+    # A created_at or customer_name range comes out in (column, id) order, so those
+    # searches are paged by that key instead of by id (db._sort_column)
+    "CREATE INDEX IF NOT EXISTS ix_orders_email ON orders (email COLLATE NOCASE)",
+    "CREATE INDEX IF NOT EXISTS ix_orders_customer_name ON orders (customer_name COLLATE NOCASE)",
+    "CREATE INDEX IF NOT EXISTS ix_orders_created_at ON orders (created_at)",
+    "CREATE INDEX IF NOT EXISTS ix_order_items_order_id ON order_items (order_id)",
+    "CREATE INDEX IF NOT EXISTS ix_order_items_sku ON order_items (sku)",
+    "CREATE INDEX IF NOT EXISTS ix_call_events_call_seq ON call_events (call_id, seq)",
+    "CREATE INDEX IF NOT EXISTS ix_email_log_fingerprint ON email_log (fingerprint, sent_at)",
+    "CREATE INDEX IF NOT EXISTS ix_webhook_jobs_due ON webhook_jobs (status, next_attempt_at)",
+]
@@ -0,0 +1,122 @@
+"""
+notifications.py — Customer and staff emails, each delivered once.
+
+A confirmed order used to trigger up to three confirmation emails: the
+backend's own after /place-order, the agent's order_confirmation record
+on /send-email, and the LLM's send_email tool. Every backend email now
+goes through `Notifier.send`:
+
+  - idempotency key   names the event ("order:42:confirmation"), so a
+                      retried or replayed event is dropped
+  - fingerprint       the recipient, kind and content (items + total for
+                      an order, otherwise subject + data). Only the legacy
+                      order_confirmation on /send-email checks it: it is
+                      dropped if the backend's own confirmation of the same
+                      order went out within NOTIFY_DEDUP_WINDOW seconds.
+                      Two real orders with the same items are both confirmed
+  - transport         the configured email transport: the n8n Email
+                      webhook, delivered by the background fan-out
+
+Both checks are one insert into email_log, made in the same transaction
+that queues the delivery job (for an order confirmation, the order's own
+transaction), so a claim never outlives a lost job. The fan-out keeps the
+job until n8n accepts it; if it fails for good, the email_log row is
+removed again so a retry of the event can send it.
+"""
+
+import hashlib
+import json
+import logging
+import os
+from typing import Dict, Iterable
+
+from fastapi.concurrency import run_in_threadpool
+
+from db import claim_email, insert_webhook_job, release_email, writer
+from email_utils import N8N_EMAIL_WEBHOOK, order_confirmation_payload
+from fanout import WebhookFanout, WebhookJob, fanout
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+NOTIFY_DEDUP_WINDOW = int(os.getenv("NOTIFY_DEDUP_WINDOW", "600"))
+
+
+def fingerprint(to_email: str, kind: str, content: Iterable) -> str:
+    normalized = [" ".join(str(part).lower().split()) for part in content]
+    key = json.dumps([to_email.strip().lower(), kind, normalized])
+    return hashlib.sha256(key.encode()).hexdigest()[:32]
+
+
+def order_content(items, total_price) -> tuple:
+    return items, float(total_price) if total_price is not None else None
+
+
+class Notifier:
+    def __init__(self, fanout: WebhookFanout, webhook: str = N8N_EMAIL_WEBHOOK, window: int = NOTIFY_DEDUP_WINDOW):
+        self.fanout = fanout
+        self.webhook = webhook
+        self.window = window
+        self.counts = {"sent": 0, "duplicate": 0, "released": 0}
+        fanout.on_failed.append(self._release)
+
+    async def send(
+        self, key: str, to_email: str, kind: str, payload: dict, content: Iterable = (), window: int = 0
+    ) -> bool:
+        """
+        Queue `payload` for delivery unless this event was already sent (or,
+        with a `window`, the same message was sent within the last `window` seconds).
+        """
+        queued = await writer.submit(self.queue, key, to_email, kind, payload, content, window)
+        if queued:
+            self.fanout.wake()
+        return queued
+
+    def queue(
+        self, conn, key: str, to_email: str, kind: str, payload: dict, content: Iterable = (), window: int = 0
+    ) -> bool:
+        """`send` inside the caller's transaction: claim the email and queue its delivery job together."""
+        if not to_email:
+            logger.warning(f"⚠️ No recipient for {kind} email ({key})")
+            return False
+        if not claim_email(conn, key, to_email, kind, fingerprint(to_email, kind, content), window):
+            self.counts["duplicate"] += 1
+            logger.info(f"🔁 Skipped duplicate {kind} email to {to_email} ({key})")
+            return False
+        insert_webhook_job(conn, f"{kind} email to {to_email}", self.webhook, payload, key)
+        self.counts["sent"] += 1
+        return True
+
+    async def _release(self, job: WebhookJob):
+        if job.key and job.url == self.webhook:
+            await run_in_threadpool(release_email, job.key)
+            self.counts["released"] += 1
+            logger.warning(f"↩️ Released {job.key}: its email was never delivered")
+
+    def queue_order_confirmation(self, conn, order_id: int, to_email: str, customer_name, items, total_price) -> bool:
+        """Queue an order's confirmation in the transaction that inserts the order."""
+        return self.queue(
+            conn,
+            f"order:{order_id}:confirmation",
+            to_email,
+            "order_confirmation",
+            order_confirmation_payload(to_email, customer_name, items, total_price),
+            order_content(items, total_price),
+        )
+
+    async def legacy_order_confirmation(self, key: str, to_email: str, customer_name, items, total_price) -> bool:
+        """An order_confirmation from /send-email: dropped if the backend already confirmed the same order."""
+        return await self.send(
+            key,
+            to_email,
+            "order_confirmation",
+            order_confirmation_payload(to_email, customer_name, items, total_price),
+            order_content(items, total_price),
+            window=self.window,
+        )
+
+    def stats(self) -> Dict:
+        return dict(self.counts, dedup_window=self.window)
+
+
+notifier = Notifier(fanout)
@@ -0,0 +1,50 @@
+"""Order-text parser and price checks against the shipped catalog.json."""
+
+import pytest
+
+from catalog import Catalog
+
+catalog = Catalog.from_file()
+
+
+def parsed(text):
+    return [(item.description, item.quantity) for item in catalog.parse(text)]
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("6 Red Velvet Cupcakes and a dozen chocolate", [("Red Velvet Cupcake", 6), ("Chocolate Cupcake", 12)]),
+    ("Chocolate Crinkle Cupcakes x6", [("Chocolate Crinkle Cupcake", 6)]),
+    ("red velvet 6, chocolate 12", [("Red Velvet Cupcake", 6), ("Chocolate Cupcake", 12)]),
+    ("twenty four red velvet", [("Red Velvet Cupcake", 24)]),
+    ("two hundred fifty five vanilla", [("Vanilla Cupcake", 255)]),
+    ("two dozen vanilla", [("Vanilla Cupcake", 24)]),
+    ("half a dozen lemon", [("Lemon Cupcake", 6)]),
+    ("a half dozen lemon", [("Lemon Cupcake", 6)]),
+    ("one 2 lb red velvet cake", [("Red Velvet Cake", 2)]),
+    ("3 lbs chocolate cake", [("Chocolate Cake", 3)]),
+    # Plurals fold on both the alias and the order side
+    ("two 2 lb cakes", [("Cake", 4)]),
+    ("2 red velvet cakes", [("Red Velvet Cake", 2)]),
+    ("two 2 lb chocolate cakes", [("Chocolate Cake", 4)]),
+    ("6 Red Velvets", [("Red Velvet Cupcake", 6)]),
+    ("a dozen cupcakes", [("Cupcake", 12)]),
+    ("Cookies & Cream Cupcakes x12", [("Cookies & Cream Cupcake", 12)]),
+    ("6 red velvet and 6 more red velvet", [("Red Velvet Cupcake", 12)]),
+])
+def test_parse(text, expected):
+    assert parsed(text) == expected
+
+
+def test_plural_order_prices_match_quote():
+    check = catalog.check_total(catalog.parse("2 red velvet cakes"), 2400)
+    assert check.status == "ok"
+
+
+def test_bulk_discount_and_delivery_fee():
+    check = catalog.check_total(catalog.parse("60 vanilla cupcakes"), 8100)
+    assert (check.subtotal, check.discount, check.status) == (9000, 900, "ok")
+    assert catalog.check_total(catalog.parse("6 lemon"), 1100).status == "ok"  # 900 + delivery
+
+
+def test_unpriced_without_products():
+    assert catalog.check_total(catalog.parse("something nice"), 500).status == "unpriced"
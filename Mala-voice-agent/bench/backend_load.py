@@ -0,0 +1,135 @@
+"""
+backend_load.py — Load test for the bakery backend's /place-order.
+
+Starts bench/webhook_stub.py in place of n8n, runs the backend (uvicorn)
+in-process against a throwaway orders.db, fires concurrent orders at it
+and reports response latency, throughput and how long the webhook
+fan-out took to drain. Nothing leaves the machine.
+
+  python bench/backend_load.py --orders 500 --concurrency 50 --webhook-latency 0.4
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from statistics import quantiles
+
+import aiohttp
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent / "bakery-backend"))
+
+from webhook_stub import WebhookStub  # noqa: E402
+
+
+def start_in_thread(coro_fn) -> asyncio.AbstractEventLoop:
+    """Run `coro_fn()` on a fresh loop in a daemon thread and keep the loop alive."""
+    loop = asyncio.new_event_loop()
+    started = threading.Event()
+
+    def run():
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(coro_fn())
+        started.set()
+        loop.run_forever()
+
+    threading.Thread(target=run, daemon=True).start()
+    started.wait()
+    return loop
+
+
+def start_backend(port: int):
+    """Import main.py only now, so it picks up the stub URLs and the temp cwd."""
+    import uvicorn
+    from main import app
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+def pct(values, q):
+    if len(values) < 2:
+        return values[0] if values else 0.0
+    return quantiles(values, n=100)[q - 1]
+
+
+async def fire(base_url: str, orders: int, concurrency: int):
+    latencies, errors = [], 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=concurrency)) as session:
+        async def one(i: int):
+            nonlocal errors
+            order = {
+                "customer_name": f"Load Test {i}",
+                "email": f"load{i}@example.com",
+                "items": "Chocolate Crinkle Cupcakes x6",
+                "total_price": 1500,
+            }
+            async with semaphore:
+                t0 = time.perf_counter()
+                async with session.post(f"{base_url}/place-order", json=order) as response:
+                    await response.read()
+                    if response.status != 200:
+                        errors += 1
+                latencies.append(time.perf_counter() - t0)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(orders)))
+        elapsed = time.perf_counter() - start
+
+        # Wait for the background fan-out to finish
+        while True:
+            async with session.get(f"{base_url}/fanout/stats") as response:
+                stats = await response.json()
+            if not (stats["queued"] or stats["in_flight"] or stats["retry_pending"]):
+                break
+            await asyncio.sleep(0.05)
+        drained = time.perf_counter() - start
+
+    return latencies, errors, elapsed, drained, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bakery backend /place-order load test")
+    parser.add_argument("--orders", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--webhook-latency", type=float, default=0.4, help="simulated n8n response time")
+    parser.add_argument("--webhook-error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    stub = WebhookStub(latency=args.webhook_latency, error_rate=args.webhook_error_rate)
+    start_in_thread(stub.start)
+    os.environ["N8N_DATABASE_WEBHOOK"] = stub.url("DataBase")
+    os.environ["N8N_EMAIL_WEBHOOK"] = stub.url("Email")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)  # db.py opens orders.db relative to the cwd
+        server = start_backend(args.port)
+        print(f"🪝 Webhook stub :{stub.port} ({args.webhook_latency * 1000:.0f}ms, "
+              f"{args.webhook_error_rate:.0%} errors) — {args.orders} orders, {args.concurrency} concurrent\n")
+
+        latencies, errors, elapsed, drained, stats = asyncio.run(
+            fire(f"http://127.0.0.1:{args.port}", args.orders, args.concurrency)
+        )
+        server.should_exit = True
+        os.chdir(BENCH_DIR)
+
+    print(f"/place-order   p50={pct(latencies, 50) * 1000:8.2f}ms  p95={pct(latencies, 95) * 1000:8.2f}ms  "
+          f"p99={pct(latencies, 99) * 1000:8.2f}ms  max={max(latencies) * 1000:8.2f}ms")
+    print(f"throughput     {args.orders / elapsed:8.1f} orders/s  ({errors} errors)")
+    print(f"fan-out        drained in {drained:6.2f}s — {stats}")
+    print(f"stub           received={dict(stub.received)} failed={dict(stub.failed)}")
+
+
+if __name__ == "__main__":
+    main()
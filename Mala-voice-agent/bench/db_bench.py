@@ -0,0 +1,109 @@
+"""
+db_bench.py — Orders/second through the backend's SQLite storage layer.
+
+Runs the same concurrent workload against two setups on a throwaway
+database:
+
+  shared-connection   the old db.py: one connection + cursor for every
+                      thread (serialized with a lock), rollback journal
+  pooled              bakery-backend/database.py: a connection per thread,
+                      WAL, busy_timeout, cached prepared statements
+
+Writer threads place orders while reader threads look orders up, like the
+FastAPI threadpool under a burst of calls.
+
+  python bench/db_bench.py --writers 8 --readers 4 --seconds 5
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "bakery-backend"))
+
+ORDER = ("Load Test", "load@example.com", "Chocolate Crinkle Cupcakes x6", 1500)
+
+
+class SharedConnection:
+    """The previous db.py: a module-level connection shared by all threads."""
+
+    def __init__(self, path: str):
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.cursor = self.conn.cursor()
+        self.lock = threading.Lock()
+        self.conn.execute("""
+        CREATE TABLE IF NOT EXISTS orders (
+            id INTEGER NOT NULL PRIMARY KEY, customer_name VARCHAR, email VARCHAR,
+            items VARCHAR, total_price FLOAT, idempotency_key VARCHAR
+        )""")
+        self.conn.commit()
+
+    def save_order(self, *order):
+        with self.lock:
+            self.cursor.execute(
+                "INSERT INTO orders (customer_name, email, items, total_price) VALUES (?, ?, ?, ?)", order
+            )
+            self.conn.commit()
+            return self.cursor.lastrowid
+
+    def get_order(self, order_id):
+        with self.lock:
+            return self.conn.execute("SELECT * FROM orders WHERE id = ?", (order_id,)).fetchone()
+
+
+def run(name, save_order, get_order, writers: int, readers: int, seconds: float):
+    stop = threading.Event()
+    written, read, errors = [0] * writers, [0] * readers, []
+
+    def writer(i):
+        while not stop.is_set():
+            try:
+                save_order(*ORDER)
+                written[i] += 1
+            except Exception as e:
+                errors.append(e)
+
+    def reader(i):
+        while not stop.is_set():
+            get_order(random.randint(1, max(1, sum(written))))
+            read[i] += 1
+
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+    threads += [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+
+    print(f"{name:<20} {sum(written) / seconds:9.1f} orders/s  {sum(read) / seconds:10.1f} reads/s  "
+          f"({len(errors)} errors)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SQLite storage layer benchmark")
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        shared = SharedConnection(os.path.join(tmp, "shared.db"))
+        run("shared-connection", shared.save_order, shared.get_order, args.writers, args.readers, args.seconds)
+
+        # db.py opens ORDERS_DB_PATH when imported
+        os.environ["ORDERS_DB_PATH"] = os.path.join(tmp, "pooled.db")
+        import db
+        run("pooled (WAL)", db.save_order, db.get_order, args.writers, args.readers, args.seconds)
+        db.db.close_all()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+fake_call.py — Hold and transfer flows against a fake room.
+
+`FakeCallBackend` has the methods of call_control.LiveKitCallBackend and
+records what happened to the call (listening on/off, hold music, dials,
+REFERs) on a timeline instead of touching LiveKit. The scenarios run
+CallControl through a hold and each transfer path in compressed time:
+
+  python bench/fake_call.py
+  python bench/fake_call.py --answer-after 0.5 --dial-timeout 1
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from call_control import Caller, CallControl  # noqa: E402
+
+
+class FakeMusic:
+    def __init__(self, backend: "FakeCallBackend"):
+        self.backend = backend
+
+    def stop(self):
+        self.backend.record("hold music off")
+
+
+class FakeCallBackend:
+    def __init__(self, caller: Optional[Caller] = None, answer_after: Optional[float] = 0.2, refer_fails: bool = False):
+        self._caller = caller
+        self.answer_after = answer_after  # None: nobody picks up
+        self.refer_fails = refer_fails
+        self.timeline: List[Tuple[float, str]] = []
+        self.listening = True
+        self.speaking = True
+        self._start = time.perf_counter()
+
+    def record(self, event: str):
+        self.timeline.append((time.perf_counter() - self._start, event))
+
+    def caller(self) -> Optional[Caller]:
+        return self._caller
+
+    def set_listening(self, enabled: bool):
+        self.listening = enabled
+        self.record(f"listening {'on' if enabled else 'off'}")
+
+    def set_speaking(self, enabled: bool):
+        self.speaking = enabled
+        self.record(f"speaking {'on' if enabled else 'off'}")
+
+    def play_hold_audio(self) -> FakeMusic:
+        self.record("hold music on")
+        return FakeMusic(self)
+
+    async def wait_until_quiet(self, timeout: float):
+        pass
+
+    async def dial(self, number: str, trunk_id: str, timeout: float) -> bool:
+        self.record(f"dial {number} via {trunk_id}")
+        if self.answer_after is None or self.answer_after > timeout:
+            await asyncio.sleep(timeout)
+            self.record("no answer")
+            return False
+        await asyncio.sleep(self.answer_after)
+        self.record("answered")
+        return True
+
+    async def refer(self, caller_identity: str, number: str):
+        self.record(f"REFER {caller_identity} to {number}")
+        if self.refer_fails:
+            raise RuntimeError("REFER rejected by the SIP provider")
+
+
+async def run_scenarios(answer_after: float, dial_timeout: float, hold_seconds: float):
+    web = Caller("caller-web", False)
+    phone = Caller("caller-sip", True)
+    scenarios = [
+        ("hold", web, "trunk", answer_after),
+        ("transfer answered", web, "trunk", answer_after),
+        ("transfer no answer", web, "trunk", None),
+        ("transfer by REFER", phone, None, answer_after),
+        ("REFER rejected", phone, None, answer_after),
+        ("web caller, no trunk", web, None, answer_after),
+    ]
+    for name, caller, trunk, answer in scenarios:
+        backend = FakeCallBackend(caller, answer, refer_fails=name == "REFER rejected")
+        control = CallControl(backend, "+15550100", trunk, dial_timeout, announce_timeout=0)
+        if name == "hold":
+            result = f"held {await control.hold(hold_seconds):.2f}s"
+        else:
+            result = await control.transfer(name)
+        print(f"\n{name}: {result}")
+        for at, event in backend.timeline:
+            print(f"  {at:6.2f}s  {event}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--answer-after", type=float, default=0.2, help="seconds until the team member answers")
+    parser.add_argument("--dial-timeout", type=float, default=0.5)
+    parser.add_argument("--hold", type=float, default=0.3, help="hold length in seconds")
+    args = parser.parse_args()
+    asyncio.run(run_scenarios(args.answer_after, args.dial_timeout, args.hold))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,409 @@
+"""
+fake_plugins.py — Scripted STT, LLM, TTS and VAD plugins for offline replay.
+
+A `ScriptedCaller` plays the customer's side of one call script and
+drives the fakes that replace the network plugins:
+
+  - FakeVAD / FakeSTT   the caller "speaks" a turn: start of speech, interim
+                        transcripts while the words are said, end of speech,
+                        then the final transcript after `stt_delay`
+  - FakeLLM             streams the script's agent reply for the current turn
+                        (or its tool call, then the reply after the tool ran)
+                        after `llm_ttft`, at `llm_tokens_per_second`
+  - FakeTTS             silence as long as the text takes to say, after `tts_ttfb`
+  - FakeAudioOutput     plays agent audio out in (scaled) real time and records
+                        when each reply's first frame arrived
+  - FakeAudioInput      20 ms frames of caller silence, paced like a live track
+
+Nothing here opens a connection; every delay is configurable in `Timing`.
+bench/replay_bench.py runs the real entrypoint with these.
+"""
+
+import asyncio
+import json
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from livekit import rtc
+from livekit.agents import DEFAULT_API_CONNECT_OPTIONS, NOT_GIVEN, APIConnectOptions, llm, stt, tts, vad
+from livekit.agents.metrics import EOUMetrics, LLMMetrics, TTSMetrics
+from livekit.agents.voice import io
+
+SAMPLE_RATE = 24000
+DEFAULT_GREETING = "Hi! Welcome to Crincle Cupkakes. How can I help you today?"
+DEFAULT_FOLLOWUP = "Thanks for waiting! Is there anything else I can help you with?"
+
+
+@dataclass
+class Timing:
+    words_per_second: float = 2.5       # speaking rate, caller and agent
+    stt_delay: float = 0.15             # end of speech → final transcript
+    llm_ttft: float = 0.35
+    llm_tokens_per_second: float = 40.0
+    tts_ttfb: float = 0.2
+    time_scale: float = 1.0             # < 1 compresses caller speech, pauses and agent playout
+
+    def speech_seconds(self, text: str) -> float:
+        return max(0.3, len(text.split()) / self.words_per_second)
+
+
+class ScriptedCaller:
+    """The customer side of one scripted call, plus what the agent did in reply."""
+
+    def __init__(self, script: Dict, timing: Timing):
+        self.script = script
+        self.timing = timing
+        self.turn: Optional[Dict] = None
+        self.session = None
+        self.output = FakeAudioOutput(timing.time_scale)
+        self.text_output = FakeTextOutput()
+        self.metrics: Dict[str, List[float]] = {"eou": [], "llm_ttft": [], "tts_ttfb": []}
+        self._llm_calls = 0
+        self._vad_streams: set = set()
+        self._stt_streams: set = set()
+        self._listening = asyncio.Event()
+
+    # -- session side --
+
+    def attach(self, session):
+        """SessionComponents.attach_io: fake audio and text IO instead of the room's."""
+        self.session = session
+        session.input.audio = FakeAudioInput()
+        session.output.audio = self.output
+        session.output.transcription = self.text_output
+        session.on("agent_state_changed", self._on_agent_state)
+        session.on("metrics_collected", self._on_metrics)
+
+    def _on_agent_state(self, ev):
+        if ev.new_state == "listening":
+            self._listening.set()
+        else:
+            self._listening.clear()
+
+    def _on_metrics(self, ev):
+        m = ev.metrics
+        if isinstance(m, EOUMetrics):
+            self.metrics["eou"].append(m.end_of_utterance_delay)
+        elif isinstance(m, LLMMetrics):
+            self.metrics["llm_ttft"].append(m.ttft)
+        elif isinstance(m, TTSMetrics):
+            self.metrics["tts_ttfb"].append(m.ttfb)
+
+    def reply(self, chat_ctx: llm.ChatContext) -> Tuple[str, Optional[Dict]]:
+        """(text, tool call) the LLM answers with at this point of the script."""
+        turn = self.turn
+        if turn is None:
+            return self.script.get("greeting") or DEFAULT_GREETING, None
+        self._llm_calls += 1
+        items = chat_ctx.items
+        if items and items[-1].type == "function_call_output":
+            return turn.get("after_tool") or turn.get("agent", ""), None
+        if self._llm_calls == 1:
+            return turn.get("agent", ""), turn.get("tool")
+        # A reply the agent started by itself (e.g. back from hold)
+        return self.script.get("followup") or DEFAULT_FOLLOWUP, None
+
+    # -- caller side --
+
+    async def wait_until_listening(self, timeout: float):
+        await asyncio.wait_for(self._listening.wait(), timeout)
+
+    async def play_turn(self, turn: Dict, timeout: float) -> Optional[float]:
+        """Say the caller's line and wait for the agent's reply; returns the turn latency."""
+        self.turn = turn
+        self._llm_calls = 0
+        replies = self.output.segments
+        stopped = await self.say(turn["caller"])
+        try:
+            await asyncio.wait_for(self.output.wait_for_segment(replies + 1), timeout)
+            await self._wait_reply_done(timeout)
+            control = self.session.userdata.control
+            if turn.get("tool", {}).get("name") == "hold_call" or control.on_hold:
+                # The agent comes back by itself once the hold is over
+                await asyncio.wait_for(self.output.wait_for_segment(self.output.segments + 1), timeout + 120)
+                await self._wait_reply_done(timeout)
+        except asyncio.TimeoutError:
+            return None
+        return self.output.first_frame_at[replies] - stopped
+
+    async def _wait_reply_done(self, timeout: float):
+        await asyncio.sleep(0)
+        await asyncio.wait_for(self.output.wait_idle(), timeout)
+        await asyncio.wait_for(self._listening.wait(), timeout)
+
+    async def say(self, text: str) -> float:
+        """Speak `text`; returns when the caller stopped speaking (perf_counter)."""
+        words = text.split() or [""]
+        duration = self.timing.speech_seconds(text) * self.timing.time_scale
+        step = duration / len(words)
+        self._vad(vad.VADEventType.START_OF_SPEECH, 0.0)
+        self._stt(stt.SpeechEventType.START_OF_SPEECH)
+        for i in range(len(words)):
+            await asyncio.sleep(step)
+            self._vad(vad.VADEventType.INFERENCE_DONE, step * (i + 1))
+            self._stt(stt.SpeechEventType.INTERIM_TRANSCRIPT, " ".join(words[:i + 1]))
+        stopped = time.perf_counter()
+        self._vad(vad.VADEventType.END_OF_SPEECH, duration)
+        await asyncio.sleep(self.timing.stt_delay)
+        self._stt(stt.SpeechEventType.FINAL_TRANSCRIPT, text)
+        self._stt(stt.SpeechEventType.END_OF_SPEECH)
+        return stopped
+
+    def _vad(self, kind: vad.VADEventType, speech: float):
+        event = vad.VADEvent(
+            type=kind,
+            samples_index=int(speech * SAMPLE_RATE),
+            timestamp=time.time(),
+            speech_duration=speech,
+            silence_duration=0.0,
+            probability=1.0 if kind != vad.VADEventType.END_OF_SPEECH else 0.0,
+            speaking=kind != vad.VADEventType.END_OF_SPEECH,
+            raw_accumulated_speech=speech,
+        )
+        for stream in list(self._vad_streams):
+            stream.send(event)
+
+    def _stt(self, kind: stt.SpeechEventType, text: str = ""):
+        alternatives = [stt.SpeechData(language="en", text=text, confidence=1.0)] if text else []
+        event = stt.SpeechEvent(type=kind, alternatives=alternatives)
+        for stream in list(self._stt_streams):
+            stream.send(event)
+
+
+# =========================
+# VAD / STT — events come from the caller, audio frames are discarded
+# =========================
+class FakeVAD(vad.VAD):
+    def __init__(self, caller: ScriptedCaller):
+        super().__init__(capabilities=vad.VADCapabilities(update_interval=0.032))
+        self.caller = caller
+
+    def stream(self) -> "FakeVADStream":
+        return FakeVADStream(self, self.caller)
+
+
+class FakeVADStream(vad.VADStream):
+    def __init__(self, fake_vad: FakeVAD, caller: ScriptedCaller):
+        super().__init__(fake_vad)
+        self._caller = caller
+        caller._vad_streams.add(self)
+
+    async def _main_task(self):
+        try:
+            async for _ in self._input_ch:
+                pass
+        finally:
+            self._caller._vad_streams.discard(self)
+
+    def send(self, event: vad.VADEvent):
+        if not self._event_ch.closed:
+            self._event_ch.send_nowait(event)
+
+
+class FakeSTT(stt.STT):
+    def __init__(self, caller: ScriptedCaller):
+        super().__init__(capabilities=stt.STTCapabilities(streaming=True, interim_results=True))
+        self.caller = caller
+
+    async def _recognize_impl(self, buffer, *, language=NOT_GIVEN, conn_options: APIConnectOptions):
+        return stt.SpeechEvent(type=stt.SpeechEventType.FINAL_TRANSCRIPT)
+
+    def stream(self, *, language=NOT_GIVEN, conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS):
+        return FakeSTTStream(stt=self, conn_options=conn_options)
+
+
+class FakeSTTStream(stt.RecognizeStream):
+    async def _run(self):
+        caller = self._stt.caller
+        caller._stt_streams.add(self)
+        try:
+            async for _ in self._input_ch:
+                pass
+        finally:
+            caller._stt_streams.discard(self)
+
+    def send(self, event: stt.SpeechEvent):
+        if not self._event_ch.closed:
+            self._event_ch.send_nowait(event)
+
+
+# =========================
+# LLM — the script's reply for the current turn, streamed word by word
+# =========================
+class FakeLLM(llm.LLM):
+    def __init__(self, caller: ScriptedCaller):
+        super().__init__()
+        self.caller = caller
+
+    @property
+    def model(self) -> str:
+        return "scripted"
+
+    def chat(
+        self,
+        *,
+        chat_ctx: llm.ChatContext,
+        tools=None,
+        conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS,
+        parallel_tool_calls=NOT_GIVEN,
+        tool_choice=NOT_GIVEN,
+        extra_kwargs=NOT_GIVEN,
+    ) -> "FakeLLMStream":
+        return FakeLLMStream(self, chat_ctx=chat_ctx, tools=tools or [], conn_options=conn_options)
+
+
+class FakeLLMStream(llm.LLMStream):
+    async def _run(self):
+        caller = self._llm.caller
+        timing = caller.timing
+        text, tool = caller.reply(self._chat_ctx)
+        request_id = uuid.uuid4().hex[:12]
+        await asyncio.sleep(timing.llm_ttft)
+        words = text.split()
+        for i, word in enumerate(words):
+            if i:
+                await asyncio.sleep(1 / timing.llm_tokens_per_second)
+            delta = llm.ChoiceDelta(role="assistant", content=word if i == 0 else f" {word}")
+            self._event_ch.send_nowait(llm.ChatChunk(id=request_id, delta=delta))
+        if tool:
+            call = llm.FunctionToolCall(
+                name=tool["name"],
+                arguments=json.dumps(tool.get("arguments", {})),
+                call_id=f"call_{uuid.uuid4().hex[:8]}",
+            )
+            delta = llm.ChoiceDelta(role="assistant", tool_calls=[call])
+            self._event_ch.send_nowait(llm.ChatChunk(id=request_id, delta=delta))
+        usage = llm.CompletionUsage(completion_tokens=len(words), prompt_tokens=0, total_tokens=len(words))
+        self._event_ch.send_nowait(llm.ChatChunk(id=request_id, usage=usage))
+
+
+# =========================
+# TTS — silence as long as the words take to say
+# =========================
+class FakeTTS(tts.TTS):
+    def __init__(self, timing: Timing):
+        super().__init__(capabilities=tts.TTSCapabilities(streaming=False), sample_rate=SAMPLE_RATE, num_channels=1)
+        self.timing = timing
+
+    def synthesize(self, text: str, *, conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS):
+        return FakeChunkedStream(tts=self, input_text=text, conn_options=conn_options)
+
+
+class FakeChunkedStream(tts.ChunkedStream):
+    CHUNK = bytes(SAMPLE_RATE // 10 * 2)  # 100 ms of 16-bit mono silence
+
+    async def _run(self, output_emitter: tts.AudioEmitter):
+        output_emitter.initialize(
+            request_id=uuid.uuid4().hex[:12],
+            sample_rate=SAMPLE_RATE,
+            num_channels=1,
+            mime_type="audio/pcm",
+        )
+        await asyncio.sleep(self._tts.timing.tts_ttfb)
+        for _ in range(max(1, round(self._tts.timing.speech_seconds(self._input_text) * 10))):
+            output_emitter.push(self.CHUNK)
+        output_emitter.flush()
+
+
+# =========================
+# Session IO
+# =========================
+class FakeAudioInput(io.AudioInput):
+    """Caller silence in 20 ms frames, paced like a live track."""
+
+    def __init__(self, frame_ms: int = 20):
+        super().__init__(label="FakeAudioInput")
+        samples = SAMPLE_RATE * frame_ms // 1000
+        self._frame = rtc.AudioFrame(bytes(samples * 2), SAMPLE_RATE, 1, samples)
+        self._interval = frame_ms / 1000
+        self._next: Optional[float] = None
+
+    async def __anext__(self) -> rtc.AudioFrame:
+        now = time.perf_counter()
+        self._next = max(self._next or now, now - self._interval) + self._interval
+        if self._next > now:
+            await asyncio.sleep(self._next - now)
+        return self._frame
+
+
+class FakeAudioOutput(io.AudioOutput):
+    """Agent audio played out in real time × `time_scale`; records each reply's first frame."""
+
+    def __init__(self, time_scale: float = 1.0):
+        super().__init__(
+            label="FakeAudioOutput",
+            capabilities=io.AudioOutputCapabilities(pause=False),
+            sample_rate=SAMPLE_RATE,
+        )
+        self.time_scale = time_scale
+        self.first_frame_at: List[float] = []
+        self._pushed = 0.0
+        self._interrupted = asyncio.Event()
+        self._playout: Optional[asyncio.Task] = None
+        self._new_segment = asyncio.Event()
+
+    @property
+    def segments(self) -> int:
+        return len(self.first_frame_at)
+
+    async def wait_for_segment(self, count: int):
+        while self.segments < count:
+            self._new_segment.clear()
+            await self._new_segment.wait()
+
+    async def wait_idle(self):
+        while self._pushed or (self._playout and not self._playout.done()):
+            if self._playout and not self._playout.done():
+                await asyncio.shield(self._playout)
+            else:
+                await asyncio.sleep(0.01)
+
+    async def capture_frame(self, frame: rtc.AudioFrame):
+        await super().capture_frame(frame)
+        if not self._pushed:
+            self.first_frame_at.append(time.perf_counter())
+            self._new_segment.set()
+            self.on_playback_started(created_at=time.time())
+        self._pushed += frame.duration
+
+    def flush(self):
+        super().flush()
+        if not self._pushed:
+            return
+        self._playout = asyncio.create_task(self._play_out(self.first_frame_at[-1], self._pushed))
+
+    def clear_buffer(self):
+        if self._pushed:
+            self._interrupted.set()
+
+    async def _play_out(self, started: float, duration: float):
+        interrupted = False
+        try:
+            remaining = started + duration * self.time_scale - time.perf_counter()
+            await asyncio.wait_for(self._interrupted.wait(), max(0.0, remaining))
+            interrupted = True
+        except asyncio.TimeoutError:
+            pass
+        position = min(duration, (time.perf_counter() - started) / self.time_scale) if interrupted else duration
+        self._pushed = 0.0
+        self._interrupted.clear()
+        self.on_playback_finished(playback_position=position, interrupted=interrupted)
+
+
+class FakeTextOutput(io.TextOutput):
+    """Collects what the agent said (after marker stripping)."""
+
+    def __init__(self):
+        super().__init__(label="FakeTextOutput", next_in_chain=None)
+        self.lines: List[str] = []
+        self._current: List[str] = []
+
+    async def capture_text(self, text: str):
+        self._current.append(text)
+
+    def flush(self):
+        if self._current:
+            self.lines.append("".join(self._current))
+            self._current = []
@@ -0,0 +1,85 @@
+"""
+group_commit_bench.py — Per-order transactions vs group commit under a burst.
+
+Concurrent async clients (like /place-order handlers during a promotion)
+save orders to a throwaway database, first with one transaction per order
+(a thread each, as before), then through db.writer, which commits
+whatever arrived within a few milliseconds together.
+
+  python bench/group_commit_bench.py --clients 100 --orders 5000 --synchronous FULL
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from statistics import quantiles
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "bakery-backend"))
+
+ORDER = ("Load Test", "load@example.com", "Chocolate Crinkle Cupcakes x6", 1500)
+
+
+def pct(values, q):
+    if len(values) < 2:
+        return values[0] if values else 0.0
+    return quantiles(values, n=100)[q - 1]
+
+
+async def burst(name, save, clients: int, orders: int):
+    latencies, ids = [], set()
+    remaining = iter(range(orders))
+
+    async def client():
+        for _ in remaining:
+            t0 = time.perf_counter()
+            ids.add(await save())
+            latencies.append(time.perf_counter() - t0)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(clients)))
+    elapsed = time.perf_counter() - start
+    assert len(ids) == orders, "every caller must get its own order id"
+
+    print(f"{name:<22} {orders / elapsed:9.1f} orders/s   p50={pct(latencies, 50) * 1000:7.2f}ms  "
+          f"p99={pct(latencies, 99) * 1000:7.2f}ms")
+
+
+async def run(args):
+    import db
+
+    await burst("transaction per order", lambda: asyncio.to_thread(db.save_order, *ORDER), args.clients, args.orders)
+
+    db.writer.max_batch = args.max_batch
+    db.writer.max_delay = args.max_delay_ms / 1000
+    db.writer.start()
+    await burst("group commit", lambda: db.writer.submit(db.insert_order, *ORDER), args.clients, args.orders)
+    await db.writer.stop()
+    print(f"{'':<22} {db.writer.batches} commits, {db.writer.writes / db.writer.batches:.1f} orders per commit")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Group commit benchmark")
+    parser.add_argument("--clients", type=int, default=100)
+    parser.add_argument("--orders", type=int, default=5000)
+    parser.add_argument("--max-batch", type=int, default=200)
+    parser.add_argument("--max-delay-ms", type=float, default=2.0)
+    parser.add_argument("--synchronous", default="FULL", choices=["OFF", "NORMAL", "FULL"],
+                        help="FULL = an fsync per commit, the cost group commit amortizes")
+    args = parser.parse_args()
+
+    logging.getLogger("db").setLevel(logging.WARNING)
+    with tempfile.TemporaryDirectory() as tmp:
+        # db.py opens ORDERS_DB_PATH when imported
+        os.environ["ORDERS_DB_PATH"] = os.path.join(tmp, "orders.db")
+        os.environ["ORDERS_DB_SYNCHRONOUS"] = args.synchronous
+        print(f"🧁 {args.orders} orders from {args.clients} concurrent clients, synchronous={args.synchronous}\n")
+        asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,402 @@
+"""
+loadgen.py — Scenario-driven load generator for bakery-backend and server.py.
+
+The stand-ins run in this process: bench/webhook_stub.py in place of the
+n8n Database and Email webhooks that db.py and email_utils.py post to,
+and bench/smtp_sink.py in place of the SMTP provider. bakery-backend
+(main:app) and server.py (server:app) run under uvicorn in child
+processes pointed at them, with a throwaway orders.db, so the load
+generator doesn't compete with the servers for the GIL.
+
+Each scenario ramps an open-loop request rate through its steps. Latency
+is measured from when a request was due, not when it went out, so a
+backed-up server shows up as latency instead of as a slower client. Per
+step it reports offered and achieved rate, p50/p95/p99 and errors; the
+saturation point is the highest step still served in full (achieved
+>= 95% of offered, <= 1% errors, p99 within the scenario's SLO).
+
+  python bench/loadgen.py                                          # every scenario
+  python bench/loadgen.py order_burst --webhook-latency 0.4 --webhook-error-rate 0.05
+  python bench/loadgen.py token_storm --rate-scale 2 --workers 2
+  python bench/loadgen.py mail_burst --smtp-latency 0.05 --smtp-error-rate 0.02
+  python bench/loadgen.py order_burst --backend-url http://127.0.0.1:8001   # already running
+
+Scenarios are bench/scenarios/*.json:
+  target       "backend", "server" or "smtp" (mailer.SMTPPool sends to the sink)
+  requests     [{method, path, weight, headers, body}]; strings may use {i}
+               (request number), {j} (index in a "$repeat"), {key} (unique
+               id) and {ip} (a distinct client address), and
+               {"$repeat": n, "item": {...}} expands to a list of n items
+  steps        [{rate, seconds}]: requests per second, held for `seconds`
+  slo_p99_ms   p99 a step must stay under to count as sustained
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import aiohttp
+
+BENCH_DIR = Path(__file__).resolve().parent
+ROOT = BENCH_DIR.parent
+SCENARIO_DIR = BENCH_DIR / "scenarios"
+sys.path.insert(0, str(ROOT))
+
+from backend_load import pct, start_in_thread  # noqa: E402
+from mailer import SMTPConfig, SMTPPool, build_message  # noqa: E402
+from smtp_sink import SMTPSink  # noqa: E402
+from webhook_stub import WebhookStub  # noqa: E402
+
+# A step is sustained if it keeps up with the offered rate and errors stay rare
+ACHIEVED_FRACTION = 0.95
+MAX_ERROR_RATE = 0.01
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+# =========================
+# Scenarios
+# =========================
+def render(template, i: int, j: int = 0):
+    """Fill a request template for request number `i`."""
+    if isinstance(template, dict):
+        if "$repeat" in template:
+            return [render(template["item"], i, j) for j in range(template["$repeat"])]
+        return {k: render(v, i, j) for k, v in template.items()}
+    if isinstance(template, list):
+        return [render(v, i, j) for v in template]
+    if isinstance(template, str):
+        if template in ("{i}", "{j}"):
+            return i if template == "{i}" else j  # keep numbers numeric
+        return (template
+                .replace("{i}", str(i))
+                .replace("{j}", str(j))
+                .replace("{key}", uuid.uuid4().hex)
+                .replace("{ip}", f"10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}"))
+    return template
+
+
+def load_scenarios(names: List[str]) -> List[dict]:
+    paths = sorted(SCENARIO_DIR.glob("*.json"))
+    if names:
+        paths = [SCENARIO_DIR / f"{name}.json" if not name.endswith(".json") else Path(name) for name in names]
+    scenarios = []
+    for path in paths:
+        scenario = json.loads(path.read_text())
+        scenario.setdefault("name", path.stem)
+        scenarios.append(scenario)
+    return scenarios
+
+
+# =========================
+# Load
+# =========================
+@dataclass
+class StepResult:
+    rate: float
+    seconds: float
+    sent: int = 0
+    ok: int = 0
+    dropped: int = 0   # not sent: max in-flight reached
+    latencies: List[float] = field(default_factory=list)
+    errors: Counter = field(default_factory=Counter)
+    elapsed: float = 0.0
+
+    @property
+    def offered(self) -> float:
+        return (self.sent + self.dropped) / self.seconds
+
+    @property
+    def achieved(self) -> float:
+        return self.ok / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def error_rate(self) -> float:
+        attempted = self.sent + self.dropped
+        return (attempted - self.ok) / attempted if attempted else 0.0
+
+    def sustained(self, slo_p99_ms: float) -> bool:
+        return (self.achieved >= ACHIEVED_FRACTION * self.offered
+                and self.error_rate <= MAX_ERROR_RATE
+                and pct(self.latencies, 99) * 1000 <= slo_p99_ms)
+
+
+class HttpTarget:
+    def __init__(self, base_url: str, timeout: float, max_in_flight: int):
+        self.base_url = base_url.rstrip("/")
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=max_in_flight),
+            timeout=aiohttp.ClientTimeout(total=timeout),
+        )
+
+    async def send(self, request: dict, i: int) -> Optional[str]:
+        """None on success, otherwise what went wrong."""
+        headers = render(request.get("headers", {}), i)
+        body = render(request["body"], i) if "body" in request else None
+        async with self.session.request(request.get("method", "POST"), self.base_url + request["path"],
+                                        json=body, headers=headers) as response:
+            await response.read()
+            return None if response.status < 300 else f"HTTP {response.status}"
+
+    async def aclose(self):
+        await self.session.close()
+
+
+class SMTPTarget:
+    """Pooled sends through mailer.SMTPPool, on as many threads as the mailer uses."""
+
+    def __init__(self, config: SMTPConfig):
+        self.config = config
+        self.pool = SMTPPool(config)
+        self.executor = ThreadPoolExecutor(max_workers=config.pool_size)
+
+    async def send(self, request: dict, i: int) -> Optional[str]:
+        mail = render(request["body"], i)
+        message = build_message(self.config.from_email, mail["to"], mail["subject"], mail["body"])
+        await asyncio.get_running_loop().run_in_executor(self.executor, self.pool.send, mail["to"], message)
+        return None
+
+    async def aclose(self):
+        await asyncio.get_running_loop().run_in_executor(self.executor, self.pool.close)
+        self.executor.shutdown()
+
+
+async def run_step(target, requests: List[dict], rate: float, seconds: float,
+                   max_in_flight: int, counter: List[int]) -> StepResult:
+    result = StepResult(rate, seconds)
+    weights = [r.get("weight", 1) for r in requests]
+    in_flight = set()
+    loop = asyncio.get_running_loop()
+
+    async def one(request: dict, i: int, due: float):
+        try:
+            error = await target.send(request, i)
+        except asyncio.TimeoutError:
+            error = "timeout"
+        except Exception as e:
+            error = type(e).__name__
+        result.latencies.append(loop.time() - due)
+        if error:
+            result.errors[error] += 1
+        else:
+            result.ok += 1
+
+    start = loop.time()
+    for k in range(int(rate * seconds)):
+        due = start + k / rate
+        delay = due - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if len(in_flight) >= max_in_flight:
+            result.dropped += 1
+            continue
+        request = random.choices(requests, weights)[0]
+        counter[0] += 1
+        task = asyncio.create_task(one(request, counter[0], due))
+        in_flight.add(task)
+        task.add_done_callback(in_flight.discard)
+        result.sent += 1
+    if in_flight:
+        await asyncio.wait(in_flight)
+    result.elapsed = max(loop.time() - start, seconds)
+    return result
+
+
+async def wait_drained(base_url: str, timeout: float = 60) -> Optional[dict]:
+    """Let the backend's webhook fan-out finish; returns its stats (None if unreachable)."""
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while True:
+            try:
+                async with session.get(f"{base_url}/fanout/stats") as response:
+                    stats = await response.json()
+            except aiohttp.ClientError:
+                return None
+            if not (stats["queued"] or stats["in_flight"] or stats["retry_pending"]) or time.monotonic() > deadline:
+                return stats
+            await asyncio.sleep(0.1)
+
+
+# =========================
+# Report
+# =========================
+def print_step(step: StepResult, slo_p99_ms: float):
+    errors = ", ".join(f"{name}×{count}" for name, count in step.errors.most_common(3))
+    if step.dropped:
+        errors = f"{errors + ', ' if errors else ''}dropped×{step.dropped}"
+    print(
+        f"  {step.offered:8.1f}/s  achieved {step.achieved:8.1f}/s  "
+        f"p50={pct(step.latencies, 50) * 1000:8.1f}ms  p95={pct(step.latencies, 95) * 1000:8.1f}ms  "
+        f"p99={pct(step.latencies, 99) * 1000:8.1f}ms  err={step.error_rate:6.1%}  "
+        f"{'✅' if step.sustained(slo_p99_ms) else '❌'} {errors}"
+    )
+
+
+async def run_scenario(scenario: dict, targets: Dict[str, object], args) -> Optional[float]:
+    """Run one scenario's ramp; returns its saturation point (req/s), None if no step was sustained."""
+    target = targets[scenario["target"]]
+    slo = scenario.get("slo_p99_ms", 500)
+    print(f"\n🔥 {scenario['name']} → {scenario['target']}  (p99 SLO {slo:.0f}ms)")
+    if scenario.get("description"):
+        print(f"  {scenario['description']}")
+
+    counter = [0]
+    saturation, failures = None, 0
+    for step in scenario["steps"]:
+        rate = step["rate"] * args.rate_scale
+        result = await run_step(target, scenario["requests"], rate, step["seconds"] * args.time_scale,
+                                args.max_in_flight, counter)
+        print_step(result, slo)
+        if result.sustained(slo):
+            saturation, failures = rate, 0
+        else:
+            failures += 1
+            if failures >= 2 and not args.full_ramp:
+                print("  … two steps past saturation, stopping the ramp")
+                break
+
+    if scenario["target"] == "backend":
+        stats = await wait_drained(args.backend_url)
+        if stats:
+            print(f"  fan-out: {stats}")
+    print(f"  saturation: {f'{saturation:.0f} req/s' if saturation else 'below the first step'}")
+    return saturation
+
+
+async def run_all(scenarios: List[dict], args, smtp_config: Optional[SMTPConfig]) -> Dict[str, Optional[float]]:
+    targets = {}
+    for name, url in (("backend", args.backend_url), ("server", args.server_url)):
+        if url:
+            targets[name] = HttpTarget(url, args.timeout, args.max_in_flight)
+    if smtp_config:
+        targets["smtp"] = SMTPTarget(smtp_config)
+    try:
+        return {s["name"]: await run_scenario(s, targets, args) for s in scenarios}
+    finally:
+        for target in targets.values():
+            await target.aclose()
+
+
+# =========================
+# Servers under test
+# =========================
+def spawn_app(module: str, app_dir: Path, port: int, workers: int, env: dict, cwd: str, log) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", f"{module}:app", "--app-dir", str(app_dir),
+         "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers),
+         "--log-level", "warning", "--no-access-log"],
+        cwd=cwd, env=env, stdout=log, stderr=subprocess.STDOUT,
+    )
+
+
+def wait_ready(url: str, process: subprocess.Popen, log_path: str, timeout: float = 30):
+    import urllib.request
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            break
+        try:
+            with urllib.request.urlopen(url, timeout=1):
+                return
+        except OSError:
+            time.sleep(0.1)
+    sys.exit(f"❌ {url} did not come up; see {log_path}:\n{Path(log_path).read_text()[-2000:]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("scenarios", nargs="*", help="scenario names or files (default: all in bench/scenarios)")
+    parser.add_argument("--rate-scale", type=float, default=1.0, help="multiply every step's rate")
+    parser.add_argument("--time-scale", type=float, default=1.0, help="multiply every step's duration")
+    parser.add_argument("--full-ramp", action="store_true", help="keep ramping after two unsustained steps")
+    parser.add_argument("--max-in-flight", type=int, default=512)
+    parser.add_argument("--timeout", type=float, default=10.0, help="per-request timeout in seconds")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers per app")
+    parser.add_argument("--backend-url", help="use a running bakery-backend instead of starting one")
+    parser.add_argument("--server-url", help="use a running server.py instead of starting one")
+    parser.add_argument("--webhook-latency", type=float, default=0.3, help="simulated n8n response time")
+    parser.add_argument("--webhook-error-rate", type=float, default=0.0)
+    parser.add_argument("--smtp-latency", type=float, default=0.02, help="simulated per-message SMTP time")
+    parser.add_argument("--smtp-handshake-latency", type=float, default=0.15)
+    parser.add_argument("--smtp-error-rate", type=float, default=0.0)
+    parser.add_argument("--smtp-pool-size", type=int, default=int(os.getenv("SMTP_POOL_SIZE", "2")))
+    args = parser.parse_args()
+
+    scenarios = load_scenarios(args.scenarios)
+    needed = {s["target"] for s in scenarios}
+
+    stub = WebhookStub(latency=args.webhook_latency, error_rate=args.webhook_error_rate)
+    start_in_thread(stub.start)
+    sink = SMTPSink(handshake_latency=args.smtp_handshake_latency,
+                    message_latency=args.smtp_latency, error_rate=args.smtp_error_rate)
+    start_in_thread(sink.start)
+    smtp_config = SMTPConfig(host="127.0.0.1", port=sink.port, user="load", password="load",
+                             from_email="load@crinclecupkakes.com", starttls=False,
+                             pool_size=args.smtp_pool_size) if "smtp" in needed else None
+    print(f"🪝 n8n stub :{stub.port} ({args.webhook_latency * 1000:.0f}ms, {args.webhook_error_rate:.0%} errors)  "
+          f"📭 SMTP sink :{sink.port} ({args.smtp_latency * 1000:.0f}ms, {args.smtp_error_rate:.0%} errors)")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {
+            **os.environ,
+            "N8N_DATABASE_WEBHOOK": stub.url("DataBase"),
+            "N8N_EMAIL_WEBHOOK": stub.url("Email"),
+            "ORDERS_DB_PATH": os.path.join(tmp, "orders.db"),
+            "METRICS_DIR": os.path.join(tmp, "metrics"),
+            "SMTP_HOST": "127.0.0.1",
+            "SMTP_PORT": str(sink.port),
+            "SMTP_STARTTLS": "false",
+            "TRUST_PROXY_HEADERS": "true",  # token_storm spreads callers over X-Forwarded-For
+        }
+        env.setdefault("LIVEKIT_API_KEY", "APIload")
+        env.setdefault("LIVEKIT_API_SECRET", "load-secret-load-secret-load-secret")
+        env.setdefault("LIVEKIT_URL", "wss://load.livekit.invalid")
+
+        processes = []
+        log_path = os.path.join(tmp, "servers.log")
+        with open(log_path, "w") as log:
+            if "backend" in needed and not args.backend_url:
+                port = free_port()
+                processes.append(spawn_app("main", ROOT / "bakery-backend", port, args.workers, env, tmp, log))
+                args.backend_url = f"http://127.0.0.1:{port}"
+                wait_ready(f"{args.backend_url}/fanout/stats", processes[-1], log_path)
+            if "server" in needed and not args.server_url:
+                port = free_port()
+                processes.append(spawn_app("server", ROOT, port, args.workers, env, tmp, log))
+                args.server_url = f"http://127.0.0.1:{port}"
+                wait_ready(f"{args.server_url}/health", processes[-1], log_path)
+
+            try:
+                saturation = asyncio.run(run_all(scenarios, args, smtp_config))
+            finally:
+                for process in processes:
+                    process.terminate()
+                    process.wait()
+
+    print(f"\n🪝 n8n stub  received={dict(stub.received)} failed={dict(stub.failed)}")
+    print(f"📭 SMTP sink {sink.connections} connections, {sink.messages} messages, {sink.rejected} rejected")
+    print("\nSaturation points:")
+    for name, rate in saturation.items():
+        print(f"  {name:<20} {f'{rate:.0f} req/s' if rate else 'below the first step'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,522 @@
+"""
+replay_bench.py — Offline voice-pipeline benchmark: call scripts replayed through the entrypoint.
+
+Every simulated call runs the real `Agent.entrypoint` (handlers, analytics,
+call actions, outbox, loop monitor) with a fake job context and room, and
+the scripted STT/LLM/TTS/VAD from bench/fake_plugins.py in place of the
+network plugins. No LiveKit server, API keys or backend are needed.
+
+Calls run concurrently in this one process, like the calls a worker
+process handles. For each concurrency level it reports:
+
+  - turn latency   caller stops speaking → first agent audio frame
+                   (p50/p95/p99), with the end-of-utterance, LLM TTFT and
+                   TTS TTFB parts
+  - handlers       time in each session handler (session_callback_seconds)
+  - loop blocking  event-loop lag p50/p99/max and slow callbacks
+  - memory         RSS growth per live call
+  - throughput     calls per minute and CPU time per call
+
+The highest level that keeps turn p95 and loop-lag p99 within budget is
+reported as sessions per worker. Backend records go to an in-process stub
+unless BACKEND_URL is set.
+
+  python bench/replay_bench.py --levels 1,4,8,16 --time-scale 0.25 --save
+  python bench/replay_bench.py --compare bench/results/replay-<commit>.json   # run, then diff
+  python bench/replay_bench.py --compare old.json new.json                    # diff two saved runs
+
+--save writes bench/results/replay-<commit>.json, so results from two
+commits can be put side by side. Scripts are bench/scripts/*.json (turn
+lists); a call summary from /call-analytics, with its transcript, replays
+a recorded call.
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import logging
+import os
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from statistics import quantiles
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent))
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+# Keep the run's state out of the working copy. Records go to BackendStub
+# unless BACKEND_URL points at a running backend.
+_scratch = tempfile.mkdtemp(prefix="replay-bench-")
+STUB_URL = f"http://127.0.0.1:{free_port()}"
+os.environ.setdefault("BACKEND_URL", STUB_URL)
+os.environ.setdefault("LOOP_MONITOR", "true")
+os.environ["OUTBOX_PATH"] = os.path.join(_scratch, "outbox.db")
+os.environ["MAIL_SPOOL_PATH"] = os.path.join(_scratch, "mail_spool.db")
+os.environ["METRICS_DIR"] = os.path.join(_scratch, "metrics")
+os.environ.setdefault("MENU_CACHE_PATH", os.path.join(_scratch, "menu_cache.json"))
+
+from aiohttp import web  # noqa: E402
+from livekit import rtc  # noqa: E402
+
+import Agent  # noqa: E402
+from admission import VOICE_ONLY  # noqa: E402
+from dispatch import AGENT_NAME  # noqa: E402
+from fake_plugins import FakeLLM, FakeSTT, FakeTTS, FakeVAD, ScriptedCaller, Timing  # noqa: E402
+from metrics import Histogram, registry  # noqa: E402
+from warm_pool import SessionComponents, WarmPool  # noqa: E402
+
+RESULTS_DIR = BENCH_DIR / "results"
+SCRIPTS_DIR = BENCH_DIR / "scripts"
+
+
+# =========================
+# Call scripts
+# =========================
+def load_script(path: Path) -> Dict:
+    """A turn list ({"turns": [...]}) or a recorded call summary / transcript."""
+    data = json.loads(path.read_text(encoding="utf-8"))
+    if isinstance(data, dict) and "turns" in data:
+        return {"name": path.stem, **data}
+    transcript = data.get("transcript", []) if isinstance(data, dict) else data
+    greeting, turns = [], []
+    for entry in transcript:
+        if entry["speaker"] == "customer":
+            turns.append({"caller": entry["text"], "agent": ""})
+        elif turns:
+            turns[-1]["agent"] = f"{turns[-1]['agent']} {entry['text']}".strip()
+        else:
+            greeting.append(entry["text"])
+    if not turns:
+        raise ValueError(f"{path}: no customer turns to replay")
+    return {"name": path.stem, "greeting": " ".join(greeting), "turns": turns}
+
+
+# =========================
+# Backend stand-in
+# =========================
+class BackendStub:
+    """Answers every POST with 200 after `latency` (GET /catalog: 404), on its own thread."""
+
+    def __init__(self, url: str, latency: float = 0.0):
+        self.host, self.port = url.rsplit("/", 1)[-1].split(":")
+        self.latency = latency
+        self.received: Dict[str, int] = {}
+        self._ready = threading.Event()
+
+    def start(self):
+        threading.Thread(target=asyncio.run, args=(self._serve(),), daemon=True).start()
+        self._ready.wait(5)
+
+    async def _serve(self):
+        app = web.Application(client_max_size=16 * 2**20)
+        app.router.add_route("*", "/{path:.*}", self._handle)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, self.host, int(self.port)).start()
+        self._ready.set()
+        await asyncio.Event().wait()
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        if request.method != "POST":
+            return web.Response(status=404)
+        await request.read()
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        path = request.match_info["path"]
+        self.received[path] = self.received.get(path, 0) + 1
+        return web.json_response({"ok": True})
+
+
+# =========================
+# Fake job context
+# =========================
+class FakeLocalParticipant:
+    identity = "agent-bench"
+    sid = "PA_agent-bench"
+    kind = rtc.ParticipantKind.PARTICIPANT_KIND_AGENT
+
+    async def publish_track(self, track, options=None):
+        return SimpleNamespace(sid=f"TR_{id(track):x}", track=track)
+
+    async def unpublish_track(self, sid):
+        pass
+
+    async def set_attributes(self, attributes):
+        pass
+
+
+class FakeRoom(rtc.EventEmitter):
+    """Enough of rtc.Room for the session, background audio and call control; never connects."""
+
+    def __init__(self, name: str):
+        super().__init__()
+        self.name = name
+        self.local_participant = FakeLocalParticipant()
+        self.remote_participants = {
+            "caller-bench": SimpleNamespace(identity="caller-bench", kind=rtc.ParticipantKind.PARTICIPANT_KIND_STANDARD)
+        }
+
+    def isconnected(self) -> bool:
+        return False
+
+    def register_text_stream_handler(self, topic, handler):
+        pass
+
+    def unregister_text_stream_handler(self, topic):
+        pass
+
+
+class FakeJobContext:
+    def __init__(self, room_name: str, userdata: Dict, shutdown_callbacks: List):
+        self.room = FakeRoom(room_name)
+        self.job = SimpleNamespace(id=f"AJ_{room_name}", agent_name=AGENT_NAME)
+        self.proc = SimpleNamespace(userdata=userdata)
+        self.failed: Optional[str] = None
+        self._shutdown_callbacks = shutdown_callbacks
+
+    async def connect(self):
+        pass
+
+    def add_shutdown_callback(self, callback):
+        self._shutdown_callbacks.append(callback)
+
+    def shutdown(self, reason: str = ""):
+        self.failed = reason
+
+    def token_claims(self):
+        # Admitted voice-only: no avatar to connect to
+        return SimpleNamespace(attributes={"call_mode": VOICE_ONLY})
+
+
+# =========================
+# One call
+# =========================
+async def run_call(index: int, script: Dict, timing: Timing, shared_vad, shutdown: List, turn_timeout: float) -> Dict:
+    caller = ScriptedCaller(script, timing)
+    components = SessionComponents(
+        llm=FakeLLM(caller),
+        stt=FakeSTT(caller),
+        tts=FakeTTS(timing),
+        noise_cancellation=None,
+        attach_io=caller.attach,
+    )
+    userdata = {"vad": shared_vad or FakeVAD(caller), "warm_pool": WarmPool(lambda: components).fill()}
+    ctx = FakeJobContext(f"replay-{index}", userdata, shutdown)
+    result = {"script": script["name"], "turns": [], "errors": 0, "metrics": caller.metrics}
+
+    started = time.perf_counter()
+    await Agent.entrypoint(ctx)
+    if ctx.failed or caller.session is None:
+        result["errors"] += 1
+        return result
+    result["startup"] = time.perf_counter() - started
+
+    try:
+        await caller.wait_until_listening(turn_timeout)
+        for turn in script["turns"]:
+            await asyncio.sleep(turn.get("pause", 1.0) * timing.time_scale)
+            latency = await caller.play_turn(turn, turn_timeout)
+            if latency is None:
+                result["errors"] += 1
+            else:
+                result["turns"].append(latency)
+    except asyncio.TimeoutError:
+        result["errors"] += 1
+    finally:
+        await caller.session.aclose()
+    return result
+
+
+# =========================
+# One concurrency level
+# =========================
+def rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def percentiles_ms(values: List[float]) -> Dict:
+    if not values:
+        return {"count": 0}
+    values = sorted(values)
+    if len(values) == 1:
+        p50 = p95 = p99 = values[0]
+    else:
+        cuts = quantiles(values, n=100, method="inclusive")
+        p50, p95, p99 = cuts[49], cuts[94], cuts[98]
+    return {
+        "count": len(values),
+        "p50_ms": round(p50 * 1000, 1),
+        "p95_ms": round(p95 * 1000, 1),
+        "p99_ms": round(p99 * 1000, 1),
+        "max_ms": round(values[-1] * 1000, 1),
+    }
+
+
+def histogram_delta(before: Dict, after: Dict, name: str) -> Dict[str, Histogram]:
+    """Per-label-set histograms of what was recorded between two registry snapshots."""
+    def index(snapshot):
+        return {json.dumps(h["labels"], sort_keys=True): h for h in snapshot["histograms"] if h["name"] == name}
+
+    old, delta = index(before), {}
+    for key, h in index(after).items():
+        prev = old.get(key)
+        hist = Histogram(tuple(h["buckets"]))
+        hist.bucket_counts = [n - (prev["bucket_counts"][i] if prev else 0) for i, n in enumerate(h["bucket_counts"])]
+        hist.count = h["count"] - (prev["count"] if prev else 0)
+        hist.sum = h["sum"] - (prev["sum"] if prev else 0.0)
+        hist.max = h["max"]  # max over the whole run — an upper bound for this level
+        if hist.count:
+            delta[key] = hist
+    return delta
+
+
+def counter_delta(before: Dict, after: Dict, name: str) -> Dict[str, float]:
+    def index(snapshot):
+        return {json.dumps(c["labels"], sort_keys=True): c["value"] for c in snapshot["counters"] if c["name"] == name}
+
+    old = index(before)
+    return {key: value - old.get(key, 0) for key, value in index(after).items() if value - old.get(key, 0)}
+
+
+async def run_level(concurrency: int, scripts: List[Dict], timing: Timing, args) -> Dict:
+    shutdown: List = []
+    shared_vad = Agent.silero.VAD.load() if args.vad == "silero" else None
+    gc.collect()
+    rss_base = rss_bytes()
+    rss_peak = rss_base
+    before = registry.snapshot()
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+
+    async def sample_rss():
+        nonlocal rss_peak
+        while True:
+            rss_peak = max(rss_peak, rss_bytes())
+            await asyncio.sleep(0.25)
+
+    async def staggered(i: int):
+        await asyncio.sleep(args.ramp * i / concurrency)
+        return await run_call(i, scripts[i % len(scripts)], timing, shared_vad, shutdown, args.turn_timeout)
+
+    sampler = asyncio.create_task(sample_rss())
+    calls = await asyncio.gather(*(staggered(i) for i in range(concurrency)))
+    sampler.cancel()
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+    after = registry.snapshot()
+
+    # What a job process does on exit: drain the outbox, write metrics, stop the monitor
+    for callback in shutdown:
+        await callback()
+
+    turns = [t for call in calls for t in call["turns"]]
+    parts = {name: [v for call in calls for v in call["metrics"][name]] for name in ("eou", "llm_ttft", "tts_ttfb")}
+    handlers = {
+        json.loads(key).get("handler", key): hist.summary()
+        for key, hist in histogram_delta(before, after, "session_callback_seconds").items()
+    }
+    lag = histogram_delta(before, after, "event_loop_lag_seconds")
+    lag_hist = next(iter(lag.values()), Histogram())
+    return {
+        "concurrency": concurrency,
+        "calls": len(calls),
+        "errors": sum(call["errors"] for call in calls),
+        "wall_seconds": round(wall, 2),
+        "turn_latency": percentiles_ms(turns),
+        "eou_delay": percentiles_ms(parts["eou"]),
+        "llm_ttft": percentiles_ms(parts["llm_ttft"]),
+        "tts_ttfb": percentiles_ms(parts["tts_ttfb"]),
+        "startup": percentiles_ms([call["startup"] for call in calls if "startup" in call]),
+        "handlers": handlers,
+        "loop_lag": {
+            "p50_ms": round(lag_hist.quantile(0.50) * 1000, 1),
+            "p99_ms": round(lag_hist.quantile(0.99) * 1000, 1),
+            "max_ms": round(lag_hist.max * 1000, 1),
+        },
+        "slow_callbacks": {
+            json.loads(key).get("handler", key): int(n)
+            for key, n in counter_delta(before, after, "slow_callbacks_total").items()
+        },
+        "rss_mb_per_call": round((rss_peak - rss_base) / concurrency / 2**20, 2),
+        "cpu_ms_per_call": round(cpu / len(calls) * 1000, 1),
+        "cpu_utilization": round(cpu / wall, 3),
+        "calls_per_minute": round(len(calls) / wall * 60, 1),
+    }
+
+
+def within_budget(level: Dict, args) -> bool:
+    return (
+        level["errors"] == 0
+        and level["turn_latency"].get("p95_ms", float("inf")) <= args.turn_budget_ms
+        and level["loop_lag"]["p99_ms"] <= args.lag_budget_ms
+    )
+
+
+# =========================
+# Reporting
+# =========================
+def git_commit() -> str:
+    try:
+        sha = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True, cwd=BENCH_DIR
+        ).stdout.strip()
+        dirty = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True, cwd=BENCH_DIR
+        ).stdout.strip()
+        return f"{sha}-dirty" if dirty else sha
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def print_levels(levels: List[Dict]):
+    print(f"{'calls':>6} {'turn p50':>9} {'p95':>7} {'p99':>7} {'eou p50':>8} {'lag p99':>8} {'lag max':>8} "
+          f"{'MB/call':>8} {'cpu ms/call':>12} {'calls/min':>10} {'errors':>7}")
+    for level in levels:
+        turn = level["turn_latency"]
+        print(f"{level['concurrency']:>6} {turn.get('p50_ms', '-'):>9} {turn.get('p95_ms', '-'):>7} "
+              f"{turn.get('p99_ms', '-'):>7} {level['eou_delay'].get('p50_ms', '-'):>8} "
+              f"{level['loop_lag']['p99_ms']:>8} {level['loop_lag']['max_ms']:>8} {level['rss_mb_per_call']:>8} "
+              f"{level['cpu_ms_per_call']:>12} {level['calls_per_minute']:>10} {level['errors']:>7}")
+    slowest = max(levels, key=lambda level: level["concurrency"])
+    if slowest["handlers"]:
+        print(f"\nhandlers at {slowest['concurrency']} calls:")
+        for name, summary in sorted(slowest["handlers"].items()):
+            print(f"  {name:<28} n={summary['count']:<6} p95={summary['p95_ms']}ms max={summary['max_ms']}ms")
+    if slowest["slow_callbacks"]:
+        print(f"slow callbacks: {slowest['slow_callbacks']}")
+
+
+COMPARED = [
+    ("turn p50 ms", lambda level: level["turn_latency"].get("p50_ms")),
+    ("turn p95 ms", lambda level: level["turn_latency"].get("p95_ms")),
+    ("turn p99 ms", lambda level: level["turn_latency"].get("p99_ms")),
+    ("loop lag p99 ms", lambda level: level["loop_lag"]["p99_ms"]),
+    ("MB per call", lambda level: level["rss_mb_per_call"]),
+    ("CPU ms per call", lambda level: level["cpu_ms_per_call"]),
+    ("calls per minute", lambda level: level["calls_per_minute"]),
+]
+
+
+def compare(old: Dict, new: Dict):
+    print(f"\n{old['commit']} → {new['commit']}")
+    print(f"sessions per worker: {old['sessions_per_worker']} → {new['sessions_per_worker']}")
+    new_levels = {level["concurrency"]: level for level in new["levels"]}
+    for level in old["levels"]:
+        other = new_levels.get(level["concurrency"])
+        if not other:
+            continue
+        print(f"\n  {level['concurrency']} concurrent calls")
+        for label, value in COMPARED:
+            a, b = value(level), value(other)
+            change = f"{(b - a) / a * 100:+.1f}%" if a and b is not None else ""
+            print(f"    {label:<18} {a!s:>10} → {b!s:>10}  {change}")
+
+
+# =========================
+# Main
+# =========================
+async def run(args) -> Dict:
+    paths = [Path(p) for p in args.scripts] if args.scripts else sorted(SCRIPTS_DIR.glob("*.json"))
+    scripts = [load_script(p) for p in paths]
+    timing = Timing(
+        words_per_second=args.words_per_second,
+        stt_delay=args.stt_delay,
+        llm_ttft=args.llm_ttft,
+        llm_tokens_per_second=args.llm_tps,
+        tts_ttfb=args.tts_ttfb,
+        time_scale=args.time_scale,
+    )
+    stub = None
+    if os.environ["BACKEND_URL"] == STUB_URL:
+        stub = BackendStub(STUB_URL, args.backend_latency)
+        stub.start()
+    Agent.menu_cache.refresh_blocking()  # as prewarm would
+    levels = []
+    for concurrency in sorted(int(n) for n in args.levels.split(",")):
+        print(f"… {concurrency} concurrent call(s)", file=sys.stderr)
+        levels.append(await run_level(concurrency, scripts, timing, args))
+    passing = [level["concurrency"] for level in levels if within_budget(level, args)]
+    return {
+        "commit": git_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "config": {
+            "scripts": [s["name"] for s in scripts],
+            "vad": args.vad,
+            "backend": "stub" if stub else os.environ["BACKEND_URL"],
+            "timing": vars(timing),
+            "turn_budget_ms": args.turn_budget_ms,
+            "lag_budget_ms": args.lag_budget_ms,
+        },
+        "levels": levels,
+        "sessions_per_worker": max(passing, default=0),
+        "backend_posts": dict(stub.received) if stub else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("scripts", nargs="*", help="call scripts or recorded call summaries (default: bench/scripts)")
+    parser.add_argument("--levels", default="1,4,8", help="concurrent calls per level, comma-separated")
+    parser.add_argument("--time-scale", type=float, default=1.0, help="< 1 replays caller speech and agent playout faster")
+    parser.add_argument("--ramp", type=float, default=1.0, help="seconds over which a level's calls start")
+    parser.add_argument("--vad", choices=("scripted", "silero"), default="scripted",
+                        help="silero runs the real VAD model on every frame (realistic CPU)")
+    parser.add_argument("--words-per-second", type=float, default=2.5)
+    parser.add_argument("--stt-delay", type=float, default=0.15)
+    parser.add_argument("--llm-ttft", type=float, default=0.35)
+    parser.add_argument("--llm-tps", type=float, default=40.0)
+    parser.add_argument("--tts-ttfb", type=float, default=0.2)
+    parser.add_argument("--backend-latency", type=float, default=0.05, help="stub backend response time")
+    parser.add_argument("--turn-timeout", type=float, default=30.0)
+    parser.add_argument("--turn-budget-ms", type=float, default=2000.0, help="turn latency p95 a level must stay under")
+    parser.add_argument("--lag-budget-ms", type=float, default=50.0, help="loop lag p99 a level must stay under")
+    parser.add_argument("--save", action="store_true", help="write bench/results/replay-<commit>.json")
+    parser.add_argument("--compare", nargs="+", metavar="RESULTS", help="diff against a saved run (or two saved runs)")
+    parser.add_argument("--verbose", action="store_true", help="keep the agent's INFO logs")
+    args = parser.parse_args()
+
+    if args.compare and len(args.compare) == 2:
+        old, new = (json.loads(Path(p).read_text()) for p in args.compare)
+        compare(old, new)
+        return
+
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+        logging.getLogger("livekit").setLevel(logging.ERROR)  # per-call setup warnings
+    results = asyncio.run(run(args))
+    print_levels(results["levels"])
+    if results["backend_posts"]:
+        print(f"backend stub received: {results['backend_posts']}")
+    print(f"\nsessions per worker (turn p95 ≤ {args.turn_budget_ms:.0f}ms, loop lag p99 ≤ "
+          f"{args.lag_budget_ms:.0f}ms): {results['sessions_per_worker']}")
+
+    if args.save:
+        RESULTS_DIR.mkdir(exist_ok=True)
+        path = RESULTS_DIR / f"replay-{results['commit']}.json"
+        path.write_text(json.dumps(results, indent=2))
+        print(f"saved {path}")
+    if args.compare:
+        compare(json.loads(Path(args.compare[0]).read_text()), results)
+
+
+if __name__ == "__main__":
+    main()
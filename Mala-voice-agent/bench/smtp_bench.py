@@ -0,0 +1,112 @@
+"""
+smtp_bench.py — Compare the old connect-per-email path with the pooled mailer.
+
+Everything runs offline against bench/smtp_sink.py. Reports how long the
+send_email tool blocks the LLM turn (the "tool" column) and end-to-end
+delivery throughput.
+
+  python bench/smtp_bench.py --messages 200 --handshake-latency 0.15
+"""
+
+import argparse
+import asyncio
+import os
+import smtplib
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from statistics import quantiles
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from mailer import Mailer, SMTPConfig, build_message  # noqa: E402
+from outbox import Outbox  # noqa: E402
+from smtp_sink import SMTPSink  # noqa: E402
+
+
+def start_sink_thread(sink: SMTPSink) -> int:
+    """Run the sink on its own loop so blocking clients can't stall it."""
+    loop = asyncio.new_event_loop()
+    started = threading.Event()
+
+    def run():
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(sink.start())
+        started.set()
+        loop.run_forever()
+
+    threading.Thread(target=run, daemon=True).start()
+    started.wait()
+    return sink.port
+
+
+def pct(values, q):
+    if len(values) < 2:
+        return values[0] if values else 0.0
+    return quantiles(values, n=100)[q - 1]
+
+
+def report(name, tool_latencies, total, count):
+    print(
+        f"{name:<22} tool p50={pct(tool_latencies, 50) * 1000:8.2f}ms "
+        f"p95={pct(tool_latencies, 95) * 1000:8.2f}ms   "
+        f"delivered {count} in {total:6.2f}s ({count / total:7.1f} msg/s)"
+    )
+
+
+def bench_connect_per_email(config: SMTPConfig, count: int):
+    """The previous send_email body: connect, EHLO, LOGIN, send, QUIT — per call."""
+    latencies = []
+    start = time.perf_counter()
+    for i in range(count):
+        t0 = time.perf_counter()
+        with smtplib.SMTP(config.host, config.port) as server:
+            server.ehlo()
+            server.login(config.user, config.password)
+            server.sendmail(config.from_email, "customer@example.com",
+                            build_message(config.from_email, "customer@example.com", f"Order #{i}", "Thanks!"))
+        latencies.append(time.perf_counter() - t0)
+    report("connect-per-email", latencies, time.perf_counter() - start, count)
+
+
+async def bench_pooled(config: SMTPConfig, count: int, spool_path: str):
+    mailer = Mailer(config, Outbox(spool_path), interval=0.05)
+    latencies = []
+    start = time.perf_counter()
+    for i in range(count):
+        t0 = time.perf_counter()
+        mailer.enqueue("customer@example.com", f"Order #{i}", "Thanks!")
+        latencies.append(time.perf_counter() - t0)
+        await asyncio.sleep(0)  # let the delivery task run, like a live session would
+    while mailer.spool.pending_count():
+        await asyncio.sleep(0.01)
+    report(f"pooled (size={config.pool_size})", latencies, time.perf_counter() - start, count)
+    await mailer.aclose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SMTP delivery benchmark")
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--pool-size", type=int, default=4)
+    parser.add_argument("--handshake-latency", type=float, default=0.15, help="simulated STARTTLS+LOGIN cost")
+    parser.add_argument("--message-latency", type=float, default=0.01)
+    parser.add_argument("--skip-baseline", action="store_true")
+    args = parser.parse_args()
+
+    sink = SMTPSink(handshake_latency=args.handshake_latency, message_latency=args.message_latency)
+    port = start_sink_thread(sink)
+    config = SMTPConfig(host="127.0.0.1", port=port, user="bench", password="bench",
+                        from_email="bench@crinclecupkakes.com", starttls=False, pool_size=args.pool_size)
+
+    print(f"📭 Sink on :{port} — {args.messages} messages, handshake {args.handshake_latency * 1000:.0f}ms\n")
+    if not args.skip_baseline:
+        bench_connect_per_email(config, args.messages)
+    with tempfile.TemporaryDirectory() as tmp:
+        asyncio.run(bench_pooled(config, args.messages, os.path.join(tmp, "spool.db")))
+    print(f"\nsink: {sink.connections} connections, {sink.messages} messages")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+smtp_sink.py — Local SMTP stand-in for offline mail benchmarks.
+
+A minimal asyncio SMTP server (in the spirit of an aiosmtpd sink) that
+accepts EHLO, AUTH PLAIN/LOGIN, MAIL, RCPT and DATA, counts messages and
+throws them away. Latency and failures can be injected to mimic a slow
+or flaky provider.
+
+Run standalone and point the agent at it:
+  python bench/smtp_sink.py --port 2525 --handshake-latency 0.2
+  SMTP_HOST=127.0.0.1 SMTP_PORT=2525 SMTP_STARTTLS=false SMTP_USER=x SMTP_PASSWORD=x python Agent.py dev
+"""
+
+import argparse
+import asyncio
+import random
+from typing import Optional
+
+
+class SMTPSink:
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        handshake_latency: float = 0.0,
+        message_latency: float = 0.0,
+        error_rate: float = 0.0,
+    ):
+        self.host = host
+        self.port = port
+        self.handshake_latency = handshake_latency  # per connection (TLS + LOGIN cost)
+        self.message_latency = message_latency      # per accepted message
+        self.error_rate = error_rate                # fraction of DATA answered with 451
+        self.connections = 0
+        self.messages = 0
+        self.rejected = 0
+        self.bytes = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self) -> int:
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self.port
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+
+        def reply(line: str):
+            writer.write(line.encode() + b"\r\n")
+
+        reply("220 sink ESMTP ready")
+        try:
+            while True:
+                await writer.drain()
+                raw = await reader.readline()
+                if not raw:
+                    break
+                line = raw.decode(errors="replace").strip()
+                verb = line.split(" ", 1)[0].upper()
+
+                if verb == "EHLO":
+                    reply("250-sink")
+                    reply("250-AUTH PLAIN LOGIN")
+                    reply("250 8BITMIME")
+                elif verb == "HELO":
+                    reply("250 sink")
+                elif verb == "AUTH":
+                    if line.upper().startswith("AUTH LOGIN"):
+                        reply("334 VXNlcm5hbWU6")
+                        await writer.drain()
+                        await reader.readline()
+                        reply("334 UGFzc3dvcmQ6")
+                        await writer.drain()
+                        await reader.readline()
+                    await asyncio.sleep(self.handshake_latency)
+                    reply("235 Authentication successful")
+                elif verb in ("MAIL", "RCPT", "RSET", "NOOP"):
+                    reply("250 OK")
+                elif verb == "DATA":
+                    reply("354 End data with <CR><LF>.<CR><LF>")
+                    await writer.drain()
+                    size = 0
+                    while True:
+                        chunk = await reader.readline()
+                        if not chunk or chunk == b".\r\n":
+                            break
+                        size += len(chunk)
+                    await asyncio.sleep(self.message_latency)
+                    if random.random() < self.error_rate:
+                        self.rejected += 1
+                        reply("451 Temporary failure, try again")
+                    else:
+                        self.messages += 1
+                        self.bytes += size
+                        reply("250 Queued")
+                elif verb == "QUIT":
+                    reply("221 Bye")
+                    await writer.drain()
+                    break
+                else:
+                    reply("502 Command not implemented")
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+async def _main(args):
+    sink = SMTPSink(args.host, args.port, args.handshake_latency, args.message_latency, args.error_rate)
+    port = await sink.start()
+    print(f"📭 SMTP sink listening on {args.host}:{port}")
+    try:
+        while True:
+            await asyncio.sleep(10)
+            print(f"   connections={sink.connections} messages={sink.messages} rejected={sink.rejected}")
+    finally:
+        await sink.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local SMTP sink")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=2525)
+    parser.add_argument("--handshake-latency", type=float, default=0.0)
+    parser.add_argument("--message-latency", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    try:
+        asyncio.run(_main(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
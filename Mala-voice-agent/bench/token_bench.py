@@ -0,0 +1,79 @@
+"""
+token_bench.py — /token throughput: tokens per second on one core.
+
+Compares the old per-request path (read the env, build an AccessToken,
+sign with PyJWT) with token_service.TokenService (credentials and signing
+key prepared once), then measures the whole endpoint through FastAPI,
+minting a token every time and with the (room, identity) cache on.
+
+  python bench/token_bench.py --seconds 3
+"""
+
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+os.environ.setdefault("LIVEKIT_API_KEY", "APIbench")
+os.environ.setdefault("LIVEKIT_API_SECRET", "bench-secret-bench-secret-bench-secret")
+os.environ.setdefault("LIVEKIT_URL", "wss://bench.livekit.invalid")
+# The endpoint runs would otherwise trip the limiter within a few requests
+os.environ.setdefault("TOKEN_BURST_PER_IP", "1e12")
+os.environ.setdefault("TOKEN_BURST_PER_IDENTITY", "1e12")
+
+from livekit.api import AccessToken, TokenVerifier, VideoGrants  # noqa: E402
+
+from token_service import TokenService  # noqa: E402
+
+
+def per_request_token(i: int) -> str:
+    """What server.py did before: everything from scratch on each request."""
+    return (
+        AccessToken(os.getenv("LIVEKIT_API_KEY"), os.getenv("LIVEKIT_API_SECRET"))
+        .with_identity(f"caller-{i}")
+        .with_name("Customer")
+        .with_grants(VideoGrants(room_join=True, room="crincle-cupkakes", can_publish=True, can_subscribe=True))
+        .to_jwt()
+    )
+
+
+def run(name: str, fn, seconds: float):
+    count = 0
+    start = time.perf_counter()
+    deadline = start + seconds
+    while time.perf_counter() < deadline:
+        for _ in range(100):
+            fn(count)
+            count += 1
+    elapsed = time.perf_counter() - start
+    print(f"{name:<28} {count / elapsed:10.0f} tokens/s   {elapsed / count * 1e6:7.1f}µs each")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Token minting benchmark (single core)")
+    parser.add_argument("--seconds", type=float, default=3.0)
+    args = parser.parse_args()
+
+    service = TokenService.from_env()
+    verifier = TokenVerifier(os.environ["LIVEKIT_API_KEY"], os.environ["LIVEKIT_API_SECRET"])
+    claims = verifier.verify(service.mint("crincle-cupkakes", "check"))  # same JWT LiveKit expects
+    assert claims.identity == "check" and claims.video.room == "crincle-cupkakes"
+
+    print(f"🎟  Minting for {args.seconds:.0f}s per run\n")
+    run("AccessToken per request", per_request_token, args.seconds)
+    run("TokenService.mint", lambda i: service.mint("crincle-cupkakes", f"caller-{i}"), args.seconds)
+
+    from fastapi.testclient import TestClient
+    import server
+
+    client = TestClient(server.app)
+    run("POST /token", lambda i: client.post("/token", json={"identity": f"caller-{i}"}), args.seconds)
+    server.token_service.cache_ttl = 5
+    run("POST /token (cache hits)", lambda i: client.post("/token", json={"identity": "caller"}), args.seconds)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+webhook_stub.py — Local stand-in for the n8n webhooks (Database + Email).
+
+Accepts any POST under /webhook/<name>, counts it per name and answers
+200 after an optional delay. Latency and failures can be injected to
+mimic a slow or flaky n8n cloud.
+
+Run standalone and point the backend at it:
+  python bench/webhook_stub.py --port 5678 --latency 0.4 --error-rate 0.05
+  N8N_DATABASE_WEBHOOK=http://127.0.0.1:5678/webhook/DataBase \
+  N8N_EMAIL_WEBHOOK=http://127.0.0.1:5678/webhook/Email uvicorn main:app
+"""
+
+import argparse
+import asyncio
+import random
+from collections import Counter
+from typing import Optional
+
+from aiohttp import web
+
+
+class WebhookStub:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0, error_rate: float = 0.0):
+        self.host = host
+        self.port = port
+        self.latency = latency          # seconds before each answer
+        self.error_rate = error_rate    # fraction of calls answered with 500
+        self.received: Counter = Counter()
+        self.failed: Counter = Counter()
+        self._runner: Optional[web.AppRunner] = None
+
+    def url(self, name: str) -> str:
+        return f"http://{self.host}:{self.port}/webhook/{name}"
+
+    async def start(self) -> int:
+        app = web.Application()
+        app.router.add_post("/webhook/{name}", self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        self.port = self._runner.addresses[0][1]
+        return self.port
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        name = request.match_info["name"]
+        await request.json()
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if random.random() < self.error_rate:
+            self.failed[name] += 1
+            return web.Response(status=500, text="injected failure")
+        self.received[name] += 1
+        return web.json_response({"ok": True})
+
+
+async def _main(args):
+    stub = WebhookStub(args.host, args.port, args.latency, args.error_rate)
+    await stub.start()
+    print(f"🪝 Webhook stub on http://{args.host}:{stub.port}/webhook/<name>")
+    try:
+        while True:
+            await asyncio.sleep(5)
+            print(f"   received={dict(stub.received)} failed={dict(stub.failed)}")
+    finally:
+        await stub.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local n8n webhook stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5678)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    try:
+        asyncio.run(_main(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
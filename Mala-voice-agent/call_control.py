@@ -0,0 +1,214 @@
+"""
+call_control.py — Hold and transfer, carried out on the room.
+
+`CallControl.hold` really holds the call: the agent stops listening (no
+caller audio reaches STT or the realtime LLM, so nothing is processed or
+billed while the line is quiet) and hold music plays until the time is
+up or `resume()` is called.
+
+`CallControl.transfer` connects a person:
+
+  - with SIP_OUTBOUND_TRUNK_ID set, TRANSFER_PHONE is dialled into the
+    room (hold music while it rings); once answered the agent steps back
+    and the caller talks to the team member directly, web or phone caller
+  - otherwise a phone (SIP) caller is handed over with a SIP REFER to
+    TRANSFER_PHONE
+  - otherwise (or with TRANSFER_PHONE unset) nobody can be connected and
+    the agent offers a callback
+
+The room side is behind `LiveKitCallBackend`; bench/fake_call.py has a
+fake with the same methods so the flows can be run offline.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from metrics import registry
+
+logger = logging.getLogger("CrincleCupkakes")
+
+TRANSFER_PHONE = os.getenv("TRANSFER_PHONE")  # unset: transfers are unavailable
+SIP_OUTBOUND_TRUNK_ID = os.getenv("SIP_OUTBOUND_TRUNK_ID")
+TRANSFER_DIAL_TIMEOUT = float(os.getenv("TRANSFER_DIAL_TIMEOUT", "30"))
+TRANSFER_IDENTITY = "staff-transfer"
+MAX_HOLD_SECONDS = float(os.getenv("MAX_HOLD_SECONDS", "120"))
+
+# Outcomes of CallControl.transfer
+BRIDGED = "bridged"
+REFERRED = "referred"
+NO_ANSWER = "no_answer"
+UNAVAILABLE = "unavailable"
+
+
+@dataclass
+class Caller:
+    identity: str
+    is_sip: bool
+
+
+class LiveKitCallBackend:
+    """The room operations CallControl needs, on a live LiveKit job."""
+
+    def __init__(self, ctx, session, background_audio):
+        self.ctx = ctx
+        self.session = session
+        self.background_audio = background_audio
+
+    def caller(self) -> Optional[Caller]:
+        from livekit import rtc
+
+        for participant in self.ctx.room.remote_participants.values():
+            if participant.kind == rtc.ParticipantKind.PARTICIPANT_KIND_SIP:
+                return Caller(participant.identity, True)
+            if participant.kind == rtc.ParticipantKind.PARTICIPANT_KIND_STANDARD:
+                return Caller(participant.identity, False)
+        return None
+
+    def set_listening(self, enabled: bool):
+        self.session.input.set_audio_enabled(enabled)
+
+    def set_speaking(self, enabled: bool):
+        self.session.output.set_audio_enabled(enabled)
+
+    def play_hold_audio(self):
+        from livekit.agents import AudioConfig, BuiltinAudioClip
+
+        return self.background_audio.play(AudioConfig(BuiltinAudioClip.HOLD_MUSIC, volume=0.6), loop=True)
+
+    async def wait_until_quiet(self, timeout: float):
+        """Let the agent finish what it is saying (e.g. "please hold") first."""
+        deadline = time.monotonic() + timeout
+        await asyncio.sleep(0.2)
+        while self.session.agent_state in ("thinking", "speaking") and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+
+    async def dial(self, number: str, trunk_id: str, timeout: float) -> bool:
+        """Call `number` into the room; True once it is answered."""
+        from google.protobuf.duration_pb2 import Duration
+        from livekit import api
+
+        # LiveKit stops ringing after ringing_timeout; cancelling the request
+        # alone would leave the call ringing, and staff could still pick up
+        request = api.CreateSIPParticipantRequest(
+            sip_trunk_id=trunk_id,
+            sip_call_to=number,
+            room_name=self.ctx.room.name,
+            participant_identity=TRANSFER_IDENTITY,
+            participant_name="Crincle Cupkakes team",
+            wait_until_answered=True,
+            ringing_timeout=Duration(seconds=max(1, int(timeout))),
+        )
+        try:
+            await asyncio.wait_for(self.ctx.api.sip.create_sip_participant(request), timeout + 5)
+            return True
+        except Exception as e:
+            logger.warning(f"📞 Transfer call to {number} not answered: {e!r}")
+            await self._hang_up_transfer()
+            return False
+
+    async def _hang_up_transfer(self):
+        """Make sure the unanswered transfer call can't still join the room."""
+        from livekit import api
+
+        try:
+            await self.ctx.api.room.remove_participant(
+                api.RoomParticipantIdentity(room=self.ctx.room.name, identity=TRANSFER_IDENTITY)
+            )
+        except Exception:
+            pass  # usually already gone: it never joined
+
+    async def refer(self, caller_identity: str, number: str):
+        await self.ctx.transfer_sip_participant(caller_identity, f"tel:{number}", play_dialtone=True)
+
+
+class CallControl:
+    def __init__(
+        self,
+        backend,
+        transfer_phone: Optional[str] = TRANSFER_PHONE,
+        outbound_trunk_id: Optional[str] = SIP_OUTBOUND_TRUNK_ID,
+        dial_timeout: float = TRANSFER_DIAL_TIMEOUT,
+        announce_timeout: float = 8.0,
+        max_hold: float = MAX_HOLD_SECONDS,
+    ):
+        self.backend = backend
+        self.transfer_phone = transfer_phone
+        self.outbound_trunk_id = outbound_trunk_id
+        self.dial_timeout = dial_timeout
+        self.announce_timeout = announce_timeout
+        self.max_hold = max_hold
+        self.on_hold = False
+        self.transferred = False
+        self._resume = asyncio.Event()
+
+    async def hold(self, seconds: float) -> float:
+        """Hold for up to `seconds` (less if resume() is called); returns how long the caller waited."""
+        seconds = min(seconds, self.max_hold)
+        await self.backend.wait_until_quiet(self.announce_timeout)
+        logger.info(f"⏸ Holding for {seconds} seconds")
+        start = time.perf_counter()
+        self.on_hold = True
+        self._resume.clear()
+        self.backend.set_listening(False)
+        music = self.backend.play_hold_audio()
+        try:
+            await asyncio.wait_for(self._resume.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            music.stop()
+            self.backend.set_listening(True)
+            self.on_hold = False
+        held = time.perf_counter() - start
+        registry.histogram("hold_seconds").observe(held)
+        logger.info(f"▶️ Resuming from hold after {held:.1f}s")
+        return held
+
+    def resume(self):
+        self._resume.set()
+
+    async def transfer(self, reason: str) -> str:
+        """Connect the caller to a person; returns BRIDGED, REFERRED, NO_ANSWER or UNAVAILABLE."""
+        start = time.perf_counter()
+        outcome = await self._transfer()
+        registry.counter("transfer_total", outcome=outcome).inc()
+        registry.histogram("transfer_connect_seconds", outcome=outcome).observe(time.perf_counter() - start)
+        logger.info(f"📞 Transfer ({reason}): {outcome}")
+        return outcome
+
+    async def _transfer(self) -> str:
+        if self.transferred:
+            return BRIDGED
+        if not self.transfer_phone:
+            return UNAVAILABLE
+        caller = self.backend.caller()
+        await self.backend.wait_until_quiet(self.announce_timeout)
+
+        if self.outbound_trunk_id:
+            self.backend.set_listening(False)
+            music = self.backend.play_hold_audio()
+            try:
+                answered = await self.backend.dial(self.transfer_phone, self.outbound_trunk_id, self.dial_timeout)
+            finally:
+                music.stop()
+            if answered:
+                # The caller and the team member talk directly; the agent stays out of it
+                self.backend.set_speaking(False)
+                self.transferred = True
+                return BRIDGED
+            self.backend.set_listening(True)
+            return NO_ANSWER
+
+        if caller and caller.is_sip:
+            try:
+                await self.backend.refer(caller.identity, self.transfer_phone)
+            except Exception as e:
+                logger.warning(f"📞 SIP REFER of {caller.identity} to {self.transfer_phone} failed: {e!r}")
+                return NO_ANSWER
+            self.transferred = True
+            return REFERRED
+        return UNAVAILABLE
@@ -0,0 +1,69 @@
+"""
+dispatch.py — One room per call, explicit agent dispatch, worker load.
+
+Every /token request gets its own room and participant identity from
+`RoomAllocator`, so concurrent callers never share a room and each call
+is a separate job that LiveKit can place on any agent worker.
+
+The agent registers under AGENT_NAME, which turns off LiveKit's automatic
+"join every room" dispatch. Instead each token carries a RoomConfiguration
+asking for that agent, so LiveKit dispatches it exactly once when the
+caller creates the room. SIP dispatch rules must name the same agent.
+
+LiveKit sends a new job to an available worker with the lowest reported
+load; a worker stops receiving jobs once its load reaches LOAD_THRESHOLD.
+`WorkerLoad` (the AgentServer load_fnc) reports the higher of CPU usage
+and active calls / MAX_CALLS_PER_WORKER, so a worker holding many mostly
+idle calls is still seen as full. admission.AdmissionController wraps it
+(adding event-loop lag) and decides each job it is offered.
+"""
+
+import os
+import secrets
+import threading
+from typing import Tuple
+
+AGENT_NAME = os.getenv("AGENT_NAME", "crincle-sana")  # "" = automatic dispatch to every room
+ROOM_PREFIX = os.getenv("ROOM_PREFIX", "crincle-call")
+MAX_CALLS_PER_WORKER = int(os.getenv("MAX_CALLS_PER_WORKER", "8"))
+LOAD_THRESHOLD = float(os.getenv("LOAD_THRESHOLD", "0.7"))
+
+
+class RoomAllocator:
+    def __init__(self, prefix: str = ROOM_PREFIX):
+        self.prefix = prefix
+
+    def allocate(self) -> Tuple[str, str]:
+        """A fresh (room, identity) pair for one call."""
+        call_id = secrets.token_hex(6)
+        return f"{self.prefix}-{call_id}", f"caller-{call_id}"
+
+
+class WorkerLoad:
+    """AgentServer load_fnc: max(CPU, active calls), scaled so a full worker hits `threshold`."""
+
+    def __init__(
+        self,
+        max_calls: int = MAX_CALLS_PER_WORKER,
+        threshold: float = LOAD_THRESHOLD,
+        smoothing: float = 0.5,
+    ):
+        from livekit.agents.utils.hw import get_cpu_monitor
+
+        self.max_calls = max_calls
+        self.threshold = threshold
+        self.smoothing = smoothing
+        self._cpu_monitor = get_cpu_monitor()
+        self._cpu = 0.0
+        self._lock = threading.Lock()
+        self.load = 0.0
+
+    def __call__(self, server) -> float:
+        # Runs in an executor thread on the worker's load-report interval
+        sample = self._cpu_monitor.cpu_percent(interval=0.5)
+        active = len(server.active_jobs)
+        with self._lock:
+            self._cpu = self.smoothing * self._cpu + (1 - self.smoothing) * sample
+            calls = active / self.max_calls * self.threshold if self.max_calls else 0.0
+            self.load = min(1.0, max(self._cpu, calls))
+            return self.load
@@ -0,0 +1,70 @@
+"""
+faq.py — Compiled FAQ matcher.
+
+Keywords from the knowledge base are compiled once into a phrase table
+keyed by normalized word n-grams. Matching an utterance tokenizes it once
+and does one dict lookup per (word, n-gram length), so the cost per
+`user_input_transcribed` event depends on the utterance length — not on how many
+categories or keywords the knowledge base holds.
+
+Matching is on whole words: "time" no longer fires inside "sometimes".
+"""
+
+import json
+import re
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+DEFAULT_KNOWLEDGE_PATH = Path(__file__).resolve().parent / "faq_knowledge.json"
+
+_WORD_RE = re.compile(r"[a-z0-9']+")
+
+
+def load_knowledge(path: Optional[str] = None) -> Dict[str, Dict]:
+    """Load {category: {"keywords": [...], "answer": "..."}} from a JSON file."""
+    with open(path or DEFAULT_KNOWLEDGE_PATH, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _normalize(word: str) -> str:
+    # Light plural folding so "flavors" still hits "flavor" and "prices" hits "price"
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def tokenize(text: str) -> List[str]:
+    return [_normalize(w) for w in _WORD_RE.findall(text.lower())]
+
+
+class FAQMatcher:
+    def __init__(self, knowledge: Dict[str, Dict]):
+        self.knowledge = knowledge
+        # phrase (tuple of normalized words) → categories it belongs to
+        self._phrases: Dict[Tuple[str, ...], List[str]] = defaultdict(list)
+        for category, faq in knowledge.items():
+            for keyword in faq["keywords"]:
+                phrase = tuple(tokenize(keyword))
+                if phrase and category not in self._phrases[phrase]:
+                    self._phrases[phrase].append(category)
+        self._max_len = max((len(p) for p in self._phrases), default=0)
+        self._order = {category: i for i, category in enumerate(knowledge)}
+
+    def match(self, text: str) -> List[Tuple[str, int]]:
+        """
+        All matching categories, best first, as (category, score). Each hit
+        scores its phrase length, so "how much" outweighs a lone "time".
+        """
+        words = tokenize(text)
+        scores: Dict[str, int] = defaultdict(int)
+        for i in range(len(words)):
+            for n in range(1, min(self._max_len, len(words) - i) + 1):
+                for category in self._phrases.get(tuple(words[i:i + n]), ()):
+                    scores[category] += n
+        # Ties keep knowledge-base order, like the old first-match scan
+        return sorted(scores.items(), key=lambda item: (-item[1], self._order[item[0]]))
+
+    def answer(self, text: str) -> Optional[str]:
+        matches = self.match(text)
+        return self.knowledge[matches[0][0]]["answer"] if matches else None
@@ -0,0 +1,77 @@
+"""
+latency.py — Per-turn voice pipeline latency (STT → LLM → TTS → avatar).
+
+Fed from the AgentSession events subscribed in the entrypoint:
+
+  user_state_changed (speaking → *)  end of user speech, the turn's t=0
+  metrics_collected                  EOU delay, LLM/realtime TTFT, TTS TTFB
+  agent_state_changed (→ speaking)   first audio frame reaches the output
+                                     (the avatar, when it's attached)
+
+Stages are cumulative from the end of user speech, so the histograms show
+where a slow turn spent its time:
+
+  end_of_utterance  →  llm_first_token  →  tts_first_byte  →  playout_start
+
+`llm_first_token` and `tts_first_byte` are derived from the plugin metrics
+(EOU delay + TTFT [+ TTFB]); `playout_start` is measured directly.
+"""
+
+import time
+from typing import Any, Dict, Optional
+
+from metrics import Histogram, registry
+
+STAGES = ("end_of_utterance", "llm_first_token", "tts_first_byte", "playout_start")
+
+
+class TurnLatencyTracker:
+    def __init__(self):
+        # Per-call histograms for the summary; the registry aggregates across calls
+        self.stages: Dict[str, Histogram] = {stage: Histogram() for stage in STAGES}
+        self.turns = 0
+        self._user_stopped_at: Optional[float] = None
+        self._turn: Dict[str, float] = {}
+
+    def _record(self, stage: str, seconds: float):
+        self.stages[stage].observe(seconds)
+        registry.histogram("voice_turn_latency_seconds", stage=stage).observe(seconds)
+
+    def user_stopped_speaking(self):
+        self._user_stopped_at = time.perf_counter()
+        self._turn = {}
+
+    def on_metrics(self, m: Any):
+        """Handle one `metrics_collected` payload (livekit.agents.metrics.*)."""
+        kind = getattr(m, "type", None)
+        turn = self._turn
+
+        if kind == "eou_metrics":
+            turn["eou"] = m.end_of_utterance_delay
+            self._record("end_of_utterance", m.end_of_utterance_delay)
+
+        elif kind in ("llm_metrics", "realtime_model_metrics") and m.ttft >= 0 and "ttft" not in turn:
+            turn["ttft"] = m.ttft
+            registry.histogram("voice_component_latency_seconds", component="llm_ttft").observe(m.ttft)
+            if "eou" in turn:
+                self._record("llm_first_token", turn["eou"] + m.ttft)
+
+        elif kind == "tts_metrics" and m.ttfb >= 0 and "ttfb" not in turn:
+            turn["ttfb"] = m.ttfb
+            registry.histogram("voice_component_latency_seconds", component="tts_ttfb").observe(m.ttfb)
+            if "eou" in turn and "ttft" in turn:
+                self._record("tts_first_byte", turn["eou"] + turn["ttft"] + m.ttfb)
+
+    def agent_started_speaking(self):
+        if self._user_stopped_at is None:
+            return  # greeting or a reply not triggered by user speech
+        self._record("playout_start", time.perf_counter() - self._user_stopped_at)
+        self._user_stopped_at = None
+        self.turns += 1
+
+    def summary(self) -> Dict:
+        report: Dict[str, Any] = {"turns": self.turns}
+        for stage, hist in self.stages.items():
+            if hist.count:
+                report[stage] = hist.summary()
+        return report
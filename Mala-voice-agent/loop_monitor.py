@@ -0,0 +1,137 @@
+"""
+loop_monitor.py — Event-loop lag sampler and slow-callback profiler.
+
+Audio for a call is pumped by the job process's event loop; anything that
+holds the loop (a blocking HTTP call in a session handler, a big JSON
+dump) delays every frame behind it and is heard as a glitch.
+
+With LOOP_MONITOR=true, `LoopMonitor`:
+
+  - samples loop lag every LOOP_LAG_INTERVAL seconds (how late a sleep
+    wakes up) into event_loop_lag_seconds{process="job"}
+  - times the session handlers wrapped with `watch()` into
+    session_callback_seconds{handler}; a run longer than SLOW_CALLBACK_MS
+    is logged with its handler and call id, counted in
+    slow_callbacks_total{handler} and reported to the session (`on_slow`)
+  - times every other loop callback too (by wrapping asyncio's
+    Handle._run, like aiodebug), so slow code outside the handlers is
+    logged under the task or function that ran it
+
+When the flag is off nothing is wrapped or sampled.
+"""
+
+import asyncio
+import functools
+import logging
+import os
+import time
+from typing import Callable, Optional
+
+from metrics import registry
+
+logger = logging.getLogger("CrincleCupkakes")
+
+LOOP_MONITOR = os.getenv("LOOP_MONITOR", "false").lower() == "true"
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", "0.1"))
+SLOW_CALLBACK_MS = float(os.getenv("SLOW_CALLBACK_MS", "50"))
+
+
+def describe_callback(handle: asyncio.Handle) -> str:
+    """A short name for what a loop callback ran: the task's coroutine or the function."""
+    callback = handle._callback
+    task = getattr(callback, "__self__", None)
+    if isinstance(task, asyncio.Task):
+        coro = task.get_coro()
+        return getattr(coro, "__qualname__", None) or task.get_name()
+    return getattr(callback, "__qualname__", None) or repr(callback)
+
+
+class LoopMonitor:
+    def __init__(
+        self,
+        enabled: bool = LOOP_MONITOR,
+        interval: float = LOOP_LAG_INTERVAL,
+        slow_threshold: float = SLOW_CALLBACK_MS / 1000,
+    ):
+        self.enabled = enabled
+        self.interval = interval
+        self.slow_threshold = slow_threshold
+        self.max_lag = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self._original_run = None
+        self._reported = False  # a watched handler already reported the current slow callback
+
+    def start(self):
+        """Start sampling on the running loop (idempotent; no-op when disabled)."""
+        if not self.enabled:
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._sample())
+        if self._original_run is None:
+            self._install()
+
+    async def aclose(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        if self._original_run is not None:
+            asyncio.Handle._run = self._original_run
+            self._original_run = None
+
+    async def _sample(self):
+        histogram = registry.histogram("event_loop_lag_seconds", process="job")
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.perf_counter() - start - self.interval)
+            histogram.observe(lag)
+            self.max_lag = max(self.max_lag, lag)
+
+    def _install(self):
+        original = self._original_run = asyncio.Handle._run
+        monitor = self
+
+        def timed_run(handle):
+            start = time.perf_counter()
+            try:
+                return original(handle)
+            finally:
+                elapsed = time.perf_counter() - start
+                if elapsed >= monitor.slow_threshold:
+                    if monitor._reported:
+                        monitor._reported = False
+                    else:
+                        name = describe_callback(handle)
+                        registry.counter("slow_callbacks_total", handler=name).inc()
+                        logger.warning(f"🐢 Loop blocked {elapsed * 1000:.0f}ms by {name}")
+
+        asyncio.Handle._run = timed_run
+
+    def watch(
+        self,
+        fn: Callable,
+        call_id: Optional[str] = None,
+        on_slow: Optional[Callable[[str, float], None]] = None,
+    ) -> Callable:
+        """Wrap a synchronous session handler so its run time is recorded (returns `fn` when disabled)."""
+        if not self.enabled:
+            return fn
+        name = fn.__name__
+        histogram = registry.histogram("session_callback_seconds", handler=name)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                histogram.observe(elapsed)
+                if elapsed >= self.slow_threshold:
+                    self._reported = self._original_run is not None
+                    registry.counter("slow_callbacks_total", handler=name).inc()
+                    logger.warning(f"🐢 Loop blocked {elapsed * 1000:.0f}ms by {name} (call {call_id})")
+                    if on_slow:
+                        on_slow(name, elapsed)
+
+        return wrapper
@@ -0,0 +1,337 @@
+"""
+mailer.py — Mail delivery for the send_email tool.
+
+The tool used to open a fresh SMTP connection (EHLO, STARTTLS, LOGIN) on
+every call, blocking the event loop for the whole handshake. Now:
+
+  1. `Mailer.enqueue` writes the message to a durable spool and returns —
+     that is all the LLM turn waits for.
+  2. A background delivery task claims spooled messages and sends them on
+     worker threads through `SMTPPool`, a small pool of persistent,
+     already-authenticated SMTP connections.
+
+Failed deliveries are retried with backoff; the spool is the same SQLite
+outbox used for backend records (see outbox.py), so mail survives restarts.
+A refusal the server will repeat (a 5xx, refused recipients, bad
+credentials) is moved to the spool's outbox_dead table at once, and so is a
+message still failing after `max_attempts`; `spool.requeue_dead("smtp")`
+puts them back (e.g. once SMTP_PASSWORD is fixed).
+
+The LLM sometimes calls the tool twice for the same request; an email with
+the same recipient and subject as one queued within MAIL_DEDUP_WINDOW
+seconds is dropped.
+"""
+
+import asyncio
+import logging
+import os
+import queue
+import random
+import smtplib
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from typing import Dict, List, Optional, Tuple
+
+from metrics import registry
+from outbox import Outbox
+
+logger = logging.getLogger("CrincleCupkakes")
+
+MAIL_DEDUP_WINDOW = float(os.getenv("MAIL_DEDUP_WINDOW", "600"))
+MAIL_MAX_ATTEMPTS = int(os.getenv("MAIL_MAX_ATTEMPTS", "20"))
+
+
+@dataclass
+class SMTPConfig:
+    host: str = "smtp.gmail.com"
+    port: int = 587
+    user: Optional[str] = None
+    password: Optional[str] = None
+    from_email: Optional[str] = None
+    starttls: bool = True
+    pool_size: int = 2
+
+    @classmethod
+    def from_env(cls) -> "SMTPConfig":
+        user = os.getenv("SMTP_USER")
+        return cls(
+            host=os.getenv("SMTP_HOST", "smtp.gmail.com"),
+            port=int(os.getenv("SMTP_PORT", "587")),
+            user=user,
+            password=os.getenv("SMTP_PASSWORD"),
+            from_email=os.getenv("FROM_EMAIL", user),
+            starttls=os.getenv("SMTP_STARTTLS", "true").lower() == "true",
+            pool_size=int(os.getenv("SMTP_POOL_SIZE", "2")),
+        )
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.user and self.password)
+
+
+def build_message(from_email: str, to_email: str, subject: str, body: str) -> str:
+    """Plain-text body plus the branded HTML version of it."""
+    msg = MIMEMultipart("alternative")
+    msg["Subject"] = subject
+    msg["From"] = f"Crincle Cupkakes <{from_email}>"
+    msg["To"] = to_email
+
+    # Plain text part
+    msg.attach(MIMEText(body, "plain"))
+
+    # HTML part — wraps the plain body in a simple branded template
+    html_body = f"""
+        <html>
+          <body style="font-family: Arial, sans-serif; color: #333; max-width: 600px; margin: auto; padding: 20px;">
+            <div style="background-color: #f9e4ef; padding: 15px; border-radius: 8px; margin-bottom: 20px;">
+              <h2 style="color: #c0306a; margin: 0;">🧁 Crincle Cupkakes</h2>
+              <p style="margin: 4px 0; font-size: 13px; color: #888;">123 Main Street, Karachi</p>
+            </div>
+            <div style="line-height: 1.7; white-space: pre-line;">{body}</div>
+            <hr style="border: none; border-top: 1px solid #eee; margin: 30px 0;" />
+            <p style="font-size: 12px; color: #aaa; text-align: center;">
+              Crincle Cupkakes · Karachi · team@crinclecupkakes.com
+            </p>
+          </body>
+        </html>
+        """
+    msg.attach(MIMEText(html_body, "html"))
+    return msg.as_string()
+
+
+def _permanent(error: BaseException) -> bool:
+    """An SMTP failure the server will give again for the same message — retrying won't help."""
+    if isinstance(error, smtplib.SMTPAuthenticationError):
+        return True
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    return isinstance(error, smtplib.SMTPResponseException) and error.smtp_code >= 500
+
+
+class SMTPPool:
+    """
+    Pool of persistent, authenticated SMTP connections. `send` blocks, so it
+    is only ever called from the mailer's worker threads.
+    """
+
+    # Connections idle longer than this get a NOOP before reuse
+    NOOP_AFTER = 30.0
+
+    def __init__(self, config: SMTPConfig):
+        self.config = config
+        self._idle: "queue.LifoQueue[Tuple[smtplib.SMTP, float]]" = queue.LifoQueue()
+
+    def _connect(self) -> smtplib.SMTP:
+        start = time.perf_counter()
+        conn = smtplib.SMTP(self.config.host, self.config.port, timeout=30)
+        conn.ehlo()
+        if self.config.starttls:
+            conn.starttls()
+            conn.ehlo()
+        conn.login(self.config.user, self.config.password)
+        registry.histogram("smtp_connect_seconds").observe(time.perf_counter() - start)
+        return conn
+
+    def _acquire(self) -> smtplib.SMTP:
+        while True:
+            try:
+                conn, last_used = self._idle.get_nowait()
+            except queue.Empty:
+                return self._connect()
+            if time.monotonic() - last_used < self.NOOP_AFTER:
+                return conn
+            try:
+                if conn.noop()[0] == 250:
+                    return conn
+            except smtplib.SMTPException:
+                pass
+            self._discard(conn)
+
+    def _release(self, conn: smtplib.SMTP):
+        self._idle.put((conn, time.monotonic()))
+
+    @staticmethod
+    def _discard(conn: smtplib.SMTP):
+        try:
+            conn.quit()
+        except Exception:
+            conn.close()
+
+    def send(self, to_email: str, message: str):
+        """Send one message, reconnecting once if the server dropped us."""
+        for attempt in (1, 2):
+            conn = self._acquire()
+            try:
+                conn.sendmail(self.config.from_email, to_email, message)
+            except smtplib.SMTPServerDisconnected:
+                self._discard(conn)
+                if attempt == 2:
+                    raise
+                continue
+            except smtplib.SMTPRecipientsRefused:
+                self._release(conn)  # connection is still good
+                raise
+            except Exception:
+                self._discard(conn)
+                raise
+            self._release(conn)
+            return
+
+    def close(self):
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._discard(conn)
+
+
+class Mailer:
+    """Durable mail queue delivered through an `SMTPPool` off the event loop."""
+
+    def __init__(
+        self,
+        config: SMTPConfig,
+        spool: Outbox,
+        interval: float = 1.0,
+        base_backoff: float = 5.0,
+        max_backoff: float = 300.0,
+        lease: float = 120.0,
+        dedup_window: float = MAIL_DEDUP_WINDOW,
+        max_attempts: int = MAIL_MAX_ATTEMPTS,
+    ):
+        self.config = config
+        self.spool = spool
+        self.pool = SMTPPool(config)
+        self.interval = interval
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.lease = lease
+        self.dedup_window = dedup_window
+        self.max_attempts = max_attempts
+        self._recent: Dict[Tuple[str, str], float] = {}  # (to, subject) → monotonic time queued
+        self._executor = ThreadPoolExecutor(max_workers=config.pool_size, thread_name_prefix="smtp")
+        self._task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+
+    def enqueue(self, to_email: str, subject: str, body: str) -> Optional[str]:
+        """
+        Durably queue an email and return its key — delivery happens later.
+        Returns None if the same email was queued within the dedup window.
+        """
+        now = time.monotonic()
+        dedup_key = (to_email.strip().lower(), " ".join(subject.lower().split()))
+        if now - self._recent.get(dedup_key, float("-inf")) < self.dedup_window:
+            registry.counter("email_deduplicated_total", transport="smtp").inc()
+            logger.info(f"🔁 Skipped duplicate email to {to_email} | Subject: {subject}")
+            return None
+        self._recent = {k: t for k, t in self._recent.items() if now - t < self.dedup_window}
+        self._recent[dedup_key] = now
+        key = self.spool.append("smtp", {"to": to_email, "subject": subject, "body": body})
+        self.start()
+        self._wake.set()
+        return key
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._wake = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        while True:
+            try:
+                claimed = await self.deliver_once()
+            except Exception as e:
+                logger.error(f"❌ Mail delivery loop failed: {e!r}")
+                claimed = 0
+            if claimed < self.config.pool_size:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=self.interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wake.clear()
+
+    def _deliver(self, data: dict):
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            message = build_message(self.config.from_email, data["to"], data["subject"], data["body"])
+            self.pool.send(data["to"], message)
+            outcome = "ok"
+        finally:
+            registry.histogram("smtp_send_seconds", outcome=outcome).observe(time.perf_counter() - start)
+
+    async def deliver_once(self) -> int:
+        """Deliver one round of spooled mail; returns how many were claimed."""
+        records = await asyncio.to_thread(self.spool.claim, self.config.pool_size * 4, self.lease)
+        if not records:
+            return 0
+
+        loop = asyncio.get_running_loop()
+        results = await asyncio.gather(
+            *(loop.run_in_executor(self._executor, self._deliver, data) for _, _, _, data, _ in records),
+            return_exceptions=True,
+        )
+
+        done: List[int] = []
+        retry: List[Tuple[int, float]] = []
+        dead: List[Tuple[int, str]] = []
+        for (rid, _, _, data, attempts), result in zip(records, results):
+            if result is None:
+                logger.info(f"✅ Email sent to {data['to']} | Subject: {data['subject']}")
+                done.append(rid)
+                continue
+            if isinstance(result, smtplib.SMTPAuthenticationError):
+                logger.error("❌ SMTP authentication failed — check SMTP_USER and SMTP_PASSWORD")
+            else:
+                logger.error(f"❌ SMTP error sending to {data['to']}: {result!r}")
+            if _permanent(result):
+                dead.append((rid, f"refused by the server: {result!r}"))
+            elif attempts >= self.max_attempts:
+                dead.append((rid, f"gave up after {attempts} attempts: {result!r}"))
+            else:
+                delay = min(self.max_backoff, self.base_backoff * 2 ** (attempts - 1))
+                retry.append((rid, delay * random.uniform(0.5, 1.0)))
+        if done:
+            await asyncio.to_thread(self.spool.ack, done)
+        if retry:
+            await asyncio.to_thread(self.spool.retry_later, retry)
+        if dead:
+            await asyncio.to_thread(self.spool.dead_letter, dead)
+            by_id = {record[0]: record for record in records}
+            for rid, error in dead:
+                _, _, key, data, _ = by_id[rid]
+                registry.counter("email_dead_letter_total", transport="smtp").inc()
+                logger.error(f"☠️ Email to {data['to']} ({key}) moved to outbox_dead: {error}")
+        return len(records)
+
+    async def drain(self, timeout: float = 10):
+        """Deliver whatever is due before shutdown; the rest stays spooled."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                if not await asyncio.wait_for(self.deliver_once(), timeout=deadline - time.monotonic()):
+                    break
+            except asyncio.TimeoutError:
+                break
+
+    async def aclose(self):
+        await self.drain()
+        if self._task:
+            self._task.cancel()
+        await asyncio.to_thread(self.pool.close)
+        self._executor.shutdown(wait=False)
+
+
+_mailer: Optional[Mailer] = None
+
+
+def get_mailer() -> Mailer:
+    """Per-process mailer, built on first use (after .env.local is loaded)."""
+    global _mailer
+    if _mailer is None:
+        _mailer = Mailer(SMTPConfig.from_env(), Outbox(os.getenv("MAIL_SPOOL_PATH", "mail_spool.db")))
+    return _mailer
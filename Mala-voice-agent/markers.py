@@ -0,0 +1,122 @@
+"""
+markers.py — Incremental parser for control markers in streamed agent text.
+
+The agent's actions are function tools (see tools.py), but the model may
+still say one of the old spoken markers:
+
+    ORDER_CONFIRMED: Name | Email | Items | Total
+    TRANSFER_HOT: reason      TRANSFER_COLD: reason
+    HOLD_REQUEST: 30
+
+`MarkerParser.feed` takes the LLM text as it streams, in one pass, and
+returns the speakable text with markers removed plus every marker that has
+just completed — so the action fires mid-utterance and the marker is never
+spoken or shown in the transcript. A marker's payload runs to the end of
+its line (or of the utterance); HOLD_REQUEST ends at its number. Text that
+could be the start of a marker split across chunks is held back until the
+next chunk decides it.
+
+`strip_markers` applies the parser to an agent text stream (the
+transcription and TTS nodes in Agent.py).
+"""
+
+import re
+from dataclasses import dataclass
+from typing import AsyncIterable, AsyncIterator, Callable, List, Optional, Tuple
+
+MARKERS = ("ORDER_CONFIRMED", "TRANSFER_HOT", "TRANSFER_COLD", "HOLD_REQUEST")
+
+_MARKER = re.compile(r"\b(" + "|".join(MARKERS) + r"):")
+_HOLD_END = re.compile(r"\s*\d+")
+# Every proper prefix of every "NAME:" — what a chunk may end with mid-marker
+_PREFIXES = sorted({f"{name}:"[:i] for name in MARKERS for i in range(1, len(name) + 1)}, key=len, reverse=True)
+
+
+@dataclass
+class Marker:
+    name: str
+    payload: str
+
+
+class MarkerParser:
+    def __init__(self):
+        self._buffer = ""
+        self._marker: Optional[str] = None  # inside this marker's payload
+
+    def feed(self, chunk: str) -> Tuple[str, List[Marker]]:
+        """(text to speak, markers completed by this chunk)."""
+        self._buffer += chunk
+        spoken: List[str] = []
+        markers: List[Marker] = []
+        while self._buffer:
+            if self._marker:
+                end = self._payload_end()
+                if end is None:
+                    break  # payload continues in the next chunk
+                markers.append(Marker(self._marker, self._buffer[:end].strip()))
+                self._buffer = self._buffer[end:].lstrip("\n")
+                self._marker = None
+                continue
+
+            match = _MARKER.search(self._buffer)
+            if match:
+                spoken.append(self._buffer[:match.start()])
+                self._marker = match.group(1)
+                self._buffer = self._buffer[match.end():]
+                continue
+
+            keep = self._partial_marker_length()
+            spoken.append(self._buffer[:len(self._buffer) - keep])
+            self._buffer = self._buffer[len(self._buffer) - keep:]
+            break
+        return "".join(spoken), markers
+
+    def flush(self) -> Tuple[str, List[Marker]]:
+        """End of the utterance: complete an open marker and release held-back text."""
+        spoken, markers = "", []
+        if self._marker:
+            markers.append(Marker(self._marker, self._buffer.strip()))
+        else:
+            spoken = self._buffer
+        self._buffer, self._marker = "", None
+        return spoken, markers
+
+    def _payload_end(self) -> Optional[int]:
+        if self._marker == "HOLD_REQUEST":
+            match = _HOLD_END.match(self._buffer)
+            if match and match.end() < len(self._buffer):
+                return match.end()  # a non-digit follows the number
+            if not match and self._buffer.strip():
+                return 0  # no number — empty payload
+        newline = self._buffer.find("\n")
+        return newline if newline >= 0 else None
+
+    def _partial_marker_length(self) -> int:
+        for prefix in _PREFIXES:
+            if self._buffer.endswith(prefix):
+                start = len(self._buffer) - len(prefix)
+                if start == 0 or not (self._buffer[start - 1].isalnum() or self._buffer[start - 1] == "_"):
+                    return len(prefix)
+        return 0
+
+
+async def strip_markers(
+    text: AsyncIterable[str],
+    on_marker: Optional[Callable[[Marker], None]] = None,
+) -> AsyncIterator[str]:
+    """`text` without markers; `on_marker` is called as each one completes."""
+    parser = MarkerParser()
+    async for chunk in text:
+        spoken, markers = parser.feed(chunk)
+        for marker in markers:
+            if on_marker:
+                on_marker(marker)
+        if spoken:
+            # Unchanged chunks pass through as-is (keeps TimedString timing)
+            yield chunk if spoken == chunk else spoken
+    spoken, markers = parser.flush()
+    for marker in markers:
+        if on_marker:
+            on_marker(marker)
+    if spoken:
+        yield spoken
@@ -0,0 +1,191 @@
+"""
+menu.py — The bakery menu, cached in the agent worker.
+
+The backend's /catalog endpoint is the single source of prices and
+flavors. Each worker process keeps the latest copy in memory
+(`MenuCache.menu`), so reading it during a call costs no network round
+trip. A background task revalidates it every `ttl` seconds with the ETag
+(an unchanged menu is a 304 with no body); on failure the last good menu
+stays in use. The last good response is also written to disk, so a
+worker that starts while the backend is down still has a menu.
+
+From a Menu the agent generates the system prompt's MENU section and the
+"prices" / "flavors" FAQ answers, instead of hardcoding them.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+import urllib.error
+import urllib.request
+from typing import Callable, Dict, List, Optional
+
+from backend_client import BackendClient
+from metrics import registry
+
+logger = logging.getLogger("CrincleCupkakes")
+
+
+def _rupees(amount: float) -> str:
+    return f"Rs. {int(amount) if amount == int(amount) else amount:,}"
+
+
+def _join(names: List[str]) -> str:
+    return names[0] if len(names) == 1 else f"{', '.join(names[:-1])} and {names[-1]}"
+
+
+class Menu:
+    def __init__(self, products: List[Dict], pricing: Dict, etag: Optional[str] = None):
+        self.products = products
+        self.pricing = pricing
+        self.etag = etag
+
+    @classmethod
+    def from_payload(cls, payload: Dict, etag: Optional[str] = None) -> "Menu":
+        return cls(payload.get("products", []), payload.get("pricing", {}), etag)
+
+    def to_payload(self) -> Dict:
+        return {"products": self.products, "pricing": self.pricing}
+
+    def category(self, name: str) -> List[Dict]:
+        return [p for p in self.products if p["category"] == name]
+
+    @staticmethod
+    def _flavor(product: Dict) -> str:
+        return product["name"].replace(" Cupcake", "")
+
+    def prices_answer(self) -> str:
+        by_price: Dict[float, List[str]] = {}
+        for product in sorted(self.category("cupcake"), key=lambda p: p["unit_price"]):
+            by_price.setdefault(product["unit_price"], []).append(self._flavor(product))
+        parts = [f"{_join(names)} cupcakes are {_rupees(price)} each" for price, names in by_price.items()]
+        for product in self.products:
+            if product["category"] != "cupcake":
+                parts.append(f"{product['name']}s are {_rupees(product['unit_price'])} per {product['unit']}")
+        return f"{'. '.join(parts)}. Want me to check something specific?"
+
+    def flavors_answer(self) -> str:
+        flavors = [self._flavor(p) for p in self.category("cupcake")]
+        return f"Our cupcake flavors are {_join(flavors)}. We also have seasonal flavors."
+
+    def prompt_section(self) -> str:
+        lines = ["MENU (current prices — quote these exactly and compute totals from them, never guess):"]
+        for product in self.products:
+            unit = "each" if product["unit"] == "each" else f"per {product['unit']}"
+            lines.append(f"- {product['name']}: {_rupees(product['unit_price'])} {unit}")
+        bulk = self.pricing.get("bulk_discount")
+        if bulk:
+            lines.append(
+                f"- {bulk['percent']}% off {bulk['category']}s when an order has "
+                f"{bulk['min_quantity']} or more {bulk['category']}s"
+            )
+        fee = self.pricing.get("delivery_fee")
+        if fee:
+            free_from = self.pricing.get("free_delivery_from")
+            lines.append(
+                f"- Delivery {_rupees(fee)}"
+                + (f" for orders under {_rupees(free_from)}, free from {_rupees(free_from)}" if free_from else "")
+            )
+        return "\n".join(lines)
+
+
+class MenuCache:
+    def __init__(self, client: BackendClient, ttl: float = 300, snapshot_path: Optional[str] = None):
+        self.client = client
+        self.ttl = ttl
+        self.snapshot_path = snapshot_path
+        self.menu: Optional[Menu] = None
+        self.fetched_at = 0.0  # monotonic time of the last successful (re)validation
+        self._listeners: List[Callable[[Menu], None]] = []
+        self._task: Optional[asyncio.Task] = None
+        self._load_snapshot()
+
+    @property
+    def stale(self) -> bool:
+        return time.monotonic() - self.fetched_at > self.ttl
+
+    def on_change(self, listener: Callable[[Menu], None]):
+        """Call `listener(menu)` now (if a menu is loaded) and whenever it changes."""
+        self._listeners.append(listener)
+        if self.menu:
+            listener(self.menu)
+
+    def _apply(self, menu: Menu, source: str):
+        self.menu = menu
+        logger.info(f"🧁 Menu loaded from {source}: {len(menu.products)} products ({menu.etag})")
+        for listener in self._listeners:
+            try:
+                listener(menu)
+            except Exception as e:
+                logger.error(f"❌ Menu listener failed: {e!r}")
+
+    def _handle(self, status: int, etag: Optional[str], body: Optional[Dict]) -> bool:
+        if status == 304:
+            self.fetched_at = time.monotonic()
+            registry.counter("menu_refresh_total", result="not_modified").inc()
+            return True
+        if status == 200 and body is not None:
+            self.fetched_at = time.monotonic()
+            registry.counter("menu_refresh_total", result="updated").inc()
+            if not self.menu or etag != self.menu.etag:
+                self._apply(Menu.from_payload(body, etag), "backend")
+                self._save_snapshot()
+            return True
+        registry.counter("menu_refresh_total", result="error").inc()
+        return False
+
+    async def refresh(self) -> bool:
+        """Revalidate against the backend; keeps the current menu on failure."""
+        return self._handle(*await self.client.get_json("catalog", self.menu.etag if self.menu else None))
+
+    def refresh_blocking(self, timeout: float = 3) -> bool:
+        """Same as refresh(), for sync code with no event loop (the process setup_fnc)."""
+        if not self.client.base_url:
+            return False
+        request = urllib.request.Request(f"{self.client.base_url}/catalog")
+        if self.menu and self.menu.etag:
+            request.add_header("If-None-Match", self.menu.etag)
+        try:
+            with urllib.request.urlopen(request, timeout=timeout) as response:
+                return self._handle(response.status, response.headers.get("ETag"), json.load(response))
+        except urllib.error.HTTPError as e:
+            return self._handle(e.code, e.headers.get("ETag"), None)
+        except Exception as e:
+            logger.warning(f"⚠️ Menu fetch failed: {e!r}")
+            return self._handle(0, None, None)
+
+    def start(self):
+        """Keep the menu fresh in the background (idempotent)."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        while True:
+            if self.stale:
+                await self.refresh()
+            # Jitter so the workers don't all revalidate at the same moment
+            await asyncio.sleep(self.ttl * random.uniform(0.8, 1.0))
+
+    def _load_snapshot(self):
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return
+        try:
+            with open(self.snapshot_path, encoding="utf-8") as f:
+                data = json.load(f)
+            self._apply(Menu.from_payload(data["payload"], data.get("etag")), "snapshot")
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"⚠️ Ignoring unreadable menu snapshot: {e!r}")
+
+    def _save_snapshot(self):
+        if not self.snapshot_path:
+            return
+        try:
+            tmp = f"{self.snapshot_path}.{os.getpid()}.tmp"  # workers share the snapshot path
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"etag": self.menu.etag, "payload": self.menu.to_payload()}, f)
+            os.replace(tmp, self.snapshot_path)
+        except OSError as e:
+            logger.warning(f"⚠️ Could not write menu snapshot: {e!r}")
@@ -0,0 +1,380 @@
+"""
+metrics.py — Lightweight in-process metrics for the agent worker.
+
+Histograms and counters are kept in a module-level registry keyed by
+name + labels, so any module can record without passing objects around:
+
+    registry.histogram("backend_request_seconds", endpoint="leads").observe(0.12)
+    registry.counter("warm_pool_total", result="hit").inc()
+
+Agent job processes are separate from the FastAPI server, so each process
+periodically writes its registry snapshot to
+METRICS_DIR/<host>_<pid>_<start>.json (`MetricsExporter`); server.py merges
+those files and serves them in Prometheus text format on /metrics
+(`load_snapshots` + `render_prometheus`). METRICS_DIR must be a directory
+both see: the /tmp default only works while they share a machine (start.sh
+runs both in one container). With the Procfile's separate web and worker
+services, point METRICS_DIR at a shared volume, or /metrics has no agent data.
+
+Snapshots of exited processes are folded into archive.json so their
+counts are kept without the directory growing forever. A snapshot from
+this host is live while its pid runs with the same start time (a reused
+pid is not mistaken for it); one from another host is live while it keeps
+being rewritten (METRICS_STALE_AFTER seconds). Scrapes can run
+concurrently (threads, and several server processes), so archiving holds
+an exclusive lock on METRICS_DIR/.archive.lock.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import socket
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: only threads of this process are serialized
+    fcntl = None
+
+logger = logging.getLogger("CrincleCupkakes")
+
+# Upper bounds in seconds — tuned for HTTP and voice-pipeline latencies
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """Fixed-bucket latency histogram (count, sum, max and bucket counts)."""
+
+    __slots__ = ("buckets", "bucket_counts", "count", "sum", "max")
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.bucket_counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.bucket_counts[i] += 1
+                break
+        else:
+            self.bucket_counts[-1] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> float:
+        """Approximate quantile — the upper bound of the bucket holding it."""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for i, bound in enumerate(self.buckets):
+            seen += self.bucket_counts[i]
+            if seen >= target:
+                return min(bound, self.max)
+        return self.max
+
+    def summary(self) -> Dict:
+        return {
+            "count": self.count,
+            "avg_ms": round(self.sum / self.count * 1000, 1) if self.count else 0.0,
+            "p50_ms": round(self.quantile(0.50) * 1000, 1),
+            "p95_ms": round(self.quantile(0.95) * 1000, 1),
+            "max_ms": round(self.max * 1000, 1),
+        }
+
+
+class Counter:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms: Dict[Tuple[str, LabelKey], Histogram] = {}
+        self._counters: Dict[Tuple[str, LabelKey], Counter] = {}
+
+    def histogram(self, name: str, **labels: str) -> Histogram:
+        key = (name, tuple(sorted(labels.items())))
+        hist = self._histograms.get(key)
+        if hist is None:
+            with self._lock:
+                hist = self._histograms.setdefault(key, Histogram())
+        return hist
+
+    def counter(self, name: str, **labels: str) -> Counter:
+        key = (name, tuple(sorted(labels.items())))
+        counter = self._counters.get(key)
+        if counter is None:
+            with self._lock:
+                counter = self._counters.setdefault(key, Counter())
+        return counter
+
+    def collect(self, name: str) -> Iterator[Tuple[Dict[str, str], Histogram]]:
+        """Yield (labels, histogram) for every series recorded under `name`."""
+        for (series, labels), hist in list(self._histograms.items()):
+            if series == name:
+                yield dict(labels), hist
+
+    def names(self) -> List[str]:
+        return sorted({name for name, _ in self._histograms})
+
+    def snapshot(self) -> Dict:
+        return {
+            "histograms": [
+                {
+                    "name": name,
+                    "labels": dict(labels),
+                    "buckets": list(hist.buckets),
+                    "bucket_counts": list(hist.bucket_counts),
+                    "count": hist.count,
+                    "sum": hist.sum,
+                    "max": hist.max,
+                }
+                for (name, labels), hist in list(self._histograms.items())
+            ],
+            "counters": [
+                {"name": name, "labels": dict(labels), "value": counter.value}
+                for (name, labels), counter in list(self._counters.items())
+            ],
+        }
+
+
+registry = Registry()
+
+
+# =========================
+# Cross-process export
+# =========================
+# A snapshot from another host that hasn't been rewritten for this long belongs to an exited process
+METRICS_STALE_AFTER = float(os.getenv("METRICS_STALE_AFTER", "60"))
+HOSTNAME = socket.gethostname()
+
+
+def default_metrics_dir() -> str:
+    return os.getenv("METRICS_DIR") or os.path.join(tempfile.gettempdir(), "crincle-cupkakes-metrics")
+
+
+def _process_start(pid: int) -> Optional[int]:
+    """When `pid` started, in clock ticks since boot (Linux /proc) — tells a reused pid apart."""
+    try:
+        with open(f"/proc/{pid}/stat", encoding="utf-8") as f:
+            return int(f.read().rsplit(")", 1)[1].split()[19])
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def snapshot_name() -> str:
+    """This process's snapshot file: host, pid and start time."""
+    pid = os.getpid()
+    return f"{HOSTNAME}_{pid}_{_process_start(pid) or 0}.json"
+
+
+def write_snapshot(directory: str, snapshot: Dict, name: Optional[str] = None):
+    """Atomically write a snapshot file (default name: `snapshot_name()`)."""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, name or snapshot_name())
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(snapshot, f)
+    os.replace(tmp, path)
+
+
+def merge_snapshots(snapshots: List[Dict]) -> Dict:
+    histograms: Dict[Tuple, Dict] = {}
+    counters: Dict[Tuple, Dict] = {}
+    for snap in snapshots:
+        for h in snap.get("histograms", []):
+            key = (h["name"], tuple(sorted(h["labels"].items())), tuple(h["buckets"]))
+            merged = histograms.get(key)
+            if merged is None:
+                histograms[key] = {**h, "bucket_counts": list(h["bucket_counts"])}
+                continue
+            merged["bucket_counts"] = [a + b for a, b in zip(merged["bucket_counts"], h["bucket_counts"])]
+            merged["count"] += h["count"]
+            merged["sum"] += h["sum"]
+            merged["max"] = max(merged["max"], h["max"])
+        for c in snap.get("counters", []):
+            key = (c["name"], tuple(sorted(c["labels"].items())))
+            if key in counters:
+                counters[key]["value"] += c["value"]
+            else:
+                counters[key] = dict(c)
+    return {"histograms": list(histograms.values()), "counters": list(counters.values())}
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _snapshot_alive(stem: str, path: str) -> Optional[bool]:
+    """Whether the process that writes snapshot `stem` still runs; None if `stem` isn't a snapshot name."""
+    if stem.isdigit():  # <pid>.json from before host and start time were recorded
+        host, pid, start = HOSTNAME, stem, "0"
+    else:
+        parts = stem.rsplit("_", 2)
+        if len(parts) != 3 or not parts[1].isdigit() or not parts[2].isdigit():
+            return None
+        host, pid, start = parts
+    if host != HOSTNAME:
+        # Another container: its pids aren't ours to check, so go by the heartbeat
+        try:
+            return time.time() - os.path.getmtime(path) < METRICS_STALE_AFTER
+        except OSError:
+            return False
+    if not _pid_alive(int(pid)):
+        return False
+    current = _process_start(int(pid))
+    return start == "0" or current is None or current == int(start)
+
+
+_archive_thread_lock = threading.Lock()
+
+
+@contextmanager
+def _archive_lock(directory: str) -> Iterator[None]:
+    """Held while archive.json is read, merged and rewritten, so no snapshot is archived twice."""
+    with _archive_thread_lock:
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(directory, ".archive.lock"), "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def load_snapshots(directory: str) -> Dict:
+    """Merge every process snapshot in `directory`, archiving exited processes."""
+    if not os.path.isdir(directory):
+        return {"histograms": [], "counters": []}
+    with _archive_lock(directory):
+        return _load_snapshots(directory)
+
+
+def _load_snapshots(directory: str) -> Dict:
+    archive_path = os.path.join(directory, "archive.json")
+    archive: Dict = {"histograms": [], "counters": []}
+    if os.path.exists(archive_path):
+        with open(archive_path, encoding="utf-8") as f:
+            archive = json.load(f)
+
+    live, dead = [], []
+    for entry in os.listdir(directory):
+        stem, ext = os.path.splitext(entry)
+        path = os.path.join(directory, entry)
+        alive = _snapshot_alive(stem, path) if ext == ".json" else None
+        if alive is None:
+            continue
+        try:
+            with open(path, encoding="utf-8") as f:
+                snap = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if alive:
+            live.append(snap)
+        else:
+            dead.append((path, snap))
+
+    if dead:
+        archive = merge_snapshots([archive] + [snap for _, snap in dead])
+        write_snapshot(directory, archive, "archive.json")
+        for path, _ in dead:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    return merge_snapshots([archive] + live)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in sorted(labels.items())) + "}"
+
+
+def render_prometheus(snapshot: Dict) -> str:
+    """Prometheus text exposition format (version 0.0.4)."""
+    lines: List[str] = []
+    typed = set()
+
+    for h in sorted(snapshot["histograms"], key=lambda h: h["name"]):
+        name = h["name"]
+        if name not in typed:
+            lines.append(f"# TYPE {name} histogram")
+            typed.add(name)
+        cumulative = 0
+        for bound, count in zip(h["buckets"], h["bucket_counts"]):
+            cumulative += count
+            lines.append(f"{name}_bucket{_format_labels({**h['labels'], 'le': repr(float(bound))})} {cumulative}")
+        lines.append(f"{name}_bucket{_format_labels({**h['labels'], 'le': '+Inf'})} {h['count']}")
+        lines.append(f"{name}_sum{_format_labels(h['labels'])} {h['sum']}")
+        lines.append(f"{name}_count{_format_labels(h['labels'])} {h['count']}")
+
+    for c in sorted(snapshot["counters"], key=lambda c: c["name"]):
+        name = c["name"]
+        if name not in typed:
+            lines.append(f"# TYPE {name} counter")
+            typed.add(name)
+        lines.append(f"{name}{_format_labels(c['labels'])} {c['value']}")
+
+    return "\n".join(lines) + "\n"
+
+
+class MetricsExporter:
+    """Writes this process's registry snapshot to `directory` every `interval` seconds."""
+
+    def __init__(self, directory: str, interval: float = 5.0):
+        self.directory = directory
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    def write(self):
+        try:
+            write_snapshot(self.directory, registry.snapshot())
+        except OSError as e:
+            logger.warning(f"⚠️ Could not write metrics snapshot: {e!r}")
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await asyncio.to_thread(self.write)
+
+    async def aclose(self):
+        if self._task:
+            self._task.cancel()
+        await asyncio.to_thread(self.write)
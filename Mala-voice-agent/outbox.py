@@ -0,0 +1,315 @@
+"""
+outbox.py — Durable outbox for orders, leads, analytics and emails.
+
+The backend_* helpers append records to a local SQLite (WAL) file instead
+of posting them directly, so an order survives a backend outage or a
+worker crash. A background `OutboxFlusher` claims due records, batches
+them per endpoint into one bulk POST, and deletes them only once the
+backend has accepted them. Failed batches are retried with exponential
+backoff; every record carries an idempotency key so a retry after a lost
+response never creates a duplicate on the backend.
+
+A record the backend rejects (a 4xx other than 408/429) is moved to the
+outbox_dead table at once — a rejected batch is re-sent one record at a
+time to find it — and so is one still failing after `max_attempts`.
+Dead records are logged and kept, and `requeue_dead` puts them back.
+
+`append` is called straight from session handlers and tools, on the event
+loop. That is deliberate: the record is on disk before the caller goes
+on. In WAL mode with synchronous=NORMAL an insert is one un-synced page
+write (~30µs p50, under 0.2ms p99); the WAL checkpoint that would
+otherwise land on some append now runs on each claim, on the flusher's
+thread. The only longer wait is another process's claim/ack
+transaction, which is equally short.
+"""
+
+import asyncio
+import json
+import logging
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from backend_client import BackendClient
+from metrics import registry
+
+logger = logging.getLogger("CrincleCupkakes")
+
+# Endpoint the agent used to post to → bulk endpoint on bakery-backend
+BULK_ENDPOINTS = {
+    "place-order": "place-orders",
+    "call-analytics": "call-analytics/batch",
+    "leads": "leads/batch",
+    "send-email": "send-email/batch",
+    "call-events": "call-events/batch",
+}
+
+# (id, endpoint, idempotency_key, data, attempts)
+OutboxRecord = Tuple[int, str, str, dict, int]
+
+
+def _rejected(status: int) -> bool:
+    """A 4xx the backend will give again for the same record — retrying won't help."""
+    return 400 <= status < 500 and status not in (408, 429)
+
+
+class Outbox:
+    """Append-only SQLite outbox, safe to share between worker processes."""
+
+    def __init__(self, path: str = "outbox.db"):
+        self.path = path
+        self._lock = threading.Lock()
+        # Autocommit mode — transactions are opened explicitly where needed
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        # Checkpoints run in claim(), off the event loop, instead of on whichever append fills the WAL
+        self._conn.execute("PRAGMA wal_autocheckpoint=0")
+        self._conn.execute("""
+        CREATE TABLE IF NOT EXISTS outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            endpoint TEXT NOT NULL,
+            idempotency_key TEXT NOT NULL UNIQUE,
+            payload TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at REAL NOT NULL DEFAULT 0,
+            created_at REAL NOT NULL
+        )
+        """)
+        self._conn.execute("""
+        CREATE TABLE IF NOT EXISTS outbox_dead (
+            id INTEGER PRIMARY KEY,
+            endpoint TEXT NOT NULL,
+            idempotency_key TEXT NOT NULL UNIQUE,
+            payload TEXT NOT NULL,
+            attempts INTEGER NOT NULL,
+            created_at REAL NOT NULL,
+            error TEXT,
+            dead_at REAL NOT NULL
+        )
+        """)
+
+    def append(self, endpoint: str, data: dict, idempotency_key: Optional[str] = None) -> str:
+        """Durably queue one record and return its idempotency key."""
+        key = idempotency_key or uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO outbox (endpoint, idempotency_key, payload, created_at) VALUES (?, ?, ?, ?)",
+                (endpoint, key, json.dumps(data, default=str), time.time()),
+            )
+        return key
+
+    def claim(self, limit: int, lease: float) -> List[OutboxRecord]:
+        """
+        Lease up to `limit` due records. Leased records are invisible to other
+        flushers until `lease` seconds pass, so a crashed flusher's batch is
+        picked up again rather than lost.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._conn.execute(
+                    "SELECT id, endpoint, idempotency_key, payload, attempts FROM outbox "
+                    "WHERE next_attempt_at <= ? ORDER BY id LIMIT ?",
+                    (now, limit),
+                ).fetchall()
+                if rows:
+                    self._conn.executemany(
+                        "UPDATE outbox SET attempts = attempts + 1, next_attempt_at = ? WHERE id = ?",
+                        [(now + lease, row[0]) for row in rows],
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+        return [(rid, endpoint, key, json.loads(payload), attempts + 1) for rid, endpoint, key, payload, attempts in rows]
+
+    def ack(self, ids: List[int]):
+        with self._lock:
+            self._conn.executemany("DELETE FROM outbox WHERE id = ?", [(i,) for i in ids])
+
+    def dead_letter(self, failures: List[Tuple[int, str]]):
+        """Move records that will never be accepted to outbox_dead: [(id, error), ...]."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO outbox_dead "
+                    "(id, endpoint, idempotency_key, payload, attempts, created_at, error, dead_at) "
+                    "SELECT id, endpoint, idempotency_key, payload, attempts, created_at, ?, ? FROM outbox WHERE id = ?",
+                    [(error, now, rid) for rid, error in failures],
+                )
+                self._conn.executemany("DELETE FROM outbox WHERE id = ?", [(rid,) for rid, _ in failures])
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def requeue_dead(self, endpoint: Optional[str] = None) -> int:
+        """Give dead records (all, or one endpoint's) a fresh set of attempts; returns how many."""
+        where, params = ("WHERE endpoint = ?", (endpoint,)) if endpoint else ("", ())
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                count = self._conn.execute(
+                    "INSERT OR IGNORE INTO outbox (endpoint, idempotency_key, payload, created_at) "
+                    f"SELECT endpoint, idempotency_key, payload, created_at FROM outbox_dead {where}",
+                    params,
+                ).rowcount
+                self._conn.execute(f"DELETE FROM outbox_dead {where}", params)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return count
+
+    def retry_later(self, schedule: List[Tuple[int, float]]):
+        """Reschedule failed records: [(id, delay_seconds), ...]."""
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE outbox SET next_attempt_at = ? WHERE id = ?",
+                [(now + delay, rid) for rid, delay in schedule],
+            )
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+
+    def dead_count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM outbox_dead").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class OutboxFlusher:
+    """Background task that drains the outbox into bulk backend POSTs."""
+
+    def __init__(
+        self,
+        outbox: Outbox,
+        client: BackendClient,
+        batch_size: int = 50,
+        interval: float = 0.5,
+        base_backoff: float = 1.0,
+        max_backoff: float = 60.0,
+        lease: float = 30.0,
+        max_attempts: int = 100,
+    ):
+        self.outbox = outbox
+        self.client = client
+        self.batch_size = batch_size
+        self.interval = interval
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self._task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+
+    def start(self):
+        """Start the flusher on the running loop (no-op if already running)."""
+        if self._task is None or self._task.done():
+            self._wake = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def notify(self):
+        """Wake the flusher early, e.g. right after an order is queued."""
+        if self._wake is not None:
+            self._wake.set()
+
+    def _backoff(self, attempts: int) -> float:
+        delay = min(self.max_backoff, self.base_backoff * 2 ** (attempts - 1))
+        return delay * random.uniform(0.5, 1.0)
+
+    async def _run(self):
+        while True:
+            try:
+                sent = await self.flush_once()
+            except Exception as e:
+                logger.error(f"❌ Outbox flush failed: {e!r}")
+                sent = 0
+            if sent < self.batch_size:
+                # Nothing more due right now — wait for new records or the next tick
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=self.interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wake.clear()
+
+    async def flush_once(self) -> int:
+        """Send one round of due records; returns how many were claimed."""
+        records = await asyncio.to_thread(self.outbox.claim, self.batch_size, self.lease)
+        if not records:
+            return 0
+
+        batches: Dict[str, List[OutboxRecord]] = defaultdict(list)
+        for record in records:
+            batches[record[1]].append(record)
+
+        statuses = await asyncio.gather(*(self._post(endpoint, batch) for endpoint, batch in batches.items()))
+
+        delivered: List[int] = []
+        failed: List[Tuple[int, float]] = []
+        dead: List[Tuple[int, str]] = []
+        for (endpoint, batch), status in zip(batches.items(), statuses):
+            if _rejected(status) and len(batch) > 1:
+                # One bad record fails the whole batch; send them one by one to find it
+                singles = await asyncio.gather(*(self._post(endpoint, [record]) for record in batch))
+                outcomes = list(zip(batch, singles))
+            else:
+                outcomes = [(record, status) for record in batch]
+            for record, record_status in outcomes:
+                if record_status == 200:
+                    delivered.append(record[0])
+                elif _rejected(record_status):
+                    dead.append((record[0], f"rejected by the backend (HTTP {record_status})"))
+                elif record[4] >= self.max_attempts:
+                    dead.append((record[0], f"gave up after {record[4]} attempts (HTTP {record_status or 'unreachable'})"))
+                else:
+                    failed.append((record[0], self._backoff(record[4])))
+
+        if delivered:
+            await asyncio.to_thread(self.outbox.ack, delivered)
+        if failed:
+            await asyncio.to_thread(self.outbox.retry_later, failed)
+            logger.warning(f"⚠️ {len(failed)} outbox record(s) will be retried")
+        if dead:
+            await asyncio.to_thread(self.outbox.dead_letter, dead)
+            by_id = {record[0]: record for record in records}
+            for rid, error in dead:
+                _, endpoint, key, _, _ = by_id[rid]
+                registry.counter("outbox_dead_letter_total", endpoint=endpoint).inc()
+                logger.error(f"☠️ Outbox {endpoint} record {key} moved to outbox_dead: {error}")
+        return len(records)
+
+    async def _post(self, endpoint: str, batch: List[OutboxRecord]) -> int:
+        return await self.client.post_status(
+            BULK_ENDPOINTS.get(endpoint, endpoint),
+            {"records": [{"idempotency_key": key, "data": data} for _, _, key, data, _ in batch]},
+            f"{endpoint} batch of {len(batch)}",
+        )
+
+    async def drain(self, timeout: float = 10):
+        """Flush whatever is due before shutdown; anything left stays on disk."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                sent = await asyncio.wait_for(self.flush_once(), timeout=deadline - time.monotonic())
+            except asyncio.TimeoutError:
+                break
+            if sent == 0:
+                break
+        remaining = await asyncio.to_thread(self.outbox.pending_count)
+        if remaining:
+            logger.warning(f"⚠️ {remaining} outbox record(s) left for the next worker to deliver")
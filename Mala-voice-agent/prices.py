@@ -0,0 +1,19 @@
+"""
+prices.py — Amounts in the totals the agent speaks or writes.
+
+Kept apart from tools.py so code that only needs to read a total (the
+order marker handler in Agent.py) doesn't import the function tools.
+"""
+
+import re
+from typing import Optional
+
+_AMOUNT = re.compile(r"\d[\d,]*(?:\.\d+)?")
+
+
+def parse_price(text) -> Optional[float]:
+    """Amount in a spoken/written total: 'Rs. 1,500.50' → 1500.5, '1800' → 1800.0, None if there is none."""
+    if isinstance(text, (int, float)):
+        return float(text)
+    match = _AMOUNT.search(str(text))
+    return float(match.group().replace(",", "")) if match else None
@@ -2,22 +2,55 @@
 server.py — FastAPI HTTP server that runs on Railway alongside the agent.
 
 Provides:
-  POST /token  → generates a LiveKit token for the frontend
-  GET  /health → Railway health check
+  POST /token   → allocates a room for the call and returns a LiveKit token for it
+  GET  /health  → Railway health check
+  GET  /metrics → Prometheus metrics merged from all agent processes
+
+Each call gets its own room and identity, and the token dispatches the
+agent (AGENT_NAME) into it — see dispatch.py.
+/token mints short-lived tokens through token_service.TokenService
+(credentials loaded once at startup) and is rate limited per client IP
+and per identity; 429 responses carry Retry-After.
 
 Run with:
   uvicorn server:app --host 0.0.0.0 --port 8000
 """
 
 import os
-from fastapi import FastAPI, HTTPException
+import asyncio
+from typing import Optional
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel
-from livekit.api import AccessToken, VideoGrants
 from dotenv import load_dotenv
 
+from metrics import default_metrics_dir, load_snapshots, merge_snapshots, registry, render_prometheus
+
 load_dotenv(".env.local")
 
+# Imported after .env.local: both read their settings from the environment
+from dispatch import AGENT_NAME, RoomAllocator  # noqa: E402
+from token_service import RateLimiter, TokenService, retry_after_header  # noqa: E402
+
+# Credentials are read and the signing key prepared once, not per request
+token_service = TokenService.from_env(agent_name=AGENT_NAME)
+allocator = RoomAllocator()
+
+# ── Rate limits ──────────────────────────────────────────────────
+# Per client IP, and per client-supplied identity so one client can't be farmed from many IPs
+ip_limiter = RateLimiter(
+    rate=float(os.getenv("TOKEN_RATE_PER_IP", "0.5")),     # tokens/second refill
+    burst=float(os.getenv("TOKEN_BURST_PER_IP", "10")),
+)
+identity_limiter = RateLimiter(
+    rate=float(os.getenv("TOKEN_RATE_PER_IDENTITY", "0.2")),
+    burst=float(os.getenv("TOKEN_BURST_PER_IDENTITY", "5")),
+)
+# Only behind a proxy that appends the real client IP (Railway: set in start.sh and
+# the Procfile). Anywhere else X-Forwarded-For is whatever the client sent.
+TRUST_PROXY_HEADERS = os.getenv("TRUST_PROXY_HEADERS", "false").lower() == "true"
+
 app = FastAPI()
 
 # ── CORS ─────────────────────────────────────────────────────────
@@ -40,8 +73,12 @@ app.add_middleware(
 
 # ── Models ───────────────────────────────────────────────────────
 class TokenRequest(BaseModel):
-    room: str = "crincle-cupkakes"
-    identity: str = "customer"
+    # The room and participant identity are always allocated by the server.
+    # `identity` is the client's own id for this browser session: it keys the
+    # per-identity rate limit and, with the client IP, the token cache (a double
+    # click reuses the room).
+    identity: Optional[str] = None
+    room: Optional[str] = None  # ignored; kept so older frontends still validate
 
 
 # ── Routes ───────────────────────────────────────────────────────
@@ -51,42 +88,62 @@ async def health():
     return {"status": "ok", "service": "Crincle Cupkakes API"}
 
 
+@app.get("/metrics")
+async def metrics():
+    """
+    Prometheus scrape endpoint. The agent's job processes each write a
+    snapshot to METRICS_DIR; this merges them (turn latency per stage,
+    backend/SMTP latency, startup phases, warm-pool hits...). When the agent
+    runs as a separate service (Procfile), METRICS_DIR must be a volume both
+    mount — see metrics.py.
+    """
+    snapshot = await asyncio.to_thread(load_snapshots, default_metrics_dir())
+    snapshot = merge_snapshots([snapshot, registry.snapshot()])  # + this process (/token)
+    return PlainTextResponse(render_prometheus(snapshot), media_type="text/plain; version=0.0.4")
+
+
+def client_ip(request: Request) -> str:
+    if TRUST_PROXY_HEADERS:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            # The rightmost entry is the one our proxy added; the rest are client-supplied
+            return forwarded.rsplit(",", 1)[-1].strip()
+    return request.client.host if request.client else "unknown"
+
+
 @app.post("/token")
-async def generate_token(req: TokenRequest):
+async def generate_token(req: TokenRequest, request: Request):
     """
     Called by the Vercel frontend when a customer clicks 'Start talking to Sana'.
     Returns a short-lived LiveKit JWT token + the LiveKit server URL.
     The token lets the customer join the room without exposing API credentials.
     """
-    api_key     = os.getenv("LIVEKIT_API_KEY")
-    api_secret  = os.getenv("LIVEKIT_API_SECRET")
-    livekit_url = os.getenv("LIVEKIT_URL")
-
-    if not api_key or not api_secret or not livekit_url:
+    if token_service is None:
         raise HTTPException(
             status_code=500,
             detail="LiveKit credentials not configured on Railway"
         )
 
-    try:
-        token = (
-            AccessToken(api_key, api_secret)
-            .with_identity(req.identity)
-            .with_name("Customer")
-            .with_grants(VideoGrants(
-                room_join=True,
-                room=req.room,
-                can_publish=True,       # customer sends mic audio
-                can_subscribe=True,     # customer receives avatar video + audio
-            ))
-            .to_jwt()
+    wait = ip_limiter.acquire(f"ip:{client_ip(request)}")
+    if not wait and req.identity:
+        wait = identity_limiter.acquire(f"identity:{req.identity}")
+    if wait:
+        registry.counter("token_requests_total", result="rate_limited").inc()
+        raise HTTPException(
+            status_code=429,
+            detail="Too many token requests, please retry shortly",
+            headers=retry_after_header(wait),
         )
 
-        return {
-            "token": token,
-            "url": livekit_url,
-            "room": req.room,
-        }
+    try:
+        hits = token_service.cache_hits
+        room, identity = allocator.allocate()
+        # Only the same client (IP) presenting the same identity gets a cached room back
+        cache_key = (client_ip(request), req.identity) if req.identity else None
+        response = token_service.issue(room, identity, cache_key=cache_key)
+        registry.counter("token_requests_total", result="cached" if token_service.cache_hits > hits else "minted").inc()
+        return response
 
     except Exception as e:
+        registry.counter("token_requests_total", result="error").inc()
         raise HTTPException(status_code=500, detail=str(e))
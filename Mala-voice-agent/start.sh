@@ -5,7 +5,8 @@
 echo "🚀 Starting Crincle Cupkakes services..."
 
 # Start FastAPI server in the background (handles /token and /health)
-uvicorn server:app --host 0.0.0.0 --port ${PORT:-8000} &
+# Railway's proxy appends the client IP to X-Forwarded-For, so the per-IP limit can use it
+TRUST_PROXY_HEADERS=${TRUST_PROXY_HEADERS:-true} uvicorn server:app --host 0.0.0.0 --port ${PORT:-8000} &
 
 # Start the LiveKit agent (handles voice calls)
 python Agent.py start
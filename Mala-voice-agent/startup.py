@@ -0,0 +1,63 @@
+"""
+startup.py — Call bring-up orchestration with per-phase timing.
+
+Independent startup steps (avatar, background audio, session start) run
+concurrently instead of one after another. Each step is a named phase with
+its own timeout; its duration and outcome are recorded as a span and in
+`metrics.registry` (startup_phase_seconds{phase, outcome}).
+"""
+
+import asyncio
+import logging
+import time
+from typing import Awaitable, Dict
+
+from metrics import registry
+
+logger = logging.getLogger("CrincleCupkakes")
+
+
+class StartupOrchestrator:
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.spans: Dict[str, Dict] = {}
+
+    async def phase(self, name: str, aw: Awaitable, timeout: float) -> bool:
+        """Run one phase; returns False (and logs) on timeout or error instead of raising."""
+        start = time.perf_counter()
+        outcome = "ok"
+        try:
+            await asyncio.wait_for(aw, timeout=timeout)
+            return True
+        except asyncio.TimeoutError:
+            outcome = "timeout"
+            logger.warning(f"⏱ Startup phase '{name}' timed out after {timeout}s")
+            return False
+        except Exception as e:
+            outcome = "error"
+            logger.error(f"❌ Startup phase '{name}' failed: {e!r}")
+            return False
+        finally:
+            duration = time.perf_counter() - start
+            self.spans[name] = {
+                "start_ms": round((start - self.started_at) * 1000, 1),
+                "duration_ms": round(duration * 1000, 1),
+                "outcome": outcome,
+            }
+            registry.histogram("startup_phase_seconds", phase=name, outcome=outcome).observe(duration)
+
+    def background(self, name: str, aw: Awaitable, timeout: float) -> "asyncio.Task[bool]":
+        """Start a phase without waiting for it."""
+        return asyncio.get_running_loop().create_task(self.phase(name, aw, timeout))
+
+    @staticmethod
+    async def ready_within(task: "asyncio.Task[bool]", timeout: float) -> bool:
+        """True if a background phase finished successfully within `timeout` (it keeps running otherwise)."""
+        await asyncio.wait({task}, timeout=timeout)
+        return task.done() and task.result()
+
+    def summary(self) -> Dict:
+        return {
+            "total_ms": round((time.perf_counter() - self.started_at) * 1000, 1),
+            "phases": self.spans,
+        }
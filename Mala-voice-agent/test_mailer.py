@@ -0,0 +1,79 @@
+"""Mailer delivery outcomes: sent, retried, and dead-lettered."""
+
+import asyncio
+import smtplib
+
+import pytest
+
+from mailer import Mailer, SMTPConfig
+from outbox import Outbox
+
+
+class FakePool:
+    """Stands in for SMTPPool: raises the next scripted error for each recipient, else sends."""
+
+    def __init__(self, errors):
+        self.errors = errors
+        self.sent = []
+
+    def send(self, to_email, message):
+        error = self.errors.get(to_email)
+        if error:
+            raise error
+        self.sent.append(to_email)
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def mailer(tmp_path):
+    config = SMTPConfig(user="u", password="p", from_email="shop@example.com", pool_size=1)
+    mailer = Mailer(config, Outbox(str(tmp_path / "spool.db")), base_backoff=0, max_attempts=3)
+    yield mailer
+    mailer.spool.close()
+
+
+def deliver(mailer, errors, *recipients):
+    mailer.pool = FakePool(errors)
+    for to in recipients:
+        mailer.spool.append("smtp", {"to": to, "subject": "Menu", "body": "..."})
+    asyncio.run(mailer.deliver_once())
+    return mailer.pool
+
+
+def test_sent_mail_leaves_the_spool(mailer):
+    pool = deliver(mailer, {}, "a@example.com")
+    assert pool.sent == ["a@example.com"]
+    assert (mailer.spool.pending_count(), mailer.spool.dead_count()) == (0, 0)
+
+
+@pytest.mark.parametrize("error", [
+    smtplib.SMTPRecipientsRefused({"bad@example.com": (550, b"No such user")}),
+    smtplib.SMTPAuthenticationError(535, b"Bad credentials"),
+    smtplib.SMTPSenderRefused(553, b"Sender not allowed", "shop@example.com"),
+    smtplib.SMTPDataError(554, b"Message rejected"),
+])
+def test_permanent_failures_are_dead_lettered_at_once(mailer, error):
+    deliver(mailer, {"bad@example.com": error}, "bad@example.com")
+    assert (mailer.spool.pending_count(), mailer.spool.dead_count()) == (0, 1)
+    assert mailer.spool.requeue_dead("smtp") == 1
+
+
+@pytest.mark.parametrize("error", [
+    smtplib.SMTPServerDisconnected("Connection unexpectedly closed"),
+    smtplib.SMTPDataError(451, b"Try again later"),
+    smtplib.SMTPRecipientsRefused({"busy@example.com": (450, b"Mailbox busy")}),
+    ConnectionRefusedError(111, "Connection refused"),
+])
+def test_transient_failures_are_retried(mailer, error):
+    deliver(mailer, {"busy@example.com": error}, "busy@example.com")
+    assert (mailer.spool.pending_count(), mailer.spool.dead_count()) == (1, 0)
+
+
+def test_gives_up_after_max_attempts(mailer):
+    errors = {"down@example.com": smtplib.SMTPServerDisconnected("gone")}
+    deliver(mailer, errors, "down@example.com")
+    for _ in range(mailer.max_attempts - 1):
+        deliver(mailer, errors)
+    assert (mailer.spool.pending_count(), mailer.spool.dead_count()) == (0, 1)
@@ -0,0 +1,181 @@
+"""
+token_service.py — LiveKit access tokens for server.py's /token endpoint.
+
+`TokenService` is built once at startup: the API key/secret are read and
+the HMAC signing key is prepared a single time, then every request only
+serializes its claims and signs them (the same HS256 JWT that
+livekit.api.AccessToken produces, without rebuilding the builder, the
+grant objects and the JWT header on each call).
+
+Tokens are short-lived (TOKEN_TTL, 10 minutes by default): they are only
+needed to join the room, not for the whole call.
+
+`RateLimiter` is a token bucket per key (client IP, identity), so one
+caller hammering /token gets 429s while everyone else is served.
+
+When an agent name is given, each token also carries a RoomConfiguration
+that dispatches that agent to the caller's room (see dispatch.py).
+
+Optionally (TOKEN_CACHE_TTL > 0) the response issued for a cache key is
+handed out again for a few seconds, so retries and double clicks reuse the
+same room and token. server.py keys it on the client IP together with the
+client's identity: the identity alone is client-chosen, and anyone sending
+the same string would otherwise be handed that caller's room.
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import math
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from livekit.api import AccessToken, RoomAgentDispatch, RoomConfiguration, VideoGrants
+
+TOKEN_TTL = float(os.getenv("TOKEN_TTL", "600"))
+TOKEN_CACHE_TTL = float(os.getenv("TOKEN_CACHE_TTL", "0"))  # 0 = mint a new token every time
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+
+_JSON = json.JSONEncoder(separators=(",", ":"))
+
+
+def _b64(data: bytes) -> bytes:
+    return base64.urlsafe_b64encode(data).rstrip(b"=")
+
+
+class TokenBucket:
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, tokens: float, updated: float):
+        self.tokens = tokens
+        self.updated = updated
+
+
+class RateLimiter:
+    """`rate` requests/second per key, with bursts of up to `burst`."""
+
+    def __init__(self, rate: float, burst: float, max_keys: int = 100_000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+
+    def acquire(self, key: str) -> float:
+        """0 if the request may proceed, otherwise the seconds until it may."""
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(self.burst, now)
+            if len(self._buckets) > self.max_keys:
+                # Least recently seen key; an idle bucket would be full again anyway
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+            bucket.tokens = min(self.burst, bucket.tokens + (now - bucket.updated) * self.rate)
+            bucket.updated = now
+
+        if bucket.tokens >= 1:
+            bucket.tokens -= 1
+            return 0.0
+        return (1 - bucket.tokens) / self.rate
+
+
+class TokenService:
+    def __init__(
+        self,
+        api_key: str,
+        api_secret: str,
+        url: str,
+        agent_name: str = "",
+        ttl: float = TOKEN_TTL,
+        cache_ttl: float = TOKEN_CACHE_TTL,
+        cache_size: int = TOKEN_CACHE_SIZE,
+    ):
+        self.api_key = api_key
+        self.url = url
+        self.ttl = ttl
+        # A cached token must still have most of its life left when handed out
+        self.cache_ttl = min(cache_ttl, ttl / 2)
+        self.cache_size = cache_size
+        self._header = _b64(_JSON.encode({"alg": "HS256", "typ": "JWT"}).encode()) + b"."
+        self._mac = hmac.new(api_secret.encode(), digestmod=hashlib.sha256)
+        self._template = self._claims_template(api_key, agent_name)
+        self._cache: "OrderedDict[object, Tuple[float, Dict]]" = OrderedDict()
+        self.minted = 0
+        self.cache_hits = 0
+
+    @classmethod
+    def from_env(cls, agent_name: str = "") -> Optional["TokenService"]:
+        """None when the LiveKit credentials aren't configured."""
+        api_key = os.getenv("LIVEKIT_API_KEY")
+        api_secret = os.getenv("LIVEKIT_API_SECRET")
+        livekit_url = os.getenv("LIVEKIT_URL")
+        if not api_key or not api_secret or not livekit_url:
+            return None
+        return cls(api_key, api_secret, livekit_url, agent_name)
+
+    @staticmethod
+    def _claims_template(api_key: str, agent_name: str) -> Dict:
+        # Let the SDK lay out the grants, so the claims match AccessToken's exactly;
+        # only the room differs between tokens
+        token = (
+            AccessToken(api_key, "unused")
+            .with_name("Customer")
+            .with_grants(VideoGrants(
+                room_join=True,
+                room="",
+                can_publish=True,       # customer sends mic audio
+                can_subscribe=True,     # customer receives avatar video + audio
+            ))
+        )
+        if agent_name:
+            token = token.with_room_config(RoomConfiguration(agents=[RoomAgentDispatch(agent_name=agent_name)]))
+        return token.claims.asdict()
+
+    def mint(self, room: str, identity: str) -> str:
+        """A signed JWT letting `identity` join `room` for `ttl` seconds."""
+        now = int(time.time())
+        claims = dict(
+            self._template,
+            video=dict(self._template["video"], room=room),
+            sub=identity,
+            iss=self.api_key,
+            nbf=now,
+            exp=now + int(self.ttl),
+        )
+        signing_input = self._header + _b64(_JSON.encode(claims).encode())
+        mac = self._mac.copy()
+        mac.update(signing_input)
+        self.minted += 1
+        return (signing_input + b"." + _b64(mac.digest())).decode()
+
+    def issue(self, room: str, identity: str, cache_key: Optional[object] = None) -> Dict:
+        """The /token response body, reusing a recently issued one for `cache_key` if caching is on."""
+        key = cache_key or (room, identity)
+        now = time.monotonic()
+        if self.cache_ttl > 0:
+            cached = self._cache.get(key)
+            if cached and cached[0] > now:
+                self.cache_hits += 1
+                return cached[1]
+
+        response = {
+            "token": self.mint(room, identity),
+            "url": self.url,
+            "room": room,
+            "identity": identity,
+            "expires_in": int(self.ttl),
+        }
+        if self.cache_ttl > 0:
+            self._cache[key] = (now + self.cache_ttl, response)
+            self._cache.move_to_end(key)
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return response
+
+
+def retry_after_header(seconds: float) -> Dict[str, str]:
+    return {"Retry-After": str(max(1, math.ceil(seconds)))}
@@ -1,12 +1,12 @@
-import os
 import logging
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+from typing import Literal
 from livekit.agents import function_tool, RunContext
 
+from mailer import get_mailer
+
 logger = logging.getLogger("CrincleCupkakes")
 
+
 # =========================
 # Email Tool
 # =========================
@@ -22,9 +22,11 @@ async def send_email(
 
     Use this tool when:
     - A customer wants to receive the menu, pricing, or custom order details
-    - An order has been confirmed and you need to send a confirmation
     - You want to follow up with a customer
 
+    Do not use it for order confirmations; those are emailed automatically.
+    Sending the same subject to the same address again is ignored.
+
     Args:
         to_email: The recipient's email address (e.g. customer@gmail.com)
         subject: The email subject line
@@ -33,14 +35,10 @@ async def send_email(
     Returns:
         A confirmation message indicating success or failure
     """
-    smtp_host = os.getenv("SMTP_HOST", "smtp.gmail.com")
-    smtp_port = int(os.getenv("SMTP_PORT", "587"))
-    smtp_user = os.getenv("SMTP_USER")
-    smtp_password = os.getenv("SMTP_PASSWORD")
-    from_email = os.getenv("FROM_EMAIL", smtp_user)
+    mailer = get_mailer()
 
     # Validate config
-    if not smtp_user or not smtp_password:
+    if not mailer.config.configured:
         logger.error("❌ SMTP credentials not configured in .env.local")
         return "Sorry, email service is not configured. Please contact us at team@crinclecupkakes.com."
 
@@ -50,53 +48,74 @@ async def send_email(
         return "That email address doesn't look right. Could you double-check it for me?"
 
     try:
-        # Build the email
-        msg = MIMEMultipart("alternative")
-        msg["Subject"] = subject
-        msg["From"] = f"Crincle Cupkakes <{from_email}>"
-        msg["To"] = to_email
-
-        # Plain text part
-        text_part = MIMEText(body, "plain")
-        msg.attach(text_part)
-
-        # HTML part — wraps the plain body in a simple branded template
-        html_body = f"""
-        <html>
-          <body style="font-family: Arial, sans-serif; color: #333; max-width: 600px; margin: auto; padding: 20px;">
-            <div style="background-color: #f9e4ef; padding: 15px; border-radius: 8px; margin-bottom: 20px;">
-              <h2 style="color: #c0306a; margin: 0;">🧁 Crincle Cupkakes</h2>
-              <p style="margin: 4px 0; font-size: 13px; color: #888;">123 Main Street, Karachi</p>
-            </div>
-            <div style="line-height: 1.7; white-space: pre-line;">{body}</div>
-            <hr style="border: none; border-top: 1px solid #eee; margin: 30px 0;" />
-            <p style="font-size: 12px; color: #aaa; text-align: center;">
-              Crincle Cupkakes · Karachi · team@crinclecupkakes.com
-            </p>
-          </body>
-        </html>
-        """
-        html_part = MIMEText(html_body, "html")
-        msg.attach(html_part)
-
-        # Send via SMTP
-        with smtplib.SMTP(smtp_host, smtp_port) as server:
-            server.ehlo()
-            server.starttls()
-            server.login(smtp_user, smtp_password)
-            server.sendmail(from_email, to_email, msg.as_string())
-
-        logger.info(f"✅ Email sent to {to_email} | Subject: {subject}")
+        # Durably queued — the SMTP handshake and send happen off the event loop
+        if mailer.enqueue(to_email, subject, body) is None:
+            return f"That email was already sent to {to_email}."
+        logger.info(f"📨 Email queued for {to_email} | Subject: {subject}")
         return f"Email sent successfully to {to_email}!"
 
-    except smtplib.SMTPAuthenticationError:
-        logger.error("❌ SMTP authentication failed — check SMTP_USER and SMTP_PASSWORD")
-        return "I wasn't able to send the email due to a configuration issue. Please reach out to us at team@crinclecupkakes.com."
-
-    except smtplib.SMTPException as e:
-        logger.error(f"❌ SMTP error: {e}")
-        return "There was a problem sending the email. Please try again or contact us directly."
-
     except Exception as e:
         logger.error(f"❌ Unexpected email error: {e}")
-        return "Something went wrong while sending the email. I apologize for the inconvenience!"
\ No newline at end of file
+        return "Something went wrong while sending the email. I apologize for the inconvenience!"
+
+
+# =========================
+# Call Control Tools
+# The session's userdata is the call's CallActions (see Agent.py); these
+# tools are the structured replacement for the spoken ORDER_CONFIRMED /
+# TRANSFER_* / HOLD_REQUEST markers. Each returns what to tell the customer.
+# =========================
+@function_tool
+async def confirm_order(
+    context: RunContext,
+    customer_name: str,
+    email: str,
+    items: str,
+    total_rupees: float,
+) -> str:
+    """
+    Place the customer's order once they have confirmed everything.
+
+    Call this exactly once per order, after you have read back the items and
+    the total and the customer agreed. The confirmation email is sent
+    automatically.
+
+    Args:
+        customer_name: The customer's name
+        email: The customer's email address
+        items: Every item with its quantity, e.g. "6 Red Velvet Cupcakes, 12 Chocolate Cupcakes"
+        total_rupees: The order total in rupees, e.g. 3300
+    """
+    return context.userdata.confirm_order(customer_name, email, items, total_rupees)
+
+
+@function_tool
+async def transfer_call(
+    context: RunContext,
+    urgency: Literal["hot", "cold"],
+    reason: str,
+) -> str:
+    """
+    Hand the customer over to a person on the team.
+
+    Use "hot" to connect them right away (they ask for a manager, the owner
+    or a human, or the complaint is serious). Use "cold" when someone should
+    call them back instead.
+
+    Args:
+        urgency: "hot" for an immediate transfer, "cold" for a callback
+        reason: Why the customer needs a person, in a few words
+    """
+    return context.userdata.transfer(urgency, reason)
+
+
+@function_tool
+async def hold_call(context: RunContext, seconds: int) -> str:
+    """
+    Put the customer on a short hold, e.g. when they ask you to wait or you
+    need to check something.
+
+    Args:
+        seconds: How long to hold, usually 10 to 60
+    """
+    return context.userdata.hold(seconds)
@@ -0,0 +1,75 @@
+"""
+warm_pool.py — Per-process pool of ready-to-use session components.
+
+The AgentServer `setup_fnc` runs in each job process before a call is
+assigned to it. It fills this pool, so when the call arrives the realtime
+LLM, STT, TTS and noise-cancellation plugins already exist and the
+entrypoint only has to open their connections (`warm_connections`),
+which it does right away, in parallel with the rest of the startup.
+
+Components may also bring their own session audio/text IO (`attach_io`):
+the offline replay bench (bench/replay_bench.py) runs the real entrypoint
+with fake plugins that way. Live calls leave it unset and use the room.
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Optional
+
+from metrics import registry
+
+logger = logging.getLogger("CrincleCupkakes")
+
+
+@dataclass
+class SessionComponents:
+    llm: Any
+    stt: Any
+    tts: Any
+    noise_cancellation: Any
+    attach_io: Optional[Callable[[Any], None]] = None  # sets session.input/output before start
+    built_at: float = field(default_factory=time.monotonic)
+
+    def warm_connections(self):
+        """Pre-open STT/TTS connection pools. Must run inside the job context."""
+        for plugin in (self.stt, self.tts):
+            prewarm = getattr(plugin, "prewarm", None)
+            if prewarm:
+                try:
+                    prewarm()
+                except Exception as e:
+                    logger.warning(f"⚠️ Could not prewarm {type(plugin).__name__}: {e!r}")
+
+
+class WarmPool:
+    def __init__(self, factory: Callable[[], SessionComponents], size: int = 1):
+        self.factory = factory
+        self.size = size
+        self._ready: Deque[SessionComponents] = deque()
+
+    def fill(self) -> "WarmPool":
+        while len(self._ready) < self.size:
+            self._ready.append(self.factory())
+        return self
+
+    def acquire(self) -> SessionComponents:
+        """A warm set of components if one is ready, otherwise a freshly built one."""
+        if self._ready:
+            components = self._ready.popleft()
+            registry.counter("warm_pool_acquire_total", result="hit").inc()
+        else:
+            logger.warning("🥶 Warm pool empty — building session components cold")
+            components = self.factory()
+            registry.counter("warm_pool_acquire_total", result="miss").inc()
+        # Top the pool back up for the next call once this one is under way
+        try:
+            asyncio.get_running_loop().call_soon(self.fill)
+        except RuntimeError:
+            self.fill()
+        return components
+
+    def __len__(self) -> int:
+        return len(self._ready)